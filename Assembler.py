@@ -0,0 +1,149 @@
+import hashlib
+import marshal
+import mmap
+import os
+import sys
+from array import array
+from collections import namedtuple
+
+from Decoder import DecodedOp, OperandSpec, decode
+from Loader import SymbolTable, scan_symbols
+
+MAGIC = b'SHOBJ\x00'
+FORMAT_VERSION = 2  # 目标文件格式或 Decoder 的 IR 有变化时加 1，旧缓存自动失效
+CACHE_DIRECTORY = '__asmcache__'  # 与 __pycache__ 一样放在源文件旁边
+SOURCE_SUFFIX = '.asm'
+
+
+class ObjectProgram(namedtuple('ObjectProgram', ['instructions', 'lines', 'table', 'symbols', 'data'])):
+    """目标文件的内容
+
+    相同的源代码行只存一份（控制脚本里大量重复的 TICK_TIMER 等）：table 的每一项是
+    (源代码行, 预译码记录)，预译码记录保持 marshal 可以直接存取的 (操作码, 参数) 形式，
+    不能预译码的行为 None；lines 是 array('I')，给出每条指令对应的 table 下标。
+    装载时只有 marshal 一次反序列化，DecodedOp 在第一次执行到某一行时才由 op() 还原。
+    """
+    __slots__ = ()
+
+    def op(self, line):
+        """table 第 line 项的 DecodedOp，不能预译码时返回 None"""
+        text, record = self.table[line]
+        if record is None:
+            return None
+        return DecodedOp(record[0], tuple(_decode_arg(arg) for arg in record[1]), text)
+
+    def decoded(self):
+        """逐条指令的 DecodedOp 列表"""
+        ops = [self.op(line) for line in range(len(self.table))]
+        return [ops[line] for line in self.lines]
+
+
+def read_source(path):
+    """读取 .asm 源文件，每行一条指令；空行和纯注释行保留为 NOP，不影响标签和数字 IP"""
+    with open(path, encoding='utf-8') as source:
+        return _source_lines(source.read())
+
+
+def _source_lines(text):
+    return text.splitlines()
+
+
+def _encode_arg(arg):
+    # marshal 不认识 namedtuple：OperandSpec 存成 list，与其它 tuple 参数区分开
+    return [arg.kind, arg.value] if type(arg) is OperandSpec else arg
+
+
+def _decode_arg(arg):
+    return OperandSpec(*arg) if type(arg) is list else arg
+
+
+def assemble(instructions):
+    """把指令列表汇编为 ObjectProgram：扫描符号、预译码每一个不同的行"""
+    instructions = list(instructions)
+    symbols = scan_symbols(instructions)
+    index = {}
+    table = []
+    for instruction in instructions:
+        if instruction not in index:
+            index[instruction] = len(table)
+            op = decode(instruction, symbols)
+            table.append((instruction, None if op is None else
+                          (op.opcode, tuple(_encode_arg(arg) for arg in op.args))))
+    lines = array('I', (index[instruction] for instruction in instructions))
+    return ObjectProgram(instructions, lines, tuple(table), symbols, symbols.data_image())
+
+
+def dumps(program):
+    """序列化为目标文件内容：文件头 + marshal 编码的主体"""
+    body = (program.table, program.lines.tobytes(), program.symbols.snapshot(), program.data)
+    return MAGIC + bytes((FORMAT_VERSION,)) + marshal.dumps(body)
+
+
+def loads(buffer):
+    """从 bytes 或 mmap 反序列化；内容无效时抛出 ValueError"""
+    header = len(MAGIC) + 1
+    if bytes(buffer[:len(MAGIC)]) != MAGIC or buffer[len(MAGIC):header] != bytes((FORMAT_VERSION,)):
+        raise ValueError("不是当前版本的目标文件")
+    # 显式释放视图：mmap 关闭时不能还有导出的缓冲区
+    with memoryview(buffer) as view, view[header:] as body:
+        try:
+            table, line_bytes, symbol_state, data = marshal.loads(body)
+        except (EOFError, TypeError) as error:
+            raise ValueError(f"目标文件已损坏: {error}") from None
+    lines = array('I')
+    lines.frombytes(line_bytes)
+    texts = [text for text, _ in table]
+    symbols = SymbolTable()
+    symbols.restore(symbol_state)
+    return ObjectProgram([texts[line] for line in lines], lines, table, symbols, data)
+
+
+def source_key(source):
+    """缓存键：源代码内容 + 目标文件格式 + 解释器（marshal 格式随 Python 版本变化）"""
+    digest = hashlib.sha256(source)
+    digest.update(f"{FORMAT_VERSION}:{marshal.version}:{sys.implementation.cache_tag}".encode())
+    return digest.hexdigest()
+
+
+def cache_path(path, key, cache_dir=None):
+    directory = cache_dir if cache_dir is not None else os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                                      CACHE_DIRECTORY)
+    name = os.path.basename(path)
+    if name.endswith(SOURCE_SUFFIX):
+        name = name[:-len(SOURCE_SUFFIX)]
+    return os.path.join(directory, f"{name}.{key[:32]}.obj")
+
+
+def _map_object(path):
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return loads(mapped)
+
+
+def _write_object(path, data):
+    """先写临时文件再改名：并发启动的进程不会读到写了一半的目标文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def load_source(path, cache_dir=None):
+    """装入 .asm 源文件：缓存中有同一内容的目标文件时直接映射，否则汇编并写入缓存
+
+    返回 (ObjectProgram, 是否命中缓存)。缓存目录不可写时照常汇编，只是不保存。
+    """
+    with open(path, 'rb') as source:
+        text = source.read()
+    target = cache_path(path, source_key(text), cache_dir)
+    try:
+        return _map_object(target), True
+    except (OSError, ValueError):
+        pass  # 没有缓存，或者是损坏 / 旧格式的文件：重新汇编覆盖它
+    program = assemble(_source_lines(text.decode('utf-8')))
+    try:
+        _write_object(target, dumps(program))
+    except OSError:
+        pass
+    return program, False
@@ -0,0 +1,109 @@
+from Registers import REGISTER_INDEX, IP
+
+# 会改变控制流（或无法预知是否改变）的处理方法，基本块在这些指令处结束；
+# STI / EOI / POPF 之后可能有中断立即可以响应，也结束基本块，让运行循环在块边界检查 INTR；
+# 推进 / 配置 8253 和 OUT（经 IOBus 写 8259A 的屏蔽字或 EOI）可能使 INTR 有效，同样结束基本块，
+# 保证中断在每条指令边界响应，块模式与逐条分派的结果一致；
+# 窥孔融合的超级指令（见 Peephole）把 IP 移到段尾，同样结束基本块
+TERMINATORS = frozenset(('_op_jmp', '_op_call', '_op_ret', '_op_hlt', '_execute_text',
+                         '_op_jcc', '_op_loop', '_op_loope', '_op_loopne', '_op_jcxz',
+                         '_op_int', '_op_iret', 'sti', '_op_eoi', '_op_rep', '_op_popf',
+                         '_op_tick_timer', '_op_config_timer', '_op_start_timer', '_op_out', '_op_out_dx',
+                         '_op_tick_run', '_op_write_ports'))
+LAZY_HANDLER = '_op_bind'  # 目标文件中尚未绑定的指令的占位处理方法（见 EU.link_object）
+MAX_BLOCK_LENGTH = 256  # 限制单个块的长度，控制编译开销
+HOT_THRESHOLD = 2  # 第几次进入时才编译；只执行一次的直线代码编译不划算，留给逐条分派
+
+
+class BlockCache:
+    """基本块编译器：把一段直线代码的预译码 IR 编译成一个 Python 函数
+
+    块从入口 IP 开始，遇到 JMP/Jcc/LOOP/CALL/RET/HLT（或字符串解释兜底的指令）结束，
+    也在下一个标签 / 过程入口之前结束。入口被执行到 HOT_THRESHOLD 次时才编译，
+    之后解释器的分派开销按块而不是按指令计算。
+    """
+
+    def __init__(self, program, registers, leaders=(), resolve=None):
+        self.program = program  # EU.decode_program 的结果：(处理方法, 参数) 列表
+        self.registers = registers  # RegisterFile.values
+        self.leaders = set(leaders)  # 标签、过程入口等静态的块首
+        self.resolve = resolve  # ip -> 绑定后的 (处理方法, 参数)，program 中有延迟绑定的占位项时给出
+        self.blocks = [None] * len(program)  # 入口 IP -> (函数, 指令条数, 结束 IP)
+        self.hits = bytearray(len(program))  # 尚未编译的入口被进入的次数
+        self.compiled = 0
+
+    def lookup(self, ip):
+        """返回 ip 处的已编译块；入口还不够热时返回 None，由调用方逐条执行"""
+        block = self.blocks[ip]
+        if block is None:
+            if self.hits[ip] + 1 < HOT_THRESHOLD:
+                self.hits[ip] += 1
+                return None
+            block = self.compile(ip)
+        return block
+
+    def _entry(self, ip):
+        entry = self.program[ip]
+        if self.resolve is not None and entry[0].__name__ == LAZY_HANDLER:
+            entry = self.resolve(ip)
+        return entry
+
+    def _block_end(self, start):
+        end = start
+        limit = min(len(self.program), start + MAX_BLOCK_LENGTH) - 1
+        while end < limit:
+            handler = self._entry(end)[0]
+            if handler.__name__ in TERMINATORS or end + 1 in self.leaders:
+                break
+            end += 1
+        return end
+
+    def compile(self, start):
+        end = self._block_end(start)
+        namespace = {'R': self.registers}
+        body = []
+        for offset, ip in enumerate(range(start, end + 1)):
+            handler, args = self._entry(ip)
+            last = ip == end
+            if last and end != start:
+                body.append(f"    R[{IP}] = {end}")  # 最后一条指令执行前同步 IP
+            statement = self._inline(handler, args)
+            if statement is not None:
+                body.append(f"    {statement}")
+                continue
+            names = []
+            for position, arg in enumerate(args):
+                name = f"a{offset}_{position}"
+                namespace[name] = arg
+                names.append(name)
+            namespace[f"h{offset}"] = handler
+            call = f"h{offset}({', '.join(names)})"
+            # 块的返回值就是最后一条指令的返回值（HLT 返回 False）
+            body.append(f"    return {call}" if last else f"    {call}")
+
+        source = f"def block_{start}():\n" + "\n".join(body) + "\n"
+        exec(compile(source, f"<block {start}-{end}>", "exec"), namespace)
+        block = (namespace[f"block_{start}"], end - start + 1, end)
+        self.blocks[start] = block
+        self.compiled += 1
+        return block
+
+    @staticmethod
+    def _inline(handler, args):
+        """寄存器 / 立即数之间的 MOV 直接生成数组赋值，省去一次方法调用"""
+        if handler.__name__ != '_op_mov':
+            return None
+        dest, src = (arg.spec for arg in args)
+        if dest.kind != 'reg':
+            return None
+        if src.kind == 'imm':
+            return f"R[{REGISTER_INDEX[dest.value]}] = {src.value & 0xFFFF}"
+        if src.kind == 'reg':
+            return f"R[{REGISTER_INDEX[dest.value]}] = R[{REGISTER_INDEX[src.value]}]"
+        return None
+
+    def invalidate(self, ip):
+        """指令 ip 被修改后，丢弃所有覆盖它的已编译块"""
+        for start, block in enumerate(self.blocks):
+            if block is not None and start <= ip <= block[2]:
+                self.blocks[start] = None
@@ -0,0 +1,69 @@
+from IOBus import IOBus, PIC_MASTER_PORT, PIC_SLAVE_PORT, TIMER_PORT, PPI_PORT, DEVICE_PORT, DEVICE_PORT_COUNT
+from Peripheral import Peripheral
+from PIC8259A import PIC8259A
+from PICMaster import PICMaster
+from PTimer8253 import Timer8253
+from Parallel8255 import Parallel8255
+from Trace import trace
+
+TIMER_IRQ = 0  # 8253 计数器 0 的 OUT 接主 8259A 的 IR0（与 IBM PC 相同）
+SLAVE_VECTOR_BASE = 0x70  # 从片的中断类型号基址
+
+class Board:
+    """一块控制器主板：每个仿真家庭独占的一组外设芯片
+
+    包括家电外设、8253 定时器、8255 并行接口和级联的主 / 从 8259A，
+    由 CPU / EU 持有，同一进程里的多台 CPU 之间互不共享设备状态。
+    """
+
+    def __init__(self, tracer=trace, pin_accurate=False):
+        self.peripheral = Peripheral()
+        self.timer = Timer8253()
+        self.parallel = Parallel8255(pin_accurate)  # pin_accurate=True 时 8255 按引脚级逐步模拟
+        self.slave_pic = PIC8259A()
+        self.pic = PICMaster(self.slave_pic)  # 从片接在主片的 IR2 上
+        self.slave_pic.vector_base = SLAVE_VECTOR_BASE
+        self.timer.connect(0, self.timer_output)
+        self.io = IOBus()
+        self._map_ports()
+        self.set_tracer(tracer)
+
+    def _map_ports(self):
+        """按 IBM PC 的端口分配把板上芯片登记到 I/O 译码表"""
+        io, timer, parallel, peripheral = self.io, self.timer, self.parallel, self.peripheral
+        for pic, base, name in ((self.pic, PIC_MASTER_PORT, '8259A 主片'),
+                                (self.slave_pic, PIC_SLAVE_PORT, '8259A 从片')):
+            io.map(base, 1, lambda port, pic=pic: pic.read_command(),
+                   lambda port, value, pic=pic: pic.write_command(value), name)
+            io.map(base + 1, 1, lambda port, pic=pic: pic.read_data(),
+                   lambda port, value, pic=pic: pic.write_data(value), name)
+        io.map(TIMER_PORT, 3, lambda port: timer.read_port(port - TIMER_PORT),
+               lambda port, value: timer.write_port(port - TIMER_PORT, value), '8253')
+        io.map(TIMER_PORT + 3, 1, None, lambda port, value: timer.write_control_word(value), '8253')
+        io.map(PPI_PORT, 4, lambda port: parallel.read_register(port - PPI_PORT),
+               lambda port, value: parallel.write_register(port - PPI_PORT, value), '8255')
+        # 家电端口是固定的窗口，读写时才按下标查设备表：之后登记的设备同样可以用 IN / OUT 访问
+        io.map(DEVICE_PORT, DEVICE_PORT_COUNT, lambda port: peripheral.read_device(port - DEVICE_PORT),
+               lambda port, value: peripheral.write_device(port - DEVICE_PORT, value), '家电')
+
+    def timer_output(self, counter):
+        """计数器 0 计数结束：在主片上请求 IRQ0"""
+        self.pic.request_interrupt(TIMER_IRQ)
+
+    @property
+    def devices(self):
+        return self.peripheral, self.timer, self.parallel, self.pic, self.slave_pic
+
+    def set_tracer(self, tracer):
+        """让板上所有芯片使用同一个跟踪器（例如每个家庭各自的 JSONL 文件）"""
+        for device in self.devices:
+            device.trace = tracer
+        self.io.trace = tracer
+
+    def snapshot(self):
+        """按 (外设, 8253, 8255, 主 8259A, 从 8259A) 的顺序保存各芯片状态"""
+        return tuple(device.snapshot() for device in self.devices)
+
+    def restore(self, state):
+        for device, saved in zip(self.devices, state):
+            device.restore(saved)
@@ -0,0 +1,55 @@
+import time
+
+
+class Clock:
+    """CPU 运行节拍控制：不限速 / 固定每秒指令数 / 实时逐条定速"""
+    UNTHROTTLED = 'unthrottled'  # 不限速，全速执行（CI / 批量仿真）
+    FIXED = 'fixed'  # 以固定的每秒指令数为目标，按批次补偿睡眠
+    REALTIME = 'realtime'  # 每条指令都对齐到自己的时间点，便于观察 GUI 变化
+    MODES = (UNTHROTTLED, FIXED, REALTIME)
+
+    def __init__(self, mode=UNTHROTTLED, ips=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid clock mode: {mode}")
+        if mode != self.UNTHROTTLED and not ips:
+            raise ValueError("ips must be set for a throttled clock")
+        self.mode = mode
+        self.ips = ips
+        # 固定速率模式每秒约检查 100 次，实时模式每条指令检查一次
+        self.batch = max(1, int(ips // 100)) if mode == self.FIXED else 1
+        self.start_time = 0.0
+        self.count = 0
+        self.pending = 0
+
+    @classmethod
+    def unthrottled(cls):
+        return cls(cls.UNTHROTTLED)
+
+    @classmethod
+    def fixed(cls, ips):
+        return cls(cls.FIXED, ips)
+
+    @classmethod
+    def realtime(cls, ips):
+        return cls(cls.REALTIME, ips)
+
+    @property
+    def throttled(self):
+        return self.mode != self.UNTHROTTLED
+
+    def start(self):
+        """开始计时，按绝对时间表定速，避免累积误差"""
+        self.start_time = time.perf_counter()
+        self.count = 0
+        self.pending = 0
+
+    def pace(self):
+        """每执行一条指令调用一次，必要时睡眠到该批次的目标时间"""
+        self.pending += 1
+        if self.pending < self.batch:
+            return
+        self.count += self.pending
+        self.pending = 0
+        delay = self.start_time + self.count / self.ips - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,134 @@
+from DeviceRegistry import DeviceRegistry
+
+CELL_WIDTH = 96  # 每个设备格子的大小（像素）
+CELL_HEIGHT = 28
+PADDING = 3
+OFF_COLOR = '#d9d9d9'
+ON_COLORS = {'LED': '#f5d442', 'Fan': '#5aa9e6'}  # 按设备类型区分开启时的颜色
+DEFAULT_ON_COLOR = '#7ccd7c'
+
+
+class Dashboard:
+    """画在一个 Canvas 上的设备面板，由设备列表生成，按行虚拟化
+
+    Canvas 上只有可见格子的图形项（矩形 + 文字各一个），它们的位置固定；
+    滚动时只改变每个格子显示的是哪个设备。每一帧只重画状态变化了且可见的设备，
+    所以设备数量增加到上万时，一帧的开销只和可见格子数与实际变化数有关。
+    devices 为 DeviceRegistry 时直接读它的设备名和下标，之后登记的设备由 sync 加到面板上；
+    也可以只给设备名列表。canvas 只需要 create_rectangle / create_text / coords / itemconfigure，便于替换。
+    """
+
+    def __init__(self, canvas, devices, width, height):
+        self.canvas = canvas
+        self.devices = devices if isinstance(devices, DeviceRegistry) else DeviceRegistry(devices)
+        self.names = self.devices.names  # 与设备表共用，不复制
+        self.index = self.devices.ids
+        self.states = bytearray(self.devices.states)  # 每个设备最近一次收到的状态
+        self.slots = []  # 可见格子的 (矩形项, 文字项)
+        self.shown = []  # 每个格子当前画的 (设备下标, 状态)，-1 表示空格子
+        self.columns = 1
+        self.visible_rows = 0
+        self.top = 0  # 第一个可见行
+        self.painted = 0  # 累计重画的格子数
+        self.resize(width, height)
+
+    @property
+    def rows(self):
+        return -(-len(self.states) // self.columns)
+
+    def resize(self, width, height):
+        """窗口大小变化：重新计算列数和可见行数，格子池按需增减"""
+        columns = max(1, width // CELL_WIDTH)
+        visible_rows = max(1, -(-height // CELL_HEIGHT))  # 最后一行露出一部分也算可见
+        if (columns, visible_rows) == (self.columns, self.visible_rows):
+            return
+        first = self.top * self.columns
+        self.columns, self.visible_rows = columns, visible_rows
+        self.top = first // columns  # 保持原来的第一个设备仍在第一行
+        canvas = self.canvas
+        wanted = columns * visible_rows
+        while len(self.slots) > wanted:
+            rectangle, text = self.slots.pop()
+            canvas.delete(rectangle, text)
+            self.shown.pop()
+        while len(self.slots) < wanted:
+            self.slots.append((canvas.create_rectangle(0, 0, 0, 0, outline=''),
+                               canvas.create_text(0, 0, anchor='w', font=('TkDefaultFont', 9))))
+            self.shown.append(None)
+        for slot, (rectangle, text) in enumerate(self.slots):
+            row, column = divmod(slot, columns)
+            x, y = column * CELL_WIDTH, row * CELL_HEIGHT
+            canvas.coords(rectangle, x + PADDING, y + PADDING, x + CELL_WIDTH - PADDING, y + CELL_HEIGHT - PADDING)
+            canvas.coords(text, x + 2 * PADDING, y + CELL_HEIGHT // 2)
+        self.scroll_to(self.top, force=True)
+
+    def scroll_to(self, row, force=False):
+        """让第 row 行成为第一个可见行，返回是否真的移动了"""
+        row = max(0, min(row, self.rows - self.visible_rows))
+        if row == self.top and not force:
+            return False
+        self.top = row
+        for slot in range(len(self.slots)):
+            self._paint(slot)
+        return True
+
+    def scroll_by(self, rows):
+        return self.scroll_to(self.top + rows)
+
+    def page(self, pages):
+        return self.scroll_by(pages * max(1, self.visible_rows - 1))
+
+    def view(self):
+        """可见部分在全部行中的位置 (first, last)，用于滚动条的 set"""
+        rows = self.rows
+        if rows <= self.visible_rows:
+            return 0.0, 1.0
+        return self.top / rows, min(1.0, (self.top + self.visible_rows) / rows)
+
+    def sync(self):
+        """把上次以来新登记的设备加到面板上（状态取设备表中的当前值），返回是否有新设备"""
+        known = len(self.states)
+        if len(self.names) <= known:
+            return False
+        self.states += self.devices.states[known:len(self.names)]
+        self.scroll_to(self.top, force=True)  # 只重画空着或内容变了的可见格子
+        return True
+
+    def update(self, updates):
+        """应用一帧的 [(设备, 状态)]：记录全部变化，只重画其中可见的格子"""
+        first = self.top * self.columns
+        count = len(self.slots)
+        known = len(self.states)
+        for device, state in updates:
+            position = self.index.get(device)
+            if position is None or position >= known:  # 面板上没有的设备名（例如大小写不同），或尚未 sync 的新设备
+                continue
+            state = 1 if state else 0
+            if self.states[position] == state:
+                continue
+            self.states[position] = state
+            slot = position - first
+            if 0 <= slot < count:
+                self._paint(slot)
+
+    def _paint(self, slot):
+        position = self.top * self.columns + slot
+        if position >= len(self.states):
+            if self.shown[slot] != -1:
+                rectangle, text = self.slots[slot]
+                self.canvas.itemconfigure(rectangle, state='hidden')
+                self.canvas.itemconfigure(text, state='hidden')
+                self.shown[slot] = -1
+            return
+        state = self.states[position]
+        if self.shown[slot] == (position, state):
+            return
+        rectangle, text = self.slots[slot]
+        self.canvas.itemconfigure(rectangle, state='normal', fill=self._on_color(position) if state else OFF_COLOR)
+        self.canvas.itemconfigure(text, state='normal', text=f"{self.names[position]}: {'On' if state else 'Off'}")
+        self.shown[slot] = (position, state)
+        self.painted += 1
+
+    def _on_color(self, position):
+        devices = self.devices
+        return ON_COLORS.get(devices.labels['kind'][devices.codes['kind'][position]], DEFAULT_ON_COLOR)
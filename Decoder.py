@@ -0,0 +1,202 @@
+from collections import namedtuple
+
+from Registers import REGISTER_NAMES
+
+# 预译码后的指令记录：操作码、参数（已解析的整数/字符串或操作数描述）、原始源码
+DecodedOp = namedtuple('DecodedOp', ['opcode', 'args', 'text'])
+
+# 操作数描述：kind 为 imm / reg / mem / ind / based / data 之一
+OperandSpec = namedtuple('OperandSpec', ['kind', 'value'])
+
+# 数据定义伪指令
+DATA_DIRECTIVES = ('DB', 'DW', 'DD')
+
+# 只有一个寄存器/内存目的操作数的指令
+UNARY_OPS = ('NOT', 'NEG', 'INC', 'DEC', 'POP')
+# 目的操作数 + 源操作数的双操作数指令（移位 / 循环移位的源操作数是次数）
+BINARY_OPS = ('MOV', 'ADD', 'SUB', 'MUL', 'DIV', 'AND', 'OR', 'XOR', 'ADC', 'SBB',
+              'SHL', 'SAL', 'SHR', 'SAR', 'ROL', 'ROR', 'RCL', 'RCR')
+# 只读取两个操作数、不写回的比较指令（第一个操作数也可以是立即数）
+COMPARE_OPS = ('CMP', 'TEST')
+# 条件转移 -> 条件（同义的助记符共用一个条件）
+JCC_CONDITIONS = {
+    'JE': 'Z', 'JZ': 'Z', 'JNE': 'NZ', 'JNZ': 'NZ',
+    'JC': 'C', 'JB': 'C', 'JNAE': 'C', 'JNC': 'NC', 'JAE': 'NC', 'JNB': 'NC',
+    'JS': 'S', 'JNS': 'NS', 'JO': 'O', 'JNO': 'NO',
+    'JP': 'P', 'JPE': 'P', 'JNP': 'NP', 'JPO': 'NP',
+    'JA': 'A', 'JNBE': 'A', 'JBE': 'BE', 'JNA': 'BE',
+    'JL': 'L', 'JNGE': 'L', 'JGE': 'GE', 'JNL': 'GE',
+    'JLE': 'LE', 'JNG': 'LE', 'JG': 'G', 'JNLE': 'G',
+}
+# 以 CX 计数的循环 / 转移指令 -> 规范名
+LOOP_OPS = {'LOOP': 'LOOP', 'LOOPE': 'LOOPE', 'LOOPZ': 'LOOPE', 'LOOPNE': 'LOOPNE', 'LOOPNZ': 'LOOPNE',
+            'JCXZ': 'JCXZ'}
+# 无操作数指令
+NULLARY_OPS = ('HLT', 'RET', 'MOVSB', 'MOVSW', 'CMPSB', 'CMPSW', 'STC', 'CLC', 'ENDP',
+               'STI', 'CLI', 'IRET', 'EOI', 'SCASB', 'SCASW', 'STOSB', 'STOSW', 'LODSB', 'LODSW',
+               'PUSHF', 'POPF')
+# 串操作 -> (操作, 元素字节数)
+STRING_OPS = {'MOVSB': ('movs', 1), 'MOVSW': ('movs', 2), 'CMPSB': ('cmps', 1), 'CMPSW': ('cmps', 2),
+              'SCASB': ('scas', 1), 'SCASW': ('scas', 2), 'STOSB': ('stos', 1), 'STOSW': ('stos', 2),
+              'LODSB': ('lods', 1), 'LODSW': ('lods', 2)}
+# 重复前缀 -> CMPS / SCAS 继续重复所要求的 ZF（REP 与 REPE 是同一个前缀）
+REP_PREFIXES = {'REP': 1, 'REPE': 1, 'REPZ': 1, 'REPNE': 0, 'REPNZ': 0}
+# 段定义伪指令
+SEGMENT_DIRECTIVES = {'.CODE': 'CODE', '.DATA': 'DATA', '.STACK': 'STACK'}
+PORTS = ('A', 'B', 'C')
+SWITCH_STATES = {'ON': 1, 'OFF': 0}
+IO_WIDTHS = {'AL': 1, 'AX': 2}  # IN / OUT 的累加器 -> 访问的字节数
+
+
+def _is_int(text):
+    return text.isdigit() or (text[:1] == '-' and text[1:].isdigit())
+
+
+def parse_operand(operand, symbols):
+    """把操作数字符串解析为 OperandSpec，无法在装载时确定的返回 None"""
+    # 解析顺序与 EU.get_value 保持一致：立即数、寄存器、数据标签、代码标签、内存
+    if _is_int(operand):
+        return OperandSpec('imm', int(operand))
+    if operand in REGISTER_NAMES:
+        return OperandSpec('reg', operand)
+    if operand in symbols.data:
+        return OperandSpec('data', operand)
+    address = symbols.code_address(operand)
+    if address is not None:
+        return OperandSpec('imm', address)  # 标签 / 过程在装载时解析为整数 IP
+    if len(operand) > 2 and operand[0] == '[' and operand[-1] == ']':
+        inner = operand[1:-1]
+        if inner.isdigit():
+            return OperandSpec('mem', int(inner))
+        if inner in REGISTER_NAMES:
+            return OperandSpec('ind', inner)
+        if '+' in inner:
+            base, _, index = inner.partition('+')
+            if base in REGISTER_NAMES and index in REGISTER_NAMES:
+                return OperandSpec('based', (base, index))
+    return None
+
+
+def parse_io(opcode, parts):
+    """IN 累加器 端口 / OUT 端口 累加器 -> (端口号或 'DX', 字节数)，格式不对时抛出 ValueError"""
+    if len(parts) < 3:
+        raise ValueError(f"{opcode} 需要两个操作数")
+    port, accumulator = (parts[2], parts[1]) if opcode == 'IN' else (parts[1], parts[2])
+    if accumulator not in IO_WIDTHS:
+        raise ValueError(f"{opcode} 只能使用 AL 或 AX")
+    if port == 'DX':
+        return 'DX', IO_WIDTHS[accumulator]
+    number = int(port, 0)
+    if not 0 <= number <= 0xFF:
+        raise ValueError("立即数端口号必须在 0~255 之间，更大的端口号请用 DX")
+    return number, IO_WIDTHS[accumulator]
+
+
+def branch_target(operand, symbols):
+    """条件转移 / 循环指令的目标：标签或指令下标，在装载时解析为整数 IP，无法解析时返回 None"""
+    spec = parse_operand(operand, symbols)
+    return spec.value & 0xFFFF if spec is not None and spec.kind == 'imm' else None
+
+
+def _decode_parts(opcode, parts, symbols):
+    """返回参数元组；遇到只能在运行时处理的形式返回 None"""
+    argc = len(parts) - 1
+    if opcode in NULLARY_OPS:
+        return ()
+    if opcode in SEGMENT_DIRECTIVES:
+        return (SEGMENT_DIRECTIVES[opcode],)
+    if opcode in DATA_DIRECTIVES:
+        return (opcode, parts[1].rstrip(':'), int(parts[2], 0)) if argc >= 2 else None
+    if opcode == 'PROC':
+        return (parts[1],) if argc >= 1 else None
+    if ':' in opcode:
+        return (opcode.rstrip(':'),)
+    if opcode == 'VOICE' and argc >= 1 and parts[1] in REGISTER_NAMES:
+        return (OperandSpec('reg', parts[1]),)  # 语音码由寄存器给出（每个家庭的输入不同）
+    if opcode == 'VOICE':
+        return (parts[1],) if argc >= 1 else None
+    if opcode == 'STATUS':
+        return tuple(parts[1:]) if argc >= 1 else None  # 设备名或选择子（ALL、类型、ROOM=、GROUP=）
+    if opcode == 'SWITCH':
+        return (SWITCH_STATES[parts[1]],) + tuple(parts[2:]) if argc >= 2 and parts[1] in SWITCH_STATES else None
+    if opcode == 'CONFIG_TIMER':
+        return (int(parts[1]), int(parts[2]), int(parts[3])) if argc >= 3 else None
+    if opcode == 'TICK_TIMER' and argc >= 2:
+        return (int(parts[1]), int(parts[2]))  # TICK_TIMER 计数器 时钟数：一次推进多个时钟
+    if opcode in ('START_TIMER', 'STOP_TIMER', 'TICK_TIMER'):
+        return (int(parts[1]),) if argc >= 1 else None
+    if opcode in REP_PREFIXES:
+        if argc < 1 or parts[1] not in STRING_OPS:
+            return None
+        return STRING_OPS[parts[1]] + (REP_PREFIXES[opcode],)
+    if opcode in ('IN', 'OUT'):
+        port, width = parse_io(opcode, parts)
+        return (width,) if port == 'DX' else (port, width)
+    if opcode == 'INT':
+        return (int(parts[1], 0),) if argc >= 1 else None  # 中断类型号，可写成 0x21
+    if opcode in JCC_CONDITIONS or opcode in LOOP_OPS:
+        target = branch_target(parts[1], symbols) if argc >= 1 else None
+        if target is None:
+            return None
+        return (JCC_CONDITIONS[opcode], target) if opcode in JCC_CONDITIONS else (target,)
+    if opcode in COMPARE_OPS:
+        if argc < 2:
+            return None
+        specs = tuple(parse_operand(p, symbols) for p in parts[1:3])
+        return None if None in specs else specs
+    if opcode == 'WRITE_CTRL':
+        return (int(parts[1], 16),) if argc >= 1 else None
+    if opcode == 'WRITE_PORT':
+        return (parts[1], int(parts[2], 16)) if argc >= 2 and parts[1] in PORTS else None
+    if opcode == 'READ_PORT':
+        return (parts[1],) if argc >= 1 and parts[1] in PORTS else None
+
+    if opcode in BINARY_OPS or opcode in ('PUSH', 'JMP', 'CALL') or opcode in UNARY_OPS:
+        arity = 2 if opcode in BINARY_OPS else 1
+        if argc < arity:
+            return None
+        specs = tuple(parse_operand(p, symbols) for p in parts[1:arity + 1])
+        if None in specs:
+            return None
+        # 目的操作数必须可写
+        if (opcode in BINARY_OPS or opcode in UNARY_OPS) and specs[0].kind in ('imm', 'data'):
+            return None
+        return specs
+    return None
+
+
+def decode(instruction, symbols):
+    """预译码一条源代码指令，无法预译码时返回 None（由字符串解释路径兜底执行）"""
+    text = instruction.split(";")[0].strip()  # 移除注释
+    parts = text.split()
+    if not parts:
+        return DecodedOp('NOP', (), instruction)
+    opcode = parts[0]
+    try:
+        args = _decode_parts(opcode, parts, symbols)
+    except ValueError:
+        return None
+    if args is None:
+        return None
+    if opcode in SEGMENT_DIRECTIVES:
+        opcode = 'SEGMENT'
+    elif opcode in DATA_DIRECTIVES:
+        opcode = 'DEFINE'
+    elif ':' in opcode:
+        opcode = 'LABEL'
+    elif opcode == 'VOICE' and type(args[0]) is OperandSpec:
+        opcode = 'VOICE_REG'
+    elif opcode in REP_PREFIXES:
+        opcode = 'REP'
+    elif opcode in JCC_CONDITIONS:
+        opcode = 'JCC'
+    elif opcode in LOOP_OPS:
+        opcode = LOOP_OPS[opcode]
+    elif opcode in ('IN', 'OUT') and len(args) == 1:
+        opcode += '_DX'  # 端口号在运行时由 DX 给出
+    return DecodedOp(opcode, args, instruction)
+
+
+def decode_program(instructions, symbols):
+    """对整个指令列表进行预译码，symbols 为装载阶段建立的 Loader.SymbolTable"""
+    return [decode(instruction, symbols) for instruction in instructions]
@@ -0,0 +1,173 @@
+from array import array
+from itertools import compress
+
+ATTRIBUTES = ('kind', 'room', 'group')  # 建有二级索引的设备属性
+NO_VALUE = -0x80000000  # values 数组里表示“没有附加值”（None）
+ALL = 'ALL'  # 选择全部设备的选择子
+
+
+def device_type(name):
+    """设备名去掉末尾的编号：LED3 -> LED"""
+    return name.rstrip('0123456789')
+
+
+class DeviceRegistry:
+    """按下标存储的设备表，设备数量不限
+
+    第 i 个设备的开关状态在 states[i]（bytearray），附加值在 values[i]（array('i')），
+    类型 / 房间 / 分组各用一个 array('H') 存编码，并为每个取值建立设备下标的索引
+    （array('I')，按加入顺序）。批量查询直接在这些数组上计数，不为每个设备建立对象。
+    迭代得到设备名，len 为设备数，与原来的 {设备名: {...}} 字典用法保持一致。
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}  # 设备名 -> 下标
+        self.states = bytearray()
+        self.values = array('i')
+        self.codes = {key: array('H') for key in ATTRIBUTES}  # 每个设备的属性编码，0 表示未设置
+        self.labels = {key: [None] for key in ATTRIBUTES}  # 编码 -> 属性值
+        self._label_codes = {key: {None: 0} for key in ATTRIBUTES}
+        self.indexes = {key: {} for key in ATTRIBUTES}  # 属性值 -> 设备下标 array('I')
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def add(self, name, kind=None, room=None, group=None):
+        """登记一个设备并返回它的下标；kind 缺省时由设备名推出（LED3 -> LED）"""
+        if name in self.ids:
+            raise ValueError(f"设备 {name} 已存在")
+        device = len(self.names)
+        self.names.append(name)
+        self.ids[name] = device
+        self.states.append(0)
+        self.values.append(NO_VALUE)
+        for key, label in zip(ATTRIBUTES, (kind or device_type(name), room, group)):
+            self.codes[key].append(self._code(key, label))
+            if label is not None:
+                self.indexes[key].setdefault(label, array('I')).append(device)
+        return device
+
+    def _code(self, key, label):
+        codes = self._label_codes[key]
+        if label not in codes:
+            codes[label] = len(self.labels[key])
+            self.labels[key].append(label)
+        return codes[label]
+
+    # ---------- 单个设备 ----------
+
+    def state(self, name):
+        return self.states[self.ids[name]]
+
+    def value(self, name):
+        value = self.values[self.ids[name]]
+        return None if value == NO_VALUE else value
+
+    def set(self, device, state, value=None):
+        self.states[device] = 1 if state else 0
+        self.values[device] = NO_VALUE if value is None else value
+
+    def attribute(self, name, key):
+        return self.labels[key][self.codes[key][self.ids[name]]]
+
+    def entries(self):
+        """按下标顺序的 (状态, 附加值) 元组"""
+        return tuple((state, None if value == NO_VALUE else value) for state, value in zip(self.states, self.values))
+
+    def items(self):
+        return zip(self.names, self.entries())
+
+    # ---------- 选择与批量操作 ----------
+
+    def select(self, kind=None, room=None, group=None):
+        """满足全部给定条件的设备下标：都未给出时为 range（全部设备），否则为 array('I')（调用方不要修改）
+
+        从最短的索引出发，其余条件在属性编码数组上过滤，扫描在 C 层完成。
+        """
+        wanted = [(key, label) for key, label in zip(ATTRIBUTES, (kind, room, group)) if label is not None]
+        if not wanted:
+            return range(len(self.names))
+        empty = array('I')
+        key, label = min(wanted, key=lambda item: len(self.indexes[item[0]].get(item[1], empty)))
+        candidates = self.indexes[key].get(label, empty)
+        for other, other_label in wanted:
+            if other == key:
+                continue
+            code = self._label_codes[other].get(other_label)
+            if code is None:
+                return empty
+            candidates = array('I', compress(candidates, map(code.__eq__, map(self.codes[other].__getitem__,
+                                                                                candidates))))
+        return candidates
+
+    def parse_selector(self, terms):
+        """客户程序中的选择子 -> 设备下标；不认识的写法返回 None
+
+        terms 为空格分开的若干项，同时满足：ALL、设备名（只能单独出现）、设备类型（LED / Fan）、
+        ROOM=房间、GROUP=分组。
+        """
+        if len(terms) == 1 and terms[0] in self.ids:
+            return array('I', (self.ids[terms[0]],))
+        criteria = {}
+        for term in terms:
+            if term == ALL:
+                continue
+            key, separator, label = term.partition('=')
+            if separator and key.lower() in ('room', 'group'):
+                criteria[key.lower()] = label
+            elif term in self.indexes['kind']:
+                criteria['kind'] = term
+            else:
+                return None
+        return self.select(**criteria)
+
+    def count_on(self, devices):
+        """devices 中处于开启状态的设备数"""
+        if isinstance(devices, range) and devices.step == 1:
+            return self.states.count(1, devices.start, devices.stop)
+        return sum(map(self.states.__getitem__, devices))
+
+    def set_states(self, devices, state, collect=False):
+        """把 devices 全部置为 state 并清空附加值
+
+        返回状态确实改变了的设备数；collect=True 时改为返回这些设备的下标列表（GUI 需要逐个刷新）。
+        """
+        state = 1 if state else 0
+        states, values = self.states, self.values
+        if collect:
+            changed = list(compress(devices, map(state.__ne__, map(states.__getitem__, devices))))
+        else:
+            on = self.count_on(devices)
+            changed = len(devices) - on if state else on
+        if isinstance(devices, range) and devices.step == 1:
+            states[devices.start:devices.stop] = bytes((state,)) * len(devices)
+            values[devices.start:devices.stop] = array('i', (NO_VALUE,)) * len(devices)
+            return changed
+        for device in changed if collect else devices:
+            states[device] = state
+        for device in compress(devices, map(NO_VALUE.__ne__, map(values.__getitem__, devices))):
+            values[device] = NO_VALUE
+        return changed
+
+    # ---------- 检查点 ----------
+
+    def snapshot(self):
+        return bytes(self.states), self.values.tobytes()
+
+    def restore(self, state):
+        """原地恢复开关状态和附加值；设备登记本身不回退，快照之后登记的设备恢复为关闭、没有附加值"""
+        states, values = state
+        extra = len(self.names) - len(states)
+        if extra < 0:
+            raise ValueError(f"快照中有 {len(states)} 个设备，设备表只有 {len(self.names)} 个")
+        self.states[:] = states + bytes(extra)  # 原地覆盖，端口映射等闭包仍引用同一个对象
+        self.values[:] = array('i', values) + array('i', (NO_VALUE,)) * extra
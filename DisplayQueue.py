@@ -0,0 +1,41 @@
+from collections import deque
+
+FRAME_RATE = 30  # GUI 每秒刷新的帧数
+
+
+class DisplayQueue:
+    """CPU 线程 -> Tk 线程的设备状态更新队列：无锁，同一帧内同一设备的多次变化合并为一次
+
+    生产者（CPU 线程）只调用 publish：先写 latest，再在设备不在 pending 中时把它排进 dirty。
+    消费者（Tk 线程）调用 drain：先从 dirty 取出设备并移出 pending，再读 latest。
+    deque 的 append / popleft 和 dict / set 的单次操作在 GIL 下都是原子的；
+    生产者看到设备仍在 pending 时，消费者一定还没有读它的 latest，所以不会丢失最后的状态，
+    最坏情况只是同一设备在 dirty 里出现两次。
+    """
+
+    def __init__(self):
+        self.latest = {}  # 设备 -> 最近一次发布的状态，只由生产者写
+        self.pending = set()  # 已排进 dirty、消费者还没有取走的设备
+        self.dirty = deque()
+        self.published = 0  # publish 的调用次数
+        self.delivered = 0  # drain 交给 GUI 的更新条数
+
+    def publish(self, device, state):
+        """记录设备的新状态（任何线程都可以调用，不会阻塞）"""
+        self.latest[device] = state
+        self.published += 1
+        if device not in self.pending:
+            self.pending.add(device)
+            self.dirty.append(device)
+
+    def drain(self):
+        """取出上一帧以来状态变化过的设备，返回 [(设备, 最新状态)]，每个设备至多一项"""
+        devices = {}  # 保持先后顺序的去重
+        dirty = self.dirty
+        for _ in range(len(dirty)):  # 只取这一帧开始时已排队的，生产者再快也不会让 Tk 线程停在这里
+            device = dirty.popleft()
+            self.pending.discard(device)
+            devices[device] = None
+        updates = [(device, self.latest[device]) for device in devices]
+        self.delivered += len(updates)
+        return updates
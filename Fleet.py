@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Assembler import load_source
+from Trace import trace, OFF
+
+# 每个作业的结果记录，只包含可序列化的基本类型，便于跨进程回传
+FleetResult = namedtuple('FleetResult', ['job', 'status', 'instruction_count', 'registers',
+                                         'devices', 'timers', 'elapsed', 'error'])
+
+HALTED, BUDGET, TIMEOUT, ERROR = 'halted', 'budget', 'timeout', 'error'
+
+
+def _init_worker():
+    """工作进程不输出跟踪信息，避免成千上万个程序的输出挤在终端上"""
+    trace.set_level(OFF)
+    trace.set_console(False)
+
+
+def run_job(job, program, max_instructions=None, timeout=None):
+    """在当前进程里以 headless 模式运行一个程序，返回 FleetResult"""
+    from final import CPU  # 延迟导入：工作进程只在真正执行作业时才装载仿真器
+
+    start = time.perf_counter()
+    cpu = None
+    watchdog = None
+    try:
+        if isinstance(program, str):  # .asm 文件路径：映射磁盘缓存里的目标文件，不在工作进程里解析源码
+            cpu = CPU(None, [], headless=True)
+            cpu.load_object(load_source(program)[0])
+        else:
+            cpu = CPU(None, list(program), headless=True)
+        if timeout is not None:
+            # 超时后清除 running 标志，运行循环在下一条指令（或下一个块）处退出
+            watchdog = threading.Timer(timeout, cpu.stop)
+            watchdog.start()
+        cpu.run_cpu(max_instructions)
+    except Exception as error:  # 单个作业出错（包括文件缺失、编码或汇编错误）不影响同一分片里的其它作业
+        count, registers = (cpu.instruction_count, tuple(cpu.eu.registers.values)) if cpu is not None else (0, ())
+        return FleetResult(job, ERROR, count, registers, {}, (), time.perf_counter() - start,
+                           f"{type(error).__name__}: {error}")
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+
+    if not cpu.running:
+        status = TIMEOUT
+    elif max_instructions is not None and cpu.instruction_count >= max_instructions:
+        status = BUDGET
+    else:
+        status = HALTED
+    board = cpu.board
+    devices = dict(board.peripheral.devices.items())
+    timers = tuple(counter['counter_register'] for counter in board.timer.counters)
+    return FleetResult(job, status, cpu.instruction_count, tuple(cpu.eu.registers.values), devices, timers,
+                       time.perf_counter() - start, None)
+
+
+def _run_chunk(chunk, max_instructions, timeout):
+    return [run_job(job, program, max_instructions, timeout) for job, program in chunk]
+
+
+def _chunks(programs, chunksize):
+    chunk = []
+    for job in programs:
+        chunk.append(job)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_fleet(programs, workers=None, chunksize=16, max_instructions=None, timeout=None):
+    """把大量程序分片到进程池中执行，按完成顺序逐条产出 FleetResult
+
+    programs 可以是指令列表的序列（作业号为下标），也可以是 (作业号, 指令列表) 二元组；
+    指令列表也可以换成 .asm 文件路径，由工作进程经 Assembler 的目标文件缓存装入。
+    chunksize 控制每次提交给工作进程的作业数，分片越大进程间通信越少、负载越不均衡；
+    max_instructions / timeout 作用于单个作业。
+    """
+    jobs = (item if isinstance(item, tuple) else (index, item) for index, item in enumerate(programs))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(_run_chunk, chunk, max_instructions, timeout)
+                   for chunk in _chunks(jobs, chunksize)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def scaling(programs, worker_counts=None, chunksize=16, max_instructions=None, timeout=None):
+    """用 1..N 个工作进程分别跑同一批程序，返回 (进程数, 耗时, 程序/秒, 指令/秒, 加速比) 列表"""
+    if worker_counts is None:
+        cores = os.cpu_count() or 1
+        worker_counts = sorted({1, *(n for n in (2, 4, 8, 16, 32, 64) if n < cores), cores})
+    programs = list(programs)
+    rows = []
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        count = sum(result.instruction_count
+                    for result in run_fleet(programs, workers, chunksize, max_instructions, timeout))
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = elapsed
+        rows.append((workers, elapsed, len(programs) / elapsed, count / elapsed, baseline / elapsed))
+    return rows
+
+
+def print_scaling(rows):
+    print(f"{'进程数':>6} {'耗时 (s)':>10} {'程序/秒':>10} {'指令/秒':>12} {'加速比':>8}")
+    for workers, elapsed, programs_rate, instructions_rate, speedup in rows:
+        print(f"{workers:>8} {elapsed:10.3f} {programs_rate:12.1f} {instructions_rate:14.0f} {speedup:9.2f}x")
+
+
+def load_program_file(path):
+    """程序文件每行一条指令，空行和纯注释行保留（不影响标签下标）"""
+    with open(path, encoding='utf-8') as source:
+        return [line.rstrip('\n') for line in source]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量 headless 运行家庭控制程序")
+    parser.add_argument("programs", nargs="+", help="程序文件，每行一条指令")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认等于 CPU 核数）")
+    parser.add_argument("--chunksize", type=int, default=16, help="每个分片包含的作业数")
+    parser.add_argument("--budget", type=int, default=None, help="每个作业的指令预算")
+    parser.add_argument("--timeout", type=float, default=None, help="每个作业的墙钟超时（秒）")
+    parser.add_argument("--scaling", action="store_true", help="从 1 到 N 个进程测量吞吐量扩展性")
+    options = parser.parse_args()
+
+    for path in set(options.programs):
+        try:
+            load_source(path)  # 先在主进程里汇编一次，工作进程启动后都只映射缓存里的目标文件
+        except (OSError, ValueError):
+            pass  # 出错的文件照常提交，由工作进程作为 ERROR 结果报告
+    programs = [(path, path) for path in options.programs]
+    if options.scaling:
+        print_scaling(scaling(programs, chunksize=options.chunksize,
+                              max_instructions=options.budget, timeout=options.timeout))
+    else:
+        for result in run_fleet(programs, options.workers, options.chunksize, options.budget, options.timeout):
+            print(json.dumps(result._asdict(), ensure_ascii=False))
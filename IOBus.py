@@ -0,0 +1,72 @@
+from Trace import trace, EVENTS
+
+PORT_COUNT = 0x10000  # 8086 的 I/O 地址空间为 64K 个端口
+OPEN_BUS = 0xFF  # 读未映射的端口时数据线悬空，读到全 1
+
+# IBM PC 的端口分配（主板芯片），以及本控制器的家电端口
+PIC_MASTER_PORT = 0x20  # 主 8259A：20H 命令 / 21H 数据（IMR）
+PIC_SLAVE_PORT = 0xA0  # 从 8259A：A0H 命令 / A1H 数据
+TIMER_PORT = 0x40  # 8253：40H~42H 计数器 0~2，43H 控制字
+PPI_PORT = 0x60  # 8255：60H~62H 端口 A~C，63H 控制寄存器
+DEVICE_PORT = 0x300  # 家电：300H 起每个设备一个端口（写开关状态 / 读当前状态）
+DEVICE_PORT_COUNT = PORT_COUNT - DEVICE_PORT  # 300H ~ FFFFH：第 i 个设备在 300H+i，没有设备的端口读到 FFH
+TIMER_PORTS = range(TIMER_PORT, TIMER_PORT + 4)
+
+
+class IOBus:
+    """I/O 端口地址译码
+
+    decode 是 64K 项的译码表，每个端口一个字节，给出处理该端口的槽号；
+    readers / writers 是各槽的处理函数 reader(port) / writer(port, value)。
+    一次端口访问就是一次查表加一次调用，新设备用 map 登记即可，不需要修改 EU。
+    """
+
+    def __init__(self):
+        self.decode = bytearray(PORT_COUNT)  # 槽 0 表示未映射
+        self.readers = [self._unmapped_read]
+        self.writers = [self._unmapped_write]
+        self.names = ['']
+        self.trace = trace
+
+    def map(self, first, count, reader=None, writer=None, name=''):
+        """把端口 first ~ first+count-1 映射到同一组处理函数，返回槽号"""
+        if not (0 <= first and first + count <= PORT_COUNT):
+            raise ValueError(f"端口范围越界: {first:#06x}+{count}")
+        slot = len(self.readers)
+        if slot > 0xFF:
+            raise ValueError("I/O 译码表的槽已用完")
+        self.readers.append(reader or self._unmapped_read)
+        self.writers.append(writer or self._unmapped_write)
+        self.names.append(name)
+        self.decode[first:first + count] = bytes((slot,)) * count
+        return slot
+
+    def unmap(self, first, count=1):
+        self.decode[first:first + count] = bytes(count)
+
+    def device_at(self, port):
+        """端口所属设备的名称，未映射时为空字符串"""
+        return self.names[self.decode[port]]
+
+    def read(self, port):
+        return self.readers[self.decode[port]](port)
+
+    def write(self, port, value):
+        self.writers[self.decode[port]](port, value)
+
+    def read_word(self, port):
+        """字访问：低字节来自 port，高字节来自 port+1"""
+        return self.read(port) | (self.read((port + 1) & 0xFFFF) << 8)
+
+    def write_word(self, port, value):
+        self.write(port, value & 0xFF)
+        self.write((port + 1) & 0xFFFF, (value >> 8) & 0xFF)
+
+    def _unmapped_read(self, port):
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'IOBus', f"读未映射的端口 {port:04X}H")
+        return OPEN_BUS
+
+    def _unmapped_write(self, port, value):
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'IOBus', f"写未映射的端口 {port:04X}H: {value:#04x}")
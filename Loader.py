@@ -0,0 +1,101 @@
+from Registers import SP, IP, CS, DS, ES, SS
+
+DATA_SIZES = {'DB': 1, 'DW': 2, 'DD': 4}  # 数据定义伪指令占用的字节数
+COM_ORIGIN = 0x100  # .COM 程序装入段内 100H 处，前面是 256 字节的程序段前缀（PSP）
+COM_SEGMENT = 0x1000  # 默认装入段
+DATA_ORIGIN = 0x400  # 数据段初值从 DS:400H 开始：DS 默认为 0，0:0 ~ 0:3FFH 是中断向量表
+
+
+class SymbolTable:
+    """装载阶段建立的符号表：代码标签、过程入口和数据定义"""
+
+    def __init__(self):
+        self.labels = {}  # 标签 -> 指令下标
+        self.procedures = {}  # 过程名 -> PROC 所在指令下标
+        self.data = {}  # 数据标签 -> 初始值
+        self.data_layout = {}  # 数据标签 -> (段内偏移, 字节数)
+        self.data_size = 0  # 数据段总字节数
+
+    def code_address(self, name):
+        """返回代码符号对应的 IP，不是代码符号时返回 None"""
+        if name in self.labels:
+            return self.labels[name]
+        return self.procedures.get(name)
+
+    def define(self, table, name, value, kind):
+        if name in self.labels or name in self.procedures or name in self.data:
+            raise ValueError(f"重复定义的{kind}: {name}")
+        table[name] = value
+
+    def clear(self):
+        self.labels.clear()
+        self.procedures.clear()
+        self.data.clear()
+        self.data_layout.clear()
+        self.data_size = 0
+
+    def snapshot(self):
+        """只含 dict / tuple / int 的状态，可直接写入目标文件"""
+        return (dict(self.labels), dict(self.procedures), dict(self.data), dict(self.data_layout), self.data_size)
+
+    def restore(self, state):
+        """原地恢复：EU 的 labels / procedures / data_segment 与这里的字典是同一个对象"""
+        labels, procedures, data, data_layout, self.data_size = state
+        for target, saved in ((self.labels, labels), (self.procedures, procedures),
+                              (self.data, data), (self.data_layout, data_layout)):
+            target.clear()
+            target.update(saved)
+
+    def data_image(self):
+        """数据段初值按小端序排成的字节串（从 DS:DATA_ORIGIN 开始）"""
+        image = bytearray(self.data_size)
+        for label, (offset, size) in self.data_layout.items():
+            offset -= DATA_ORIGIN
+            image[offset:offset + size] = (self.data[label] & ((1 << (8 * size)) - 1)).to_bytes(size, 'little')
+        return bytes(image)
+
+
+def scan_symbols(instructions, symbols=None):
+    """第一遍扫描：在执行第一条指令之前收集所有标签、过程和数据定义"""
+    if symbols is None:
+        symbols = SymbolTable()
+    data_start = False
+    for ip, instruction in enumerate(instructions):
+        parts = instruction.split(";")[0].split()  # 移除注释
+        if not parts:
+            continue
+        opcode = parts[0]
+        if opcode == ".DATA":
+            data_start = True
+        elif opcode in (".CODE", ".STACK"):
+            data_start = False
+        elif opcode in DATA_SIZES:
+            if data_start and len(parts) >= 3:
+                label = parts[1].rstrip(':')
+                size = DATA_SIZES[opcode]
+                symbols.define(symbols.data, label, int(parts[2], 0), "数据")
+                symbols.data_layout[label] = (DATA_ORIGIN + symbols.data_size, size)
+                symbols.data_size += size
+        elif opcode == "PROC":
+            if len(parts) >= 2:
+                symbols.define(symbols.procedures, parts[1], ip, "过程")
+        elif ':' in opcode:
+            symbols.define(symbols.labels, opcode.rstrip(':'), ip, "标签")
+    return symbols
+
+
+def load_com(memory, registers, image, segment=COM_SEGMENT):
+    """装入 .COM 映像：写 PSP 和程序，四个段寄存器都指向 segment，从 segment:0100 开始执行
+
+    registers 为 RegisterFile.values。PSP 开头是 INT 20H，程序用 RET 返回时由它结束；
+    栈顶在段的最高处，先压入一个 0 作为这个返回地址。
+    """
+    if len(image) > 0x10000 - COM_ORIGIN - 2:
+        raise ValueError(f".COM 程序过大: {len(image)} 字节")
+    base = segment << 4
+    memory.write_block(base, b'\xCD\x20' + bytes(COM_ORIGIN - 2))
+    memory.write_block(base + COM_ORIGIN, bytes(image))
+    registers[CS] = registers[DS] = registers[ES] = registers[SS] = segment
+    registers[IP] = COM_ORIGIN
+    registers[SP] = 0xFFFE
+    memory.write_word(base + 0xFFFE, 0)
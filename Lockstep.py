@@ -0,0 +1,641 @@
+import sys
+
+from Decoder import decode
+from Loader import scan_symbols
+from Peripheral import Peripheral
+from PTimer8253 import BINARY_MODULUS
+from Registers import (REGISTER_NAMES, REGISTER_INDEX, IP, PARITY, ARITHMETIC_MASK,
+                       CF_MASK, PF_MASK, AF_MASK, ZF_MASK, SF_MASK, OF_MASK)
+from final import CPU, EU
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，只有批量锁步仿真需要
+    np = None
+
+PARITY_TABLE = np.frombuffer(PARITY, dtype=np.uint8).astype(np.int64) if np is not None else None
+ALL = slice(None)  # 所有家庭都在运行且 IP 相同时的选择子
+DEVICES = Peripheral().devices  # 默认设备表：STATUS / SWITCH 的选择子在编译时解析为设备下标
+DEVICE_NAMES = tuple(DEVICES)
+DEVICE_INDEX = {name: index for index, name in enumerate(DEVICE_NAMES)}
+LED3, FAN3 = DEVICE_INDEX["LED3"], DEVICE_INDEX["Fan3"]
+CONTROL_PORT = 3  # 8255 按地址线 A1A0 编号：0=A、1=B、2=C、3=控制寄存器
+RD, WR, CS = range(3)
+
+
+def _less(word):
+    return ((word & SF_MASK) != 0) != ((word & OF_MASK) != 0)
+
+
+# 条件转移的条件 -> 对 FLAGS 列的向量化判断（与 Registers.CONDITIONS 一致）
+VECTOR_CONDITIONS = {
+    'Z': lambda word: (word & ZF_MASK) != 0, 'NZ': lambda word: (word & ZF_MASK) == 0,
+    'C': lambda word: (word & CF_MASK) != 0, 'NC': lambda word: (word & CF_MASK) == 0,
+    'S': lambda word: (word & SF_MASK) != 0, 'NS': lambda word: (word & SF_MASK) == 0,
+    'O': lambda word: (word & OF_MASK) != 0, 'NO': lambda word: (word & OF_MASK) == 0,
+    'P': lambda word: (word & PF_MASK) != 0, 'NP': lambda word: (word & PF_MASK) == 0,
+    'A': lambda word: (word & (CF_MASK | ZF_MASK)) == 0, 'BE': lambda word: (word & (CF_MASK | ZF_MASK)) != 0,
+    'L': _less, 'GE': lambda word: ~_less(word),
+    'LE': lambda word: ((word & ZF_MASK) != 0) | _less(word), 'G': lambda word: ((word & ZF_MASK) == 0) & ~_less(word),
+}
+
+# 对运行状态没有影响的伪指令
+NOOPS = ('NOP', 'SEGMENT', 'DEFINE', 'PROC', 'ENDP', 'LABEL')
+
+
+class Lockstep:
+    """N 个家庭运行同一段控制程序的向量化锁步仿真器
+
+    寄存器组、FLAGS、调用栈、8253 计数器、8255 端口和家电状态都是每个家庭一行的
+    numpy 数组，每条指令对所有处于同一 IP 的家庭执行一次数组运算。
+    所有运行中的家庭 IP 相同时只维护一个公共 IP；读写 IP 的指令（CALL、RET、
+    以寄存器为目标的 JMP 等）之后按 IP 分组执行，组内用下标掩码，IP 重新一致时再汇合。
+    语义与标量 EU 逐位一致（见 verify），不产生跟踪输出，不支持内存操作数和串操作。
+    """
+
+    def __init__(self, instructions, homes):
+        if np is None:
+            raise RuntimeError("Lockstep requires numpy")
+        self.homes = homes
+        self.rows = np.arange(homes)
+        self.instructions = list(instructions)
+        self.symbols = scan_symbols(self.instructions)
+
+        # 每行一个家庭；寄存器按列连续存放（Fortran 序），整列运算不跨步
+        self.registers = np.zeros((homes, len(REGISTER_NAMES)), dtype=np.int64, order='F')
+        self.flags = np.zeros(homes, dtype=np.int64)
+        self.stack = np.zeros((homes, 8), dtype=np.int64)  # PUSH / CALL 共用的栈，按需加深
+        self.stack_depth = np.zeros(homes, dtype=np.int64)
+
+        # 8253：三个计数器
+        self.timer_control = np.zeros(homes, dtype=np.int64)
+        self.counter_register = np.zeros((homes, 3), dtype=np.int64)
+        self.initial_value = np.zeros((homes, 3), dtype=np.int64)
+        self.timer_mode = np.zeros((homes, 3), dtype=np.int64)
+        self.timer_running = np.zeros((homes, 3), dtype=bool)
+        self.timer_phase = np.zeros((homes, 3), dtype=np.int64)  # 方式 2 / 3 距下一个计数终点的时钟数
+
+        # 8255：端口寄存器（按寄存器级方式模拟，与 Parallel8255 的默认方式一致）
+        self.ports = np.zeros((homes, 4), dtype=np.int64)
+
+        # 家电开关状态和显示内容（显示文本编号，文本本身只存一份）
+        self.devices = np.zeros((homes, len(DEVICE_NAMES)), dtype=np.uint8)
+        self.display = np.zeros(homes, dtype=np.int64)
+        self.display_texts = [""]
+        self._display_ids = {"": 0}
+
+        self.running = np.ones(homes, dtype=bool)
+        self.active = ALL  # 运行中的家庭（全部运行时为 ALL，否则为下标数组）
+        self.pc = 0  # 运行中家庭的公共 IP；None 表示已分叉，以寄存器组的 IP 列为准
+        self.instruction_count = 0  # 所有家庭执行的指令总数
+        self.steps = 0  # 锁步执行的步数
+        self.program = [self._compile(instruction) for instruction in self.instructions]
+
+    def set_register(self, name, values):
+        """设置每个家庭的初始寄存器值（例如各自的语音输入）"""
+        self.registers[:, REGISTER_INDEX[name]] = np.asarray(values, dtype=np.int64) & 0xFFFF
+
+    # ---------- 装载：把每条指令编译为 (函数, 类别, 跳转目标) ----------
+
+    def _compile(self, instruction):
+        op = decode(instruction, self.symbols)
+        if op is not None and op.opcode in NOOPS:
+            return self._nop, None, None  # 伪指令只影响装载阶段已建立的符号表
+        compiler = getattr(self, '_compile_' + op.opcode.lower(), None) if op is not None else None
+        if compiler is None:
+            raise ValueError(f"Lockstep 不支持的指令: {instruction}")
+        return compiler(*op.args)
+
+    def _display_id(self, text):
+        if text not in self._display_ids:
+            self._display_ids[text] = len(self.display_texts)
+            self.display_texts.append(text)
+        return self._display_ids[text]
+
+    def _operand(self, spec):
+        """返回 (get(sel), set(sel, value), 是否访问 IP)"""
+        kind, value = spec
+        if kind == 'imm':
+            return (lambda sel: value), None, False
+        if kind == 'data':
+            constant = self.symbols.data[value]
+            return (lambda sel: constant), None, False
+        if kind == 'reg':
+            column = self.registers[:, REGISTER_INDEX[value]]
+
+            def set_reg(sel, result):
+                column[sel] = result & 0xFFFF
+            return (lambda sel: column[sel]), set_reg, value == 'IP'
+        raise ValueError(f"Lockstep 不支持内存操作数: {spec}")
+
+    @staticmethod
+    def _nop(sel):
+        pass
+
+    @staticmethod
+    def _rows(sel, mask):
+        """sel 中满足 mask 的家庭下标"""
+        return np.flatnonzero(mask) if sel is ALL else sel[mask]
+
+    def _compile_hlt(self):
+        return self._nop, 'hlt', None
+
+    def _compile_jmp(self, target):
+        get, _, _ = self._operand(target)
+        if target.kind == 'imm':
+            return self._nop, 'jmp', target.value & 0xFFFF
+        column = self.registers[:, IP]
+
+        def jmp(sel):
+            column[sel] = (get(sel) - 1) & 0xFFFF
+        return jmp, 'ip', None
+
+    def _branch(self, taken, target):
+        """条件成立的家庭转到 target，其余顺序执行；返回按家庭读写 IP 的指令函数"""
+        column = self.registers[:, IP]
+        landing = (target - 1) & 0xFFFF
+
+        def branch(sel):
+            column[sel] = np.where(taken(sel), landing, column[sel])
+        return branch, 'ip', None
+
+    def _compile_jcc(self, condition, target):
+        test = VECTOR_CONDITIONS[condition]
+        return self._branch(lambda sel: test(self.flags[sel]), target)
+
+    def _compile_jcxz(self, target):
+        cx = self.registers[:, REGISTER_INDEX['CX']]
+        return self._branch(lambda sel: cx[sel] == 0, target)
+
+    def _compile_loop(self, target, zero=None):
+        cx = self.registers[:, REGISTER_INDEX['CX']]
+
+        def taken(sel):
+            count = (cx[sel] - 1) & 0xFFFF  # LOOP 系列不影响标志
+            cx[sel] = count
+            if zero is None:
+                return count != 0
+            return (count != 0) & (((self.flags[sel] & ZF_MASK) != 0) == zero)
+        return self._branch(taken, target)
+
+    def _compile_loope(self, target):
+        return self._compile_loop(target, True)
+
+    def _compile_loopne(self, target):
+        return self._compile_loop(target, False)
+
+    def _compile_call(self, target):
+        get, _, _ = self._operand(target)
+        column = self.registers[:, IP]
+
+        def call(sel):
+            self._push(sel, column[sel] + 1)
+            column[sel] = (get(sel) - 1) & 0xFFFF
+        return call, 'ip', None
+
+    def _compile_ret(self):
+        column = self.registers[:, IP]
+
+        def ret(sel):
+            value, rows = self._pop(sel)
+            column[rows] = (value - 1) & 0xFFFF  # 栈空的家庭保持不变
+        return ret, 'ip', None
+
+    def _push(self, sel, value):
+        rows = self.rows if sel is ALL else sel
+        depth = self.stack_depth[rows]
+        if len(depth) and depth.max() >= self.stack.shape[1]:
+            self.stack = np.concatenate((self.stack, np.zeros_like(self.stack)), axis=1)
+        self.stack[rows, depth] = value
+        self.stack_depth[rows] = depth + 1
+
+    def _pop(self, sel):
+        rows = self.rows if sel is ALL else sel
+        depth = self.stack_depth[rows]
+        nonempty = depth > 0
+        rows, depth = rows[nonempty], depth[nonempty] - 1
+        self.stack_depth[rows] = depth
+        return self.stack[rows, depth], rows
+
+    def _compile_push(self, source):
+        get, _, reads_ip = self._operand(source)
+        return (lambda sel: self._push(sel, get(sel))), 'ip' if reads_ip else None, None
+
+    def _compile_pop(self, dest):
+        _, set_value, writes_ip = self._operand(dest)
+
+        def pop(sel):
+            value, rows = self._pop(sel)
+            set_value(rows, value)
+        return pop, 'ip' if writes_ip else None, None
+
+    def _compile_mov(self, dest, source):
+        _, set_value, dest_ip = self._operand(dest)
+        get, _, source_ip = self._operand(source)
+        return (lambda sel: set_value(sel, get(sel))), 'ip' if dest_ip or source_ip else None, None
+
+    def _alu(self, opcode, sel, a, b=0, cf=0):
+        """与 EU.alu 逐位一致的向量化实现（标志在这里直接求值，整列运算没有惰性求值的必要）"""
+        word = self.flags[sel]
+        a = a & 0xFFFF
+        b = b & 0xFFFF
+        if opcode == 'NOT':
+            return ~a & 0xFFFF  # NOT 不影响标志
+        carry = overflow = aux = 0
+        if opcode in ('ADD', 'ADC', 'INC'):
+            if opcode == 'ADC':
+                cf = word & CF_MASK
+            elif opcode == 'INC':
+                b = 1
+            raw = a + b + cf
+            res = raw & 0xFFFF
+            carry = word & CF_MASK if opcode == 'INC' else raw > 0xFFFF  # INC / DEC 不影响 CF
+            overflow = (a ^ res) & (b ^ res) & 0x8000
+            aux = (a ^ b ^ res) & AF_MASK
+        elif opcode in ('SUB', 'SBB', 'CMP', 'NEG', 'DEC'):
+            if opcode == 'SBB':
+                cf = word & CF_MASK
+            elif opcode == 'NEG':
+                a, b = 0, a
+            elif opcode == 'DEC':
+                b = 1
+            raw = a - b - cf
+            res = raw & 0xFFFF
+            carry = word & CF_MASK if opcode == 'DEC' else raw < 0
+            overflow = (a ^ b) & (a ^ res) & 0x8000
+            aux = (a ^ b ^ res) & AF_MASK
+        elif opcode == 'MUL':
+            raw = a * b
+            res = raw & 0xFFFF
+            carry = overflow = raw > 0xFFFF
+        elif opcode == 'DIV':
+            nonzero = np.not_equal(b, 0)
+            res = np.where(nonzero, a // np.where(nonzero, b, 1), 0)
+        elif opcode == 'AND' or opcode == 'TEST':
+            res = a & b
+        elif opcode == 'OR':
+            res = a | b
+        else:  # XOR
+            res = a ^ b
+        word = ((word & ~ARITHMETIC_MASK) | PARITY_TABLE[res & 0xFF] | aux |
+                np.where(carry, CF_MASK, 0) | np.where(res == 0, ZF_MASK, 0) |
+                np.where(res & 0x8000, SF_MASK, 0) | np.where(overflow, OF_MASK, 0))
+        self.flags[sel] = word
+        return res
+
+    def _compile_binary(self, opcode, dest, source):
+        get_dest, set_dest, dest_ip = self._operand(dest)
+        get_source, _, source_ip = self._operand(source)
+        alu = self._alu
+
+        def binary(sel):
+            set_dest(sel, alu(opcode, sel, get_dest(sel), get_source(sel)))
+        return binary, 'ip' if dest_ip or source_ip else None, None
+
+    def _compile_add(self, dest, source):
+        return self._compile_binary('ADD', dest, source)
+
+    def _compile_sub(self, dest, source):
+        return self._compile_binary('SUB', dest, source)
+
+    def _compile_adc(self, dest, source):
+        return self._compile_binary('ADC', dest, source)
+
+    def _compile_sbb(self, dest, source):
+        return self._compile_binary('SBB', dest, source)
+
+    def _compile_mul(self, dest, source):
+        return self._compile_binary('MUL', dest, source)
+
+    def _compile_div(self, dest, source):
+        return self._compile_binary('DIV', dest, source)
+
+    def _compile_and(self, dest, source):
+        return self._compile_binary('AND', dest, source)
+
+    def _compile_or(self, dest, source):
+        return self._compile_binary('OR', dest, source)
+
+    def _compile_xor(self, dest, source):
+        return self._compile_binary('XOR', dest, source)
+
+    def _compile_not(self, dest):
+        get, set_value, dest_ip = self._operand(dest)
+        return (lambda sel: set_value(sel, self._alu('NOT', sel, get(sel)))), 'ip' if dest_ip else None, None
+
+    def _compile_unary(self, opcode, dest):
+        get, set_value, dest_ip = self._operand(dest)
+        return (lambda sel: set_value(sel, self._alu(opcode, sel, get(sel)))), 'ip' if dest_ip else None, None
+
+    def _compile_neg(self, dest):
+        return self._compile_unary('NEG', dest)
+
+    def _compile_inc(self, dest):
+        return self._compile_unary('INC', dest)
+
+    def _compile_dec(self, dest):
+        return self._compile_unary('DEC', dest)
+
+    def _compile_compare(self, opcode, first, second):
+        get_first, _, first_ip = self._operand(first)
+        get_second, _, second_ip = self._operand(second)
+        alu = self._alu
+        return (lambda sel: alu(opcode, sel, get_first(sel), get_second(sel))), \
+            'ip' if first_ip or second_ip else None, None
+
+    def _compile_cmp(self, first, second):
+        return self._compile_compare('CMP', first, second)
+
+    def _compile_test(self, first, second):
+        return self._compile_compare('TEST', first, second)
+
+    def _compile_stc(self):
+        def stc(sel):
+            self.flags[sel] |= CF_MASK
+        return stc, None, None
+
+    def _compile_clc(self):
+        def clc(sel):
+            self.flags[sel] &= ~CF_MASK
+        return clc, None, None
+
+    # ---------- 外设 ----------
+
+    def _compile_voice(self, voice_code):
+        if voice_code not in EU.VOICE_MAP:
+            unknown = self._display_id("Unknown Command")
+
+            def voice_unknown(sel):
+                self.display[sel] = unknown
+            return voice_unknown, None, None
+        action = EU.VOICE_MAP[voice_code]
+        device, state = DEVICE_INDEX[action["device"]], action["state"]
+        text = self._display_id(f"{action['device']} {'ON' if state else 'OFF'}")
+
+        def voice(sel):
+            self.devices[sel, device] = state
+            self.display[sel] = text
+        return voice, None, None
+
+    def _compile_voice_reg(self, source):
+        get, _, reads_ip = self._operand(source)
+        # 查表：语音码 0..12（0 和超出范围的码都按未知命令处理）
+        table_size = 13
+        voice_device = np.full(table_size, -1, dtype=np.int64)
+        voice_state = np.zeros(table_size, dtype=np.uint8)
+        voice_display = np.full(table_size, self._display_id("Unknown Command"), dtype=np.int64)
+        for value in range(table_size):
+            action = EU.VOICE_MAP.get(EU.voice_code(value))
+            if action is not None:
+                voice_device[value] = DEVICE_INDEX[action["device"]]
+                voice_state[value] = action["state"]
+                voice_display[value] = self._display_id(f"{action['device']} {'ON' if action['state'] else 'OFF'}")
+
+        def voice(sel):
+            code = get(sel)
+            code = np.where(code < table_size, code, 0)
+            device = voice_device[code]
+            known = device >= 0
+            self.devices[self._rows(sel, known), device[known]] = voice_state[code[known]]
+            self.display[sel] = voice_display[code]
+        return voice, 'ip' if reads_ip else None, None
+
+    def _compile_status(self, *terms):
+        if len(terms) == 1 and terms[0] in DEVICE_INDEX:
+            device = terms[0]
+            index = DEVICE_INDEX[device]
+            on, off = self._display_id(f"{device} is ON"), self._display_id(f"{device} is OFF")
+
+            def status(sel):
+                self.display[sel] = np.where(self.devices[sel, index], on, off)
+            return status, None, None
+        selected = DEVICES.parse_selector(terms)
+        if selected is None:
+            return self._compile_display("Unknown Device")
+        columns = np.asarray(selected, dtype=np.int64)
+        label = ' '.join(terms)
+        # 开启的设备数 -> 显示内容
+        texts = np.array([self._display_id(f"{label}: {on}/{len(columns)} ON") for on in range(len(columns) + 1)])
+
+        def status_count(sel):
+            self.display[sel] = texts[self.devices[sel][:, columns].sum(axis=1)]
+        return status_count, None, None
+
+    def _compile_switch(self, state, *terms):
+        selected = DEVICES.parse_selector(terms)
+        if selected is None:
+            return self._compile_display("Unknown Device")
+        columns = np.asarray(selected, dtype=np.int64)
+        text = self._display_id(f"{' '.join(terms)} {'ON' if state else 'OFF'}")
+
+        def switch(sel):
+            self.devices[ALL if sel is ALL else sel[:, None], columns] = state
+            self.display[sel] = text
+        return switch, None, None
+
+    def _compile_display(self, text):
+        text = self._display_id(text)
+
+        def display(sel):
+            self.display[sel] = text
+        return display, None, None
+
+    @staticmethod
+    def _check_counter(counter):
+        if not (0 <= counter <= 2):
+            raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
+
+    def _compile_config_timer(self, counter, mode, initial_value):
+        def config_timer(sel):
+            self._check_counter(counter)
+            if not (0 <= mode <= 7):
+                raise ValueError("Invalid mode. Must be 0 to 7.")
+            self.timer_control[sel] = (counter << 6) | (mode << 1) | 0x01
+            self.timer_mode[sel, counter] = mode
+            self.initial_value[sel, counter] = initial_value
+            self.counter_register[sel, counter] = initial_value
+            self.timer_phase[sel, counter] = initial_value or BINARY_MODULUS
+            self.timer_running[sel, counter] = False
+        return config_timer, None, None
+
+    def _periodic(self, sel, counter):
+        """方式 2 / 3（以及它们的别名 6 / 7）自动重装"""
+        return (self.timer_mode[sel, counter] & 3) >= 2
+
+    def _compile_start_timer(self, counter):
+        def start_timer(sel):
+            self._check_counter(counter)
+            self.timer_running[sel, counter] = True  # 单次方式的计数寄存器为 0 时从最大模数开始计
+        return start_timer, None, None
+
+    def _compile_stop_timer(self, counter):
+        def stop_timer(sel):
+            self._check_counter(counter)
+            self.timer_running[sel, counter] = False
+        return stop_timer, None, None
+
+    def _compile_tick_timer(self, counter, clocks=1):
+        def tick_timer(sel):
+            """与 Timer8253._advance 相同的计算（GATE 恒为高电平、二进制计数）"""
+            self._check_counter(counter)
+            count = self.counter_register[sel, counter]
+            if clocks > 0:
+                running = self.timer_running[sel, counter]
+                periodic = self._periodic(sel, counter)
+                # 单次方式：计到 0 停止，计数寄存器为 0 表示最大模数
+                one_shot = running & ~periodic
+                remaining = np.where(count == 0, BINARY_MODULUS, count)
+                remaining = remaining - np.minimum(remaining, clocks)
+                finished = one_shot & (remaining == 0)
+                # 周期方式：相位取模后换算为可见计数值
+                period = self.initial_value[sel, counter]
+                period = np.where(period == 0, BINARY_MODULUS, period)
+                phase = self.timer_phase[sel, counter]
+                phase = (np.where(phase == 0, period, phase) - clocks - 1) % period + 1
+                elapsed = period - phase
+                high = (period + 1) // 2
+                square = np.where(elapsed < high, period - 2 * elapsed,
+                                  period - (period & 1) - 2 * (elapsed - high))
+                rate = running & periodic
+                visible = np.where(self.timer_mode[sel, counter] & 1, square, phase)
+                count = np.where(one_shot, remaining, np.where(rate, visible, count))
+                self.counter_register[sel, counter] = count
+                self.timer_phase[sel, counter] = np.where(rate, phase, self.timer_phase[sel, counter])
+                self.timer_running[sel, counter] = running & ~finished
+            # 与 EU._op_tick_timer 相同的外设联动
+            self.devices[self._rows(sel, count == 3), LED3] = 1
+            self.devices[self._rows(sel, count == 5), FAN3] = 1
+        return tick_timer, None, None
+
+    def _write_8255(self, sel, address, value):
+        self.ports[sel, address] = value & 0xFF
+
+    def _compile_write_ctrl(self, value):
+        return (lambda sel: self._write_8255(sel, CONTROL_PORT, value)), None, None
+
+    def _compile_write_port(self, port, value):
+        address = EU.PORT_REGISTER[port]
+        return (lambda sel: self._write_8255(sel, address, value)), None, None
+
+    def _compile_read_port(self, port):
+        return self._nop, None, None  # 寄存器级方式下读端口不改变任何状态
+
+    # ---------- 执行 ----------
+
+    def _update_active(self):
+        self.active = ALL if self.running.all() else np.flatnonzero(self.running)
+
+    def run(self, max_steps=None):
+        """锁步执行直到所有家庭停机，或执行了 max_steps 步"""
+        program = self.program
+        length = len(program)
+        ip = self.registers[:, IP]
+        limit = max_steps if max_steps is not None else sys.maxsize
+        steps = count = 0
+        while steps < limit:
+            if self.pc is not None:
+                # 公共 IP：整列（或运行中家庭的下标）一次执行
+                pc, sel = self.pc, self.active
+                selected = self.homes if sel is ALL else len(sel)
+                if not selected:
+                    break
+                if pc >= length:  # 超出指令范围，全部停止
+                    ip[sel] = pc
+                    self.running[sel] = False
+                    self.pc = None
+                    break
+                function, kind, target = program[pc]
+                steps += 1
+                count += selected
+                if kind is None:
+                    function(sel)
+                    self.pc = pc + 1
+                elif kind == 'jmp':
+                    self.pc = target
+                elif kind == 'hlt':
+                    ip[sel] = pc
+                    self.running[sel] = False
+                    self.pc = None
+                    break
+                else:  # 按家庭读写 IP：先把公共 IP 写回寄存器组，转入分组执行
+                    ip[sel] = pc
+                    self.pc = None
+                    function(sel)
+                    ip[sel] = (ip[sel] + 1) & 0xFFFF
+                continue
+
+            # 已分叉：选出 IP 最小的一组执行，让落后的家庭追上来
+            self._update_active()
+            active = self.rows if self.active is ALL else self.active
+            if not len(active):
+                break
+            ips = ip[active]
+            pc = int(ips.min())
+            if pc == ips.max():
+                self.pc = pc  # 全部汇合
+                continue
+            sel = active[ips == pc]
+            steps += 1
+            if pc >= length:
+                self.running[sel] = False
+                continue
+            function, kind, target = program[pc]
+            count += len(sel)
+            if kind == 'hlt':
+                self.running[sel] = False
+            elif kind == 'jmp':
+                ip[sel] = target
+            else:
+                function(sel)
+                ip[sel] = (ip[sel] + 1) & 0xFFFF
+        if self.pc is not None:
+            ip[self.active] = self.pc  # 同步公共 IP，之后可以继续 run
+        self._update_active()
+        self.steps += steps
+        self.instruction_count += count
+
+    # ---------- 与标量 EU 对照 ----------
+
+    def home_state(self, home):
+        """第 home 个家庭的状态，格式与 scalar_state 相同"""
+        depth = self.stack_depth[home]
+        return (tuple(int(v) for v in self.registers[home]), int(self.flags[home]),
+                tuple(int(v) for v in self.stack[home, :depth]),
+                int(self.timer_control[home]),
+                tuple((int(self.counter_register[home, c]), int(self.initial_value[home, c]),
+                       int(self.timer_mode[home, c]), bool(self.timer_running[home, c])) for c in range(3)),
+                tuple((int(state), None) for state in self.devices[home]),
+                self.display_texts[self.display[home]],
+                tuple(int(v) for v in self.ports[home]))
+
+
+def scalar_state(cpu):
+    """标量 CPU 的状态，用于与 Lockstep.home_state 逐位比较"""
+    board = cpu.board
+    return (tuple(cpu.eu.registers.values), cpu.eu.status_flags.value, tuple(cpu.eu.call_stack),
+            board.timer.control_register,
+            tuple((c['counter_register'], c['initial_value'], c['mode'], c['running']) for c in board.timer.counters),
+            board.peripheral.devices.entries(),
+            board.peripheral.display,
+            tuple(board.parallel.registers))
+
+
+def verify(instructions, homes, inputs=None, sample=None):
+    """用标量 CPU 逐个重放家庭，返回与锁步结果不一致的家庭下标列表
+
+    inputs 为 {寄存器名: 每个家庭的初值序列}；sample 为要核对的家庭下标（默认全部）。
+    """
+    inputs = inputs or {}
+    lockstep = Lockstep(instructions, homes)
+    for name, values in inputs.items():
+        lockstep.set_register(name, values)
+    lockstep.run()
+    mismatched = []
+    for home in (range(homes) if sample is None else sample):
+        cpu = CPU(None, list(instructions), headless=True)
+        for name, values in inputs.items():
+            cpu.eu.registers[name] = int(values[home])
+        cpu.run()
+        if scalar_state(cpu) != lockstep.home_state(home):
+            mismatched.append(home)
+    return mismatched
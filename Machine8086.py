@@ -0,0 +1,907 @@
+from Memory import PAGE_SHIFT, PAGE_SIZE, ADDRESS_MASK
+from Registers import (CONDITIONS, AX, BX, CX, DX, SP, BP, SI, DI, IP, CS, DS, ES, SS,
+                       CF_MASK, PF_MASK, AF_MASK, ZF_MASK, SF_MASK, TF_MASK, IF_MASK, DF_MASK, OF_MASK,
+                       PARITY, LAZY_MUL)
+from Trace import trace, EVENTS
+
+# 机器码中的寄存器编号 -> RegisterFile 下标
+WORD_REGISTERS = (AX, CX, DX, BX, SP, BP, SI, DI)
+SEGMENT_REGISTERS = (ES, CS, SS, DS)  # 8086 只译码 reg 字段的低 2 位
+# ModR/M 的 r/m 字段 -> 参与有效地址计算的基址 / 变址寄存器
+EA_REGISTERS = ((BX, SI), (BX, DI), (BP, SI), (BP, DI), (SI,), (DI,), (BP,), (BX,))
+SEGMENT_PREFIXES = {0x26: ES, 0x2E: CS, 0x36: SS, 0x3E: DS}
+ALU_OPS = ('ADD', 'OR', 'ADC', 'SBB', 'AND', 'SUB', 'XOR', 'CMP')  # 00-3F 及 80-83 组的 reg 字段
+SHIFT_OPS = ('ROL', 'ROR', 'RCL', 'RCR', 'SHL', 'SHR', 'SHL', 'SAR')  # D0-D3 组（6 在 8086 上等同 SHL）
+JCC_OPCODES = ('O', 'NO', 'C', 'NC', 'Z', 'NZ', 'BE', 'A', 'S', 'NS', 'P', 'NP', 'L', 'GE', 'LE', 'G')
+STRING_OPCODES = {0xA4: ('movs', 1), 0xA5: ('movs', 2), 0xA6: ('cmps', 1), 0xA7: ('cmps', 2),
+                  0xAA: ('stos', 1), 0xAB: ('stos', 2), 0xAC: ('lods', 1), 0xAD: ('lods', 2),
+                  0xAE: ('scas', 1), 0xAF: ('scas', 2)}
+FLAGS_MASK = CF_MASK | PF_MASK | AF_MASK | ZF_MASK | SF_MASK | TF_MASK | IF_MASK | DF_MASK | OF_MASK
+FLAGS_RESERVED = 0xF002  # 8086 的 PUSHF 中保留位读出为 1
+DIVIDE_ERROR = 0  # 除法出错时的中断类型号
+
+
+class InvalidOpcode(ValueError):
+    """遇到 8086 没有定义的操作码"""
+
+
+class PrefetchQueue:
+    """BIU 的 6 字节指令预取队列
+
+    译码器从队列里逐字节取指，队列空时 BIU 一次从 CS:IP 之后的存储器补满 6 字节；
+    转移后由 flush 清空并从新地址重新预取。fetches 记录总线预取次数。
+    已译码的指令直接从译码缓存执行，不再经过预取队列。
+    """
+    SIZE = 6
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.address = 0  # 下一个交给译码器的字节的物理地址
+        self.queue = b''
+        self.position = 0
+        self.fetches = 0
+
+    def flush(self, address):
+        self.address = address & ADDRESS_MASK
+        self.queue = b''
+        self.position = 0
+
+    def fetch(self):
+        if self.position >= len(self.queue):
+            memory = self.memory
+            start = self.address
+            if start + self.SIZE <= memory.size:
+                self.queue = bytes(memory.view[start:start + self.SIZE])
+            else:  # 预取跨过地址空间顶端时回绕到 0
+                self.queue = bytes(memory.read_byte(start + i) for i in range(self.SIZE))
+            self.position = 0
+            self.fetches += 1
+        byte = self.queue[self.position]
+        self.position += 1
+        self.address = (self.address + 1) & ADDRESS_MASK
+        return byte
+
+    def fetch_word(self):
+        return self.fetch() | (self.fetch() << 8)
+
+    def fetch_signed(self):
+        byte = self.fetch()
+        return byte - 0x100 if byte & 0x80 else byte
+
+
+class Access:
+    """机器码操作数访问器：get / set 为译码时绑定好的闭包"""
+    __slots__ = ('get', 'set')
+
+    def __init__(self, get, set=None):
+        self.get = get
+        self.set = set
+
+
+def _signed(value, size):
+    sign = 1 << (8 * size - 1)
+    return value - (sign << 1) if value & sign else value
+
+
+class Machine:
+    """8086 机器码前端：从 CS:IP 取字节、查 256 项操作码表译码、按物理地址缓存译码结果
+
+    译码结果是 (处理函数, 参数, 指令长度) 三元组，与源代码 IR 一样在执行时不再解析；
+    缓存按物理地址索引，并向 Memory 登记所在的页；写入这些页时，与写入字节重叠的译码结果失效
+    （自修改代码、装入新程序都会触发），写到同页的数据不影响缓存。寄存器、标志、ALU、端口和中断控制器与 EU 共用，
+    栈在 SS:SP 指向的存储器里，中断通过 0:0 处的向量表进入处理程序。
+    """
+
+    def __init__(self, eu, prefetch):
+        self.eu = eu
+        self.registers = eu.registers.values
+        self.flags = eu.status_flags
+        self.memory = eu.memory
+        self.prefetch = prefetch
+        self.cache = {}  # 物理地址 -> (处理函数, 参数, 长度)
+        self.cache_pages = {}  # 页号 -> 该页上有译码结果的指令起始地址
+        self.covered = bytearray(self.memory.size)  # 属于已缓存指令的字节，写到其它字节（同页的数据）不必失效
+        self.decoded = 0  # 译码次数（缓存未命中）
+        self.invalidated = 0  # 因写入而失效的译码结果数
+        self.services = {}  # 中断类型号 -> Python 实现的系统服务（如 .COM 程序用的 INT 20H / 21H）
+        self.output = []  # INT 21H 输出的字符
+        self.exit_code = None
+        self.trace = trace
+        self.memory.on_code_write = self.invalidate
+        self.table = self._build_table()
+
+    # ---------- 译码缓存 ----------
+
+    def decode(self, address):
+        """译码 address 处的一条指令（含前缀）并放入缓存"""
+        prefetch = self.prefetch
+        prefetch.flush(address)
+        segment = rep = None
+        opcode = prefetch.fetch()
+        while True:
+            if opcode in SEGMENT_PREFIXES:
+                segment = SEGMENT_PREFIXES[opcode]
+            elif opcode in (0xF2, 0xF3):
+                rep = opcode
+            elif opcode not in (0xF0, 0xF1):  # LOCK（8086 上 F1 是它的别名）
+                break
+            opcode = prefetch.fetch()
+        handler, args = self.table[opcode](opcode, segment, rep)
+        length = (prefetch.address - address) & ADDRESS_MASK
+        entry = (handler, args, length)
+        self.cache[address] = entry
+        self.covered[address:address + length] = b'\x01' * length
+        memory = self.memory
+        for page in {address >> PAGE_SHIFT, ((address + length - 1) & ADDRESS_MASK) >> PAGE_SHIFT}:
+            self.cache_pages.setdefault(page, set()).add(address)
+            memory.watch_code(page)
+        self.decoded += 1
+        return entry
+
+    def invalidate(self, address, length):
+        """[address, address + length) 被写入：丢弃与它重叠的译码结果（Memory.on_code_write 回调）"""
+        covered = self.covered
+        end = address + length
+        if not any(covered[address:end]):
+            return
+        cache = self.cache
+        for page in range(address >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1):
+            starts = self.cache_pages.get(page)
+            if not starts:
+                continue
+            for start in list(starts):
+                entry = cache.get(start)
+                if entry is None:  # 已经随跨页的另一半失效
+                    starts.discard(start)
+                elif start < end and address < start + entry[2]:
+                    del cache[start]
+                    starts.discard(start)
+                    covered[start:start + entry[2]] = bytes(entry[2])
+                    self.invalidated += 1
+            # 从指令中间进入会译出相互重叠的指令，重新标记仍然有效的那些
+            for start in starts:
+                size = cache[start][2]
+                covered[start:start + size] = b'\x01' * size
+            if not starts:
+                del self.cache_pages[page]
+                self.memory.code[page] = 0
+
+    def flush_cache(self):
+        for page in list(self.cache_pages):
+            self.invalidate(page << PAGE_SHIFT, PAGE_SIZE)
+
+    # ---------- 操作数 ----------
+
+    def _register(self, size, number):
+        registers = self.registers
+        if size == 2:
+            index = WORD_REGISTERS[number]
+
+            def set_word(value):
+                registers[index] = value & 0xFFFF
+            return Access(lambda: registers[index], set_word)
+        index = WORD_REGISTERS[number & 3]
+        if number < 4:  # AL / CL / DL / BL
+            def set_low(value):
+                registers[index] = (registers[index] & 0xFF00) | (value & 0xFF)
+            return Access(lambda: registers[index] & 0xFF, set_low)
+
+        def set_high(value):  # AH / CH / DH / BH
+            registers[index] = (registers[index] & 0x00FF) | ((value & 0xFF) << 8)
+        return Access(lambda: registers[index] >> 8, set_high)
+
+    def _segment_register(self, number):
+        registers = self.registers
+        index = SEGMENT_REGISTERS[number & 3]
+
+        def set_segment(value):
+            registers[index] = value & 0xFFFF
+        return Access(lambda: registers[index], set_segment)
+
+    def _offset(self, bases, displacement):
+        """有效地址（段内偏移）的闭包"""
+        registers = self.registers
+        if len(bases) == 2:
+            base, index = bases
+            return lambda: (registers[base] + registers[index] + displacement) & 0xFFFF
+        if bases:
+            base = bases[0]
+            return lambda: (registers[base] + displacement) & 0xFFFF
+        return lambda: displacement
+
+    def _address(self, segment, bases, displacement):
+        """物理地址的闭包（段寄存器 * 16 + 有效地址）"""
+        registers = self.registers
+        if len(bases) == 2:
+            base, index = bases
+            return lambda: ((registers[segment] << 4) +
+                            ((registers[base] + registers[index] + displacement) & 0xFFFF)) & ADDRESS_MASK
+        if bases:
+            base = bases[0]
+            return lambda: ((registers[segment] << 4) + ((registers[base] + displacement) & 0xFFFF)) & ADDRESS_MASK
+        return lambda: ((registers[segment] << 4) + displacement) & ADDRESS_MASK
+
+    def _memory_operand(self, size, address):
+        memory = self.memory
+        if size == 1:
+            read, write = memory.read_byte, memory.write_byte
+        else:
+            read, write = memory.read_word, memory.write_word
+        return Access(lambda: read(address()), lambda value: write(address(), value))
+
+    def _modrm(self, size, segment):
+        """读取 ModR/M（及位移），返回 (reg 字段, r/m 操作数, 存储器操作数的 (段, 基址, 位移) 或 None)"""
+        prefetch = self.prefetch
+        modrm = prefetch.fetch()
+        mod, reg, rm = modrm >> 6, (modrm >> 3) & 7, modrm & 7
+        if mod == 3:
+            return reg, self._register(size, rm), None
+        if mod == 0 and rm == 6:  # 直接寻址 [disp16]
+            bases, default = (), DS
+            displacement = prefetch.fetch_word()
+        else:
+            bases = EA_REGISTERS[rm]
+            default = SS if BP in bases else DS
+            displacement = (prefetch.fetch_signed() if mod == 1 else
+                            prefetch.fetch_word() if mod == 2 else 0)
+        location = (default if segment is None else segment, bases, displacement)
+        return reg, self._memory_operand(size, self._address(*location)), location
+
+    def _immediate(self, size):
+        value = self.prefetch.fetch() if size == 1 else self.prefetch.fetch_word()
+        return Access(lambda: value)
+
+    # ---------- 操作码表 ----------
+
+    def _build_table(self):
+        """256 项主操作码表：每项是 (操作码, 段超越前缀, 重复前缀) -> (处理函数, 参数) 的译码函数"""
+        table = [self._decode_invalid] * 256
+        for base in range(0x00, 0x40, 8):
+            for opcode in range(base, base + 6):
+                table[opcode] = self._decode_alu
+        for opcode in (0x06, 0x0E, 0x16, 0x1E):
+            table[opcode] = self._decode_push_segment
+        for opcode in (0x07, 0x0F, 0x17, 0x1F):  # 0F 在 8086 上是 POP CS
+            table[opcode] = self._decode_pop_segment
+        for opcode in (0x27, 0x2F, 0x37, 0x3F):
+            table[opcode] = self._decode_adjust
+        for opcode in range(0x40, 0x50):
+            table[opcode] = self._decode_inc_dec_register
+        for opcode in range(0x50, 0x58):
+            table[opcode] = self._decode_push_register
+        for opcode in range(0x58, 0x60):
+            table[opcode] = self._decode_pop_register
+        for opcode in range(0x60, 0x80):  # 8086 把 60-6F 当作 70-7F 的别名
+            table[opcode] = self._decode_jcc
+        for opcode in range(0x80, 0x84):
+            table[opcode] = self._decode_group1
+        table[0x84] = table[0x85] = self._decode_test
+        table[0x86] = table[0x87] = self._decode_xchg
+        for opcode in range(0x88, 0x8C):
+            table[opcode] = self._decode_mov
+        table[0x8C] = table[0x8E] = self._decode_mov_segment
+        table[0x8D] = self._decode_lea
+        table[0x8F] = self._decode_pop_rm
+        for opcode in range(0x90, 0x98):
+            table[opcode] = self._decode_xchg_ax
+        for opcode, handler in ((0x98, self._cbw), (0x99, self._cwd), (0x9B, self._nop), (0x9C, self._pushf),
+                                (0x9D, self._popf), (0x9E, self._sahf), (0x9F, self._lahf), (0xC3, self._ret),
+                                (0xCB, self._retf), (0xCE, self._into), (0xCF, self._iret), (0xD6, self._salc),
+                                (0xF4, self._hlt), (0xF5, self._cmc), (0xF8, self._clc), (0xF9, self._stc),
+                                (0xFA, self._cli), (0xFB, self._sti), (0xFC, self._cld), (0xFD, self._std)):
+            table[opcode] = self._nullary(handler)
+        table[0xC1] = table[0xC3]  # 8086 的别名
+        table[0xC9] = table[0xCB]
+        table[0x9A] = table[0xEA] = self._decode_far
+        for opcode in range(0xA0, 0xA4):
+            table[opcode] = self._decode_mov_offset
+        for opcode in STRING_OPCODES:
+            table[opcode] = self._decode_string
+        table[0xA8] = table[0xA9] = self._decode_test_accumulator
+        for opcode in range(0xB0, 0xC0):
+            table[opcode] = self._decode_mov_immediate
+        table[0xC0] = table[0xC2] = self._decode_ret_immediate
+        table[0xC8] = table[0xCA] = self._decode_ret_immediate
+        table[0xC4] = table[0xC5] = self._decode_load_far
+        table[0xC6] = table[0xC7] = self._decode_mov_rm_immediate
+        table[0xCC] = table[0xCD] = self._decode_int
+        for opcode in range(0xD0, 0xD4):
+            table[opcode] = self._decode_group2
+        table[0xD4] = table[0xD5] = self._decode_ascii_adjust
+        table[0xD7] = self._decode_xlat
+        for opcode in range(0xD8, 0xE0):
+            table[opcode] = self._decode_escape
+        for opcode in range(0xE0, 0xE4):
+            table[opcode] = self._decode_loop
+        for opcode in range(0xE4, 0xE8):
+            table[opcode] = self._decode_io_immediate
+        for opcode in range(0xEC, 0xF0):
+            table[opcode] = self._decode_io_dx
+        table[0xE8] = table[0xE9] = table[0xEB] = self._decode_relative
+        table[0xF6] = table[0xF7] = self._decode_group3
+        table[0xFE] = table[0xFF] = self._decode_group45
+        return table
+
+    @staticmethod
+    def _nullary(handler):
+        return lambda opcode, segment, rep: (handler, ())
+
+    def _decode_invalid(self, opcode, segment, rep):
+        raise InvalidOpcode(f"未定义的操作码 {opcode:02X}H")
+
+    def _decode_alu(self, opcode, segment, rep):
+        operation = ALU_OPS[opcode >> 3]
+        size = 1 + (opcode & 1)
+        form = opcode & 7
+        if form >= 4:  # AL / AX, 立即数
+            return self._alu, (operation, size, self._register(size, 0), self._immediate(size))
+        reg, rm, _ = self._modrm(size, segment)
+        register = self._register(size, reg)
+        if form & 2:  # reg <- r/m
+            return self._alu, (operation, size, register, rm)
+        return self._alu, (operation, size, rm, register)
+
+    def _decode_push_segment(self, opcode, segment, rep):
+        return self._push, (self._segment_register(opcode >> 3),)
+
+    def _decode_pop_segment(self, opcode, segment, rep):
+        return self._pop, (self._segment_register(opcode >> 3),)
+
+    def _decode_adjust(self, opcode, segment, rep):
+        return {0x27: self._daa, 0x2F: self._das, 0x37: self._aaa, 0x3F: self._aas}[opcode], ()
+
+    def _decode_inc_dec_register(self, opcode, segment, rep):
+        return self._unary, ('DEC' if opcode & 8 else 'INC', 2, self._register(2, opcode & 7))
+
+    def _decode_push_register(self, opcode, segment, rep):
+        return self._push, (self._register(2, opcode & 7),)
+
+    def _decode_pop_register(self, opcode, segment, rep):
+        return self._pop, (self._register(2, opcode & 7),)
+
+    def _decode_jcc(self, opcode, segment, rep):
+        return self._jcc, (JCC_OPCODES[opcode & 0xF], self.prefetch.fetch_signed())
+
+    def _decode_group1(self, opcode, segment, rep):
+        size = 2 if opcode & 1 else 1
+        reg, rm, _ = self._modrm(size, segment)
+        if opcode == 0x83:  # 符号扩展的 8 位立即数
+            value = self.prefetch.fetch_signed() & 0xFFFF
+            immediate = Access(lambda: value)
+        else:
+            immediate = self._immediate(size)
+        return self._alu, (ALU_OPS[reg], size, rm, immediate)
+
+    def _decode_test(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        reg, rm, _ = self._modrm(size, segment)
+        return self._alu, ('TEST', size, rm, self._register(size, reg))
+
+    def _decode_xchg(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        reg, rm, _ = self._modrm(size, segment)
+        return self._xchg, (self._register(size, reg), rm)
+
+    def _decode_mov(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        reg, rm, _ = self._modrm(size, segment)
+        register = self._register(size, reg)
+        return self._mov, ((register, rm) if opcode & 2 else (rm, register))
+
+    def _decode_mov_segment(self, opcode, segment, rep):
+        reg, rm, _ = self._modrm(2, segment)
+        register = self._segment_register(reg)
+        return self._mov, ((register, rm) if opcode & 2 else (rm, register))
+
+    def _decode_lea(self, opcode, segment, rep):
+        reg, _, location = self._modrm(2, segment)
+        if location is None:
+            raise InvalidOpcode("LEA 的源操作数必须是存储器")
+        return self._lea, (self._register(2, reg), self._offset(*location[1:]))
+
+    def _decode_pop_rm(self, opcode, segment, rep):
+        _, rm, _ = self._modrm(2, segment)
+        return self._pop, (rm,)
+
+    def _decode_xchg_ax(self, opcode, segment, rep):
+        if opcode == 0x90:
+            return self._nop, ()
+        return self._xchg, (self._register(2, 0), self._register(2, opcode & 7))
+
+    def _decode_far(self, opcode, segment, rep):
+        offset = self.prefetch.fetch_word()
+        target = self.prefetch.fetch_word()
+        return (self._call_far if opcode == 0x9A else self._jmp_far), (target, offset)
+
+    def _decode_mov_offset(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        displacement = self.prefetch.fetch_word()
+        location = self._memory_operand(size, self._address(DS if segment is None else segment, (), displacement))
+        accumulator = self._register(size, 0)
+        return self._mov, ((location, accumulator) if opcode & 2 else (accumulator, location))
+
+    def _decode_string(self, opcode, segment, rep):
+        operation, size = STRING_OPCODES[opcode]
+        repeat_zf = None if rep is None else rep & 1  # F3 = REP / REPE，F2 = REPNE
+        return self._string, (operation, size, repeat_zf, segment)
+
+    def _decode_test_accumulator(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        return self._alu, ('TEST', size, self._register(size, 0), self._immediate(size))
+
+    def _decode_mov_immediate(self, opcode, segment, rep):
+        size = 2 if opcode & 8 else 1
+        return self._mov, (self._register(size, opcode & 7), self._immediate(size))
+
+    def _decode_ret_immediate(self, opcode, segment, rep):
+        extra = self.prefetch.fetch_word()
+        return (self._retf if opcode & 8 else self._ret), (extra,)
+
+    def _decode_load_far(self, opcode, segment, rep):
+        reg, _, location = self._modrm(2, segment)
+        if location is None:
+            raise InvalidOpcode("LES / LDS 的源操作数必须是存储器")
+        return self._load_far, (self._register(2, reg), ES if opcode == 0xC4 else DS, self._address(*location))
+
+    def _decode_mov_rm_immediate(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        _, rm, _ = self._modrm(size, segment)
+        return self._mov, (rm, self._immediate(size))
+
+    def _decode_int(self, opcode, segment, rep):
+        return self._int, (3 if opcode == 0xCC else self.prefetch.fetch(),)
+
+    def _decode_group2(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        reg, rm, _ = self._modrm(size, segment)
+        registers = self.registers
+        count = Access(lambda: registers[CX] & 0xFF) if opcode & 2 else Access(lambda: 1)
+        return self._alu, (SHIFT_OPS[reg], size, rm, count)
+
+    def _decode_ascii_adjust(self, opcode, segment, rep):
+        base = self.prefetch.fetch()  # AAM / AAD 的第二个字节是基数（通常为 10）
+        return (self._aam if opcode == 0xD4 else self._aad), (base,)
+
+    def _decode_xlat(self, opcode, segment, rep):
+        registers = self.registers
+        segment = DS if segment is None else segment
+        address = lambda: ((registers[segment] << 4) + ((registers[BX] + (registers[AX] & 0xFF)) & 0xFFFF)) & ADDRESS_MASK
+        return self._mov, (self._register(1, 0), self._memory_operand(1, address))
+
+    def _decode_escape(self, opcode, segment, rep):
+        self._modrm(2, segment)  # 协处理器指令：8086 只计算地址，没有 8087 时相当于空操作
+        return self._nop, ()
+
+    def _decode_loop(self, opcode, segment, rep):
+        return (self._loopne, self._loope, self._loop, self._jcxz)[opcode - 0xE0], (self.prefetch.fetch_signed(),)
+
+    def _decode_io_immediate(self, opcode, segment, rep):
+        port = self.prefetch.fetch()
+        width = 1 + (opcode & 1)
+        return (self.eu._op_out if opcode & 2 else self.eu._op_in), (port, width)
+
+    def _decode_io_dx(self, opcode, segment, rep):
+        width = 1 + (opcode & 1)
+        return (self.eu._op_out_dx if opcode & 2 else self.eu._op_in_dx), (width,)
+
+    def _decode_relative(self, opcode, segment, rep):
+        if opcode == 0xEB:
+            return self._jmp, (self.prefetch.fetch_signed(),)
+        displacement = self.prefetch.fetch_word()
+        return (self._call if opcode == 0xE8 else self._jmp), (displacement,)
+
+    def _decode_group3(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        reg, rm, _ = self._modrm(size, segment)
+        if reg < 2:  # TEST r/m, 立即数（1 是 8086 上的别名）
+            return self._alu, ('TEST', size, rm, self._immediate(size))
+        if reg < 4:
+            return self._unary, (('NOT', 'NEG')[reg - 2], size, rm)
+        return (self._mul, self._imul, self._div, self._idiv)[reg - 4], (size, rm)
+
+    def _decode_group45(self, opcode, segment, rep):
+        size = 1 + (opcode & 1)
+        reg, rm, location = self._modrm(size, segment)
+        if reg < 2:
+            return self._unary, (('INC', 'DEC')[reg], size, rm)
+        if size == 1:
+            raise InvalidOpcode(f"FE /{reg} 未定义")
+        if reg in (3, 5):  # 远调用 / 远转移：目标是存储器中的 偏移:段 双字
+            if location is None:
+                raise InvalidOpcode("远转移的目标必须是存储器")
+            return (self._call_far_indirect if reg == 3 else self._jmp_far_indirect), (self._address(*location),)
+        return {2: self._call_near, 4: self._jmp_near, 6: self._push, 7: self._push}[reg], (rm,)
+
+    # ---------- 执行：数据传送与运算 ----------
+
+    def _nop(self):
+        pass
+
+    def _mov(self, dest, src):
+        dest.set(src.get())
+
+    def _alu(self, operation, size, dest, src):
+        result = self.eu.alu(operation, dest.get(), src.get(), size=size)
+        if operation != 'CMP' and operation != 'TEST':
+            dest.set(result)
+
+    def _unary(self, operation, size, dest):
+        dest.set(self.eu.alu(operation, dest.get(), size=size))
+
+    def _xchg(self, first, second):
+        value = first.get()
+        first.set(second.get())
+        second.set(value)
+
+    def _lea(self, dest, offset):
+        dest.set(offset())
+
+    def _load_far(self, dest, segment, address):
+        memory = self.memory
+        location = address()
+        dest.set(memory.read_word(location))
+        self.registers[segment] = memory.read_word(location + 2)
+
+    def _cbw(self):
+        registers = self.registers
+        registers[AX] = _signed(registers[AX] & 0xFF, 1) & 0xFFFF
+
+    def _cwd(self):
+        registers = self.registers
+        registers[DX] = 0xFFFF if registers[AX] & 0x8000 else 0
+
+    def _mul(self, size, src):
+        registers = self.registers
+        value = src.get()
+        if size == 1:
+            a = registers[AX] & 0xFF
+            product = a * value
+            registers[AX] = product
+        else:
+            a = registers[AX]
+            product = a * value
+            registers[AX] = product & 0xFFFF
+            registers[DX] = product >> 16
+        self.flags.lazy = (LAZY_MUL, a, value, product, 0x80 if size == 1 else 0x8000)  # 高半部分非 0 时 CF = OF = 1
+
+    def _imul(self, size, src):
+        registers = self.registers
+        if size == 1:
+            product = _signed(registers[AX] & 0xFF, 1) * _signed(src.get(), 1)
+            registers[AX] = product & 0xFFFF
+            overflow = not -0x80 <= product < 0x80
+        else:
+            product = _signed(registers[AX], 2) * _signed(src.get(), 2)
+            registers[AX] = product & 0xFFFF
+            registers[DX] = (product >> 16) & 0xFFFF
+            overflow = not -0x8000 <= product < 0x8000
+        word = self.flags.value & ~(CF_MASK | OF_MASK)
+        self.flags.word = word | (CF_MASK | OF_MASK) if overflow else word
+
+    def _div(self, size, src):
+        registers = self.registers
+        divisor = src.get()
+        if size == 1:
+            dividend, limit = registers[AX], 0xFF
+        else:
+            dividend, limit = (registers[DX] << 16) | registers[AX], 0xFFFF
+        if not divisor or dividend // divisor > limit:
+            return self._interrupt(DIVIDE_ERROR)
+        quotient, remainder = divmod(dividend, divisor)
+        if size == 1:
+            registers[AX] = (remainder << 8) | quotient
+        else:
+            registers[AX], registers[DX] = quotient, remainder
+
+    def _idiv(self, size, src):
+        registers = self.registers
+        divisor = _signed(src.get(), size)
+        if size == 1:
+            dividend, limit = _signed(registers[AX], 2), 0x7F
+        else:
+            dividend, limit = _signed((registers[DX] << 16) | registers[AX], 4), 0x7FFF
+        if not divisor:
+            return self._interrupt(DIVIDE_ERROR)
+        quotient = abs(dividend) // abs(divisor)  # 商向 0 取整，余数与被除数同号
+        if (dividend < 0) != (divisor < 0):
+            quotient = -quotient
+        remainder = dividend - quotient * divisor
+        if not -limit - 1 <= quotient <= limit:
+            return self._interrupt(DIVIDE_ERROR)
+        if size == 1:
+            registers[AX] = ((remainder & 0xFF) << 8) | (quotient & 0xFF)
+        else:
+            registers[AX], registers[DX] = quotient & 0xFFFF, remainder & 0xFFFF
+
+    def _set_result_flags(self, word, value, carry, auxiliary):
+        """十进制调整指令：按 8 位结果设置 SF / ZF / PF，CF / AF 由调用方给出"""
+        word &= ~(CF_MASK | PF_MASK | AF_MASK | ZF_MASK | SF_MASK)
+        word |= PARITY[value] | (value & 0x80 and SF_MASK) | (0 if value else ZF_MASK)
+        word |= (CF_MASK if carry else 0) | (AF_MASK if auxiliary else 0)
+        self.flags.word = word
+
+    def _daa(self):
+        self._decimal_adjust(1)
+
+    def _das(self):
+        self._decimal_adjust(-1)
+
+    def _decimal_adjust(self, direction):
+        registers = self.registers
+        word = self.flags.value
+        al = old = registers[AX] & 0xFF
+        carry = False
+        auxiliary = (al & 0xF) > 9 or word & AF_MASK
+        if auxiliary:
+            if direction < 0:
+                carry = word & CF_MASK or al < 6  # DAS 第一步的借位
+            al = (al + 6 * direction) & 0xFF
+        if old > 0x99 or word & CF_MASK:
+            al = (al + 0x60 * direction) & 0xFF
+            carry = True
+        registers[AX] = (registers[AX] & 0xFF00) | al
+        self._set_result_flags(word, al, carry, auxiliary)
+
+    def _aaa(self):
+        self._ascii_adjust(1)
+
+    def _aas(self):
+        self._ascii_adjust(-1)
+
+    def _ascii_adjust(self, direction):
+        registers = self.registers
+        word = self.flags.value
+        ax = registers[AX]
+        adjust = (ax & 0xF) > 9 or word & AF_MASK
+        if adjust:
+            al = (ax + 6 * direction) & 0xFF
+            ah = ((ax >> 8) + direction) & 0xFF
+            ax = (ah << 8) | al
+        registers[AX] = ax & 0xFF0F
+        word &= ~(CF_MASK | AF_MASK)
+        self.flags.word = word | (CF_MASK | AF_MASK) if adjust else word
+
+    def _aam(self, base):
+        registers = self.registers
+        if not base:
+            return self._interrupt(DIVIDE_ERROR)
+        high, low = divmod(registers[AX] & 0xFF, base)
+        registers[AX] = (high << 8) | low
+        self._set_result_flags(self.flags.value, low, False, False)
+
+    def _aad(self, base):
+        registers = self.registers
+        al = ((registers[AX] >> 8) * base + (registers[AX] & 0xFF)) & 0xFF
+        registers[AX] = al
+        self._set_result_flags(self.flags.value, al, False, False)
+
+    # ---------- 执行：标志 ----------
+
+    def _pushf(self):
+        self._push_value(self.flags.value | FLAGS_RESERVED)
+
+    def _popf(self):
+        self.flags.value = self._pop_value() & FLAGS_MASK
+
+    def _sahf(self):
+        mask = SF_MASK | ZF_MASK | AF_MASK | PF_MASK | CF_MASK
+        self.flags.value = (self.flags.value & ~mask) | ((self.registers[AX] >> 8) & mask)
+
+    def _lahf(self):
+        registers = self.registers
+        registers[AX] = (registers[AX] & 0xFF) | (((self.flags.value & 0xFF) | 0x02) << 8)
+
+    def _salc(self):
+        registers = self.registers
+        registers[AX] = (registers[AX] & 0xFF00) | (0xFF if self.flags.carry() else 0)
+
+    def _cmc(self):
+        self.flags.value ^= CF_MASK
+
+    def _clc(self):
+        self.flags.value &= ~CF_MASK
+
+    def _stc(self):
+        self.flags.value |= CF_MASK
+
+    def _cli(self):
+        self.flags.word &= ~IF_MASK
+
+    def _sti(self):
+        self.flags.word |= IF_MASK
+
+    def _cld(self):
+        self.flags.word &= ~DF_MASK
+
+    def _std(self):
+        self.flags.word |= DF_MASK
+
+    # ---------- 执行：栈与控制转移 ----------
+    # 运行循环在执行前已把 IP 推进到下一条指令，相对转移以它为基准
+
+    def _push_value(self, value):
+        registers = self.registers
+        registers[SP] = (registers[SP] - 2) & 0xFFFF
+        self.memory.write_word((registers[SS] << 4) + registers[SP], value)
+
+    def _pop_value(self):
+        registers = self.registers
+        value = self.memory.read_word((registers[SS] << 4) + registers[SP])
+        registers[SP] = (registers[SP] + 2) & 0xFFFF
+        return value
+
+    def _push(self, src):
+        self._push_value(src.get())
+
+    def _pop(self, dest):
+        dest.set(self._pop_value())
+
+    def _jmp(self, displacement):
+        registers = self.registers
+        registers[IP] = (registers[IP] + displacement) & 0xFFFF
+
+    def _jcc(self, condition, displacement):
+        if CONDITIONS[condition](self.flags):
+            registers = self.registers
+            registers[IP] = (registers[IP] + displacement) & 0xFFFF
+
+    def _loop(self, displacement):
+        registers = self.registers
+        registers[CX] = (registers[CX] - 1) & 0xFFFF
+        if registers[CX]:
+            registers[IP] = (registers[IP] + displacement) & 0xFFFF
+
+    def _loope(self, displacement):
+        registers = self.registers
+        registers[CX] = (registers[CX] - 1) & 0xFFFF
+        if registers[CX] and self.flags.zero():
+            registers[IP] = (registers[IP] + displacement) & 0xFFFF
+
+    def _loopne(self, displacement):
+        registers = self.registers
+        registers[CX] = (registers[CX] - 1) & 0xFFFF
+        if registers[CX] and not self.flags.zero():
+            registers[IP] = (registers[IP] + displacement) & 0xFFFF
+
+    def _jcxz(self, displacement):
+        registers = self.registers
+        if not registers[CX]:
+            registers[IP] = (registers[IP] + displacement) & 0xFFFF
+
+    def _jmp_near(self, target):
+        self.registers[IP] = target.get()
+
+    def _jmp_far(self, segment, offset):
+        registers = self.registers
+        registers[CS], registers[IP] = segment, offset
+
+    def _jmp_far_indirect(self, address):
+        location = address()
+        registers = self.registers
+        registers[IP] = self.memory.read_word(location)
+        registers[CS] = self.memory.read_word(location + 2)
+
+    def _call(self, displacement):
+        registers = self.registers
+        self._push_value(registers[IP])
+        registers[IP] = (registers[IP] + displacement) & 0xFFFF
+
+    def _call_near(self, target):
+        registers = self.registers
+        destination = target.get()  # 先取目标：操作数可能以 SP 寻址
+        self._push_value(registers[IP])
+        registers[IP] = destination
+
+    def _call_far(self, segment, offset):
+        registers = self.registers
+        self._push_value(registers[CS])
+        self._push_value(registers[IP])
+        registers[CS], registers[IP] = segment, offset
+
+    def _call_far_indirect(self, address):
+        location = address()
+        offset = self.memory.read_word(location)
+        segment = self.memory.read_word(location + 2)
+        self._call_far(segment, offset)
+
+    def _ret(self, extra=0):
+        registers = self.registers
+        registers[IP] = self._pop_value()
+        registers[SP] = (registers[SP] + extra) & 0xFFFF
+
+    def _retf(self, extra=0):
+        registers = self.registers
+        registers[IP] = self._pop_value()
+        registers[CS] = self._pop_value()
+        registers[SP] = (registers[SP] + extra) & 0xFFFF
+
+    def _hlt(self):
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Machine', "停止执行")
+        return False
+
+    # ---------- 执行：串操作 ----------
+
+    def _string(self, operation, size, repeat_zf, segment):
+        """串操作复用 EU 的成批实现；源操作数的段超越前缀通过临时替换 DS 实现"""
+        eu = self.eu
+        registers = self.registers
+        saved = registers[DS]
+        if segment is not None:
+            registers[DS] = registers[segment]
+        try:
+            if repeat_zf is None:
+                getattr(eu, '_' + operation)(size, 1)
+            else:
+                eu._op_rep(operation, size, repeat_zf)
+        finally:
+            if segment is not None:
+                registers[DS] = saved
+
+    # ---------- 系统服务 ----------
+
+    def install_dos_services(self):
+        """.COM 程序最常用的几个 DOS 功能：INT 20H 结束程序，INT 21H 的 02H / 09H 输出、4CH 结束程序"""
+        self.services[0x20] = self._dos_exit
+        self.services[0x21] = self._dos_call
+
+    def _dos_exit(self, code=0):
+        self.exit_code = code
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Machine', f"程序结束，返回码 {code}", {'exit_code': code})
+        return False
+
+    def _dos_call(self):
+        registers = self.registers
+        function = registers[AX] >> 8
+        if function == 0x02:  # 输出 DL 中的字符
+            self.output.append(chr(registers[DX] & 0xFF))
+        elif function == 0x09:  # 输出 DS:DX 处以 '$' 结尾的字符串
+            address = (registers[DS] << 4) + registers[DX]
+            memory = self.memory
+            for offset in range(0x10000):
+                byte = memory.read_byte(address + offset)
+                if byte == 0x24:
+                    break
+                self.output.append(chr(byte))
+        elif function == 0x4C:
+            return self._dos_exit(registers[AX] & 0xFF)
+        elif self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Machine', f"不支持的 DOS 功能 {function:02X}H")
+
+    # ---------- 中断 ----------
+
+    def _interrupt(self, vector):
+        """进入中断：压入 FLAGS、CS、IP，清除 IF / TF，从 0:0 处的向量表取处理程序地址"""
+        service = self.services.get(vector)
+        if service is not None:
+            return service()
+        registers = self.registers
+        flags = self.flags
+        self._push_value(flags.value | FLAGS_RESERVED)
+        self._push_value(registers[CS])
+        self._push_value(registers[IP])
+        flags.word &= ~(IF_MASK | TF_MASK)
+        address = vector * 4
+        registers[IP] = self.memory.read_word(address)
+        registers[CS] = self.memory.read_word(address + 2)
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Machine', f"中断 {vector:02X}H，转到 {registers[CS]:04X}:{registers[IP]:04X}",
+                            {'vector': vector, 'cs': registers[CS], 'ip': registers[IP]})
+
+    def _int(self, vector):
+        return self._interrupt(vector)
+
+    def _into(self):
+        if self.flags.value & OF_MASK:
+            return self._interrupt(4)
+
+    def _iret(self):
+        registers = self.registers
+        registers[IP] = self._pop_value()
+        registers[CS] = self._pop_value()
+        self.flags.value = self._pop_value() & FLAGS_MASK
+
+    def interrupt(self):
+        """响应 8259A 的可屏蔽中断请求（由运行循环在 IF = 1 且 INTR 有效时调用）"""
+        return self._interrupt(self.eu.pic.inta())
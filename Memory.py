@@ -0,0 +1,157 @@
+import mmap
+import os
+import sys
+
+MEMORY_SIZE = 1 << 20  # 8086 的 1 MB 物理地址空间
+ADDRESS_MASK = MEMORY_SIZE - 1
+PAGE_SHIFT = 12  # 以 4 KB 页为单位记录被写过的区域
+PAGE_SIZE = 1 << PAGE_SHIFT
+
+
+def linear_address(segment, offset):
+    """段:偏移 -> 20 位物理地址（超过 1 MB 回绕到 0）"""
+    return ((segment << 4) + (offset & 0xFFFF)) & ADDRESS_MASK
+
+
+class Memory:
+    """1 MB 段式存储器
+
+    地址空间是一块匿名 mmap（未访问的页不占物理内存），通过 memoryview
+    按字节 / 字访问，字按小端序存放，对齐的字直接走 16 位视图。
+    ROM 映像放在地址空间顶端（与 8086 复位向量 FFFF0 一致），写入被忽略。
+    """
+
+    def __init__(self, size=MEMORY_SIZE, buffer=None):
+        if size & (size - 1) or size < PAGE_SIZE:
+            raise ValueError("Memory size must be a power of two and at least one page")
+        self.size = size
+        self.mask = size - 1
+        self.buffer = buffer if buffer is not None else mmap.mmap(-1, size)
+        self.view = memoryview(self.buffer)
+        # 小端主机上对齐字可以直接通过 'H' 视图读写
+        self.words = self.view.cast('H') if sys.byteorder == 'little' else None
+        self.rom_base = size  # 地址 >= rom_base 的区域只读
+        self.dirty = bytearray(size >> PAGE_SHIFT)  # 被写过（非全零）的页，快照只保存这些页
+        self.code = bytearray(size >> PAGE_SHIFT)  # 含有已译码机器码的页，写入时通知 on_code_write
+        self.on_code_write = None  # 回调 (地址, 字节数)：让与写入区域重叠的已译码指令失效
+
+    @classmethod
+    def from_image(cls, path, size=MEMORY_SIZE):
+        """把完整的内存映像文件以写时复制方式映射为地址空间（零拷贝）
+
+        多个进程映射同一个映像时共享物理页，只有被写入的页才会复制。
+        """
+        with open(path, 'rb') as image:
+            if os.fstat(image.fileno()).st_size < size:
+                raise ValueError(f"Image {path} is smaller than the {size}-byte address space")
+            buffer = mmap.mmap(image.fileno(), size, access=mmap.ACCESS_COPY)
+        memory = cls(size, buffer)
+        memory.dirty[:] = b'\x01' * len(memory.dirty)
+        return memory
+
+    def load_image(self, path, address=0):
+        """把 RAM 映像装入指定物理地址，文件通过 mmap 直接拷入地址空间"""
+        with open(path, 'rb') as image:
+            length = os.fstat(image.fileno()).st_size
+            if length == 0:
+                return 0
+            if address + length > self.size:
+                raise ValueError(f"Image {path} does not fit at {address:#07x}")
+            with mmap.mmap(image.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                self.view[address:address + length] = source
+        self._mark_dirty(address, length)
+        return length
+
+    def load_rom(self, path):
+        """把 ROM 映像装入地址空间顶端，并把该区域设为只读"""
+        length = os.path.getsize(path)
+        base = self.size - length
+        self.rom_base = self.size  # 允许重新装载 ROM
+        self.load_image(path, base)
+        self.rom_base = base
+        return base
+
+    def _mark_dirty(self, address, length):
+        first = address >> PAGE_SHIFT
+        last = (address + length - 1) >> PAGE_SHIFT
+        self.dirty[first:last + 1] = b'\x01' * (last - first + 1)
+        if any(self.code[first:last + 1]):
+            self.on_code_write(address, length)
+
+    def watch_code(self, page):
+        """登记含有已译码指令的页，之后对该页的写入会调用 on_code_write（页上没有指令后由回调清除登记）"""
+        self.code[page] = 1
+
+    def read_byte(self, address):
+        return self.view[address & self.mask]
+
+    def write_byte(self, address, value):
+        address &= self.mask
+        if address >= self.rom_base:
+            return
+        self.view[address] = value & 0xFF
+        page = address >> PAGE_SHIFT
+        self.dirty[page] = 1
+        if self.code[page]:
+            self.on_code_write(address, 1)
+
+    def read_word(self, address):
+        address &= self.mask
+        if not address & 1 and self.words is not None:
+            return self.words[address >> 1]
+        return self.view[address] | (self.view[(address + 1) & self.mask] << 8)
+
+    def write_word(self, address, value):
+        address &= self.mask
+        if address >= self.rom_base:
+            return
+        value &= 0xFFFF
+        page = address >> PAGE_SHIFT
+        if not address & 1 and self.words is not None:
+            self.words[address >> 1] = value
+        else:
+            self.view[address] = value & 0xFF
+            self.view[(address + 1) & self.mask] = value >> 8
+            second = ((address + 1) & self.mask) >> PAGE_SHIFT
+            self.dirty[second] = 1
+            if second != page and self.code[second]:
+                self.on_code_write((address + 1) & self.mask, 1)
+        self.dirty[page] = 1
+        if self.code[page]:
+            self.on_code_write(address, 2)
+
+    def read_block(self, address, length):
+        """返回 [address, address+length) 的只读视图（不回绕）"""
+        return self.view[address:address + length].toreadonly()
+
+    def write_block(self, address, data):
+        length = len(data)
+        if address + length > self.rom_base:
+            length = max(0, self.rom_base - address)
+        if length:
+            self.view[address:address + length] = data[:length]
+            self._mark_dirty(address, length)
+
+    def snapshot(self):
+        """只保存被写过的页，未访问的页在恢复时清零"""
+        view = self.view
+        return tuple((page, bytes(view[page << PAGE_SHIFT:(page + 1) << PAGE_SHIFT]))
+                     for page, dirty in enumerate(self.dirty) if dirty)
+
+    def restore(self, state):
+        view = self.view
+        saved = dict(state)
+        for page, dirty in enumerate(self.dirty):
+            if dirty and page not in saved:
+                view[page << PAGE_SHIFT:(page + 1) << PAGE_SHIFT] = bytes(PAGE_SIZE)
+        for page, data in state:
+            view[page << PAGE_SHIFT:(page + 1) << PAGE_SHIFT] = data
+        self.dirty[:] = bytes(len(self.dirty))
+        for page in saved:
+            self.dirty[page] = 1
+        for page, code in enumerate(self.code):
+            if code:
+                self.on_code_write(page << PAGE_SHIFT, PAGE_SIZE)
+
+    def __len__(self):
+        return self.size
@@ -1,13 +1,52 @@
+from Trace import trace, EVENTS
+
+# 优先级只会循环移位，共 8 种状态：状态 r 中 IRr 优先级最高，IR(r-1) 最低
+PRIORITY_ORDERS = tuple(tuple((highest + i) & 7 for i in range(8)) for highest in range(8))
+
+
+def _highest_table(order):
+    """8 位请求掩码 -> 其中优先级最高的 IRQ（没有请求时为 -1）"""
+    table = [-1] * 256
+    for mask in range(1, 256):
+        table[mask] = next(irq for irq in order if mask >> irq & 1)
+    return tuple(table)
+
+
+def _unblocked_table(order):
+    """8 位 ISR -> 仍可打断当前服务的请求掩码（优先级比正在服务的最高一级更高的那些 IRQ）"""
+    table = [0xFF] * 256
+    for mask in range(1, 256):
+        serving = next(position for position, irq in enumerate(order) if mask >> irq & 1)
+        table[mask] = sum(1 << irq for irq in order[:serving])
+    return tuple(table)
+
+
+HIGHEST = tuple(_highest_table(order) for order in PRIORITY_ORDERS)
+UNBLOCKED = tuple(_unblocked_table(order) for order in PRIORITY_ORDERS)
+
+
 class PIC8259A:
     def __init__(self):
         self.IRR = 0b00000000  # 中断请求寄存器
         self.ISR = 0b00000000  # 中断服务寄存器
         self.IMR = 0b00000000  # 中断屏蔽寄存器
-        self.priority = [i for i in range(8)]  # 中断优先级
+        self.rotation = 0  # 优先级状态：当前优先级最高的 IRQ
+        self.priority = PRIORITY_ORDERS[0]  # 中断优先级（从高到低）
         self.nested_interrupts = 0  # 嵌套中断计数
+        self.vector_base = 8  # ICW2 给出的中断类型号基址（IBM PC 主片为 08H）
+        self.auto_eoi = False  # ICW4 AEOI：响应周期结束时自动清除 ISR 位
+        self.special_mask = False  # OCW3 特殊屏蔽方式：正在服务的级别不再挡住低优先级请求
+        self.rotate_on_aeoi = False  # OCW2 自动 EOI 循环：自动 EOI 的级别轮转为最低优先级
+        self.read_isr = False  # OCW3 选择命令端口读出 ISR（否则读出 IRR）
+        self.init_step = 0  # 初始化序列中下一个要写入的 ICW（2~4），0 表示已完成
+        self.needs_icw4 = False  # ICW1 的 IC4 位
+        self.single = False  # ICW1 的 SNGL 位：单片工作，不写 ICW3
+        self.intr = 0  # INTR 引脚：有可以响应的请求时为 1，CPU 每条指令只检查这一个整数
+        self.output = None  # 级联时从片的 INT 接主片的 IR 线：INTR 变化时调用 output(level)
 
         # 模拟 INTA 引脚，默认情况下为低电平（0）
         self.INTA = 0  # 0 表示低电平（没有响应），1 表示高电平（响应中断请求）
+        self.trace = trace
 
 
     def set_INTA(self, value):
@@ -33,33 +72,178 @@ class PIC8259A:
         if irq < 0 or irq > 7:
             raise ValueError("无效的 IRQ 号 (0-7)")
         self.IRR |= (1 << irq)
-        print(f"中断请求 IRQ{irq} 发出")
+        self._update_intr()
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'PIC8259A', f"中断请求 IRQ{irq} 发出")
 
     def mask_interrupt(self, irq):
         self.IMR |= (1 << irq)  # 数字1左移irq位, 在IRR中设置正确的位
-        print(f"IRQ{irq} 被屏蔽")
+        self._update_intr()
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'PIC8259A', f"IRQ{irq} 被屏蔽")
 
     def unmask_interrupt(self, irq):
         self.IMR &= ~(1 << irq)
-        print(f"IRQ{irq} 被取消屏蔽")
+        self._update_intr()
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'PIC8259A', f"IRQ{irq} 被取消屏蔽")
 
     def check_interrupt(self):
-        for irq in self.priority:
-            if (self.IRR & (1 << irq)) != 0 and (self.IMR & (1 << irq)) == 0:
-                return irq
-        return -1
+        """优先级最高的未屏蔽请求（不考虑正在服务的中断），没有时返回 -1"""
+        return HIGHEST[self.rotation][self.IRR & ~self.IMR & 0xFF]
+
+    def set_auto_eoi(self, enabled):
+        self.auto_eoi = bool(enabled)
+
+    def set_special_mask(self, enabled):
+        self.special_mask = bool(enabled)
+        self._update_intr()
 
     def acknowledge_interrupt(self, irq):
         self.IRR &= ~(1 << irq)
         self.ISR |= (1 << irq)
         self.nested_interrupts += 1
-        print(f"中断 IRQ{irq} 被确认并处理")
+        self._update_intr()
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'PIC8259A', f"中断 IRQ{irq} 被确认并处理")
 
     def end_of_interrupt(self, irq):
         self.ISR &= ~(1 << irq)
         self.nested_interrupts -= 1
-        print(f"中断 IRQ{irq} 处理结束")
+        self._update_intr()
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'PIC8259A', f"中断 IRQ{irq} 处理结束")
+
+    def _get_next_interrupt(self):
+        """优先级最高、未屏蔽且没有被正在服务的更高（或同级）中断挡住的请求，没有时返回 -1"""
+        pending = self.IRR & ~self.IMR & 0xFF
+        if self.special_mask:
+            pending &= ~self.ISR  # 只挡住正在服务的级别本身
+        elif self.ISR:
+            pending &= UNBLOCKED[self.rotation][self.ISR]
+        return HIGHEST[self.rotation][pending]
+
+    def _update_intr(self):
+        """IRR / ISR / IMR / 优先级变化后重新计算 INTR，使 CPU 的检查保持为一次整数判断"""
+        intr = 1 if self._get_next_interrupt() >= 0 else 0
+        if intr != self.intr:
+            self.intr = intr
+            if self.output is not None:
+                self.output(intr)
+
+    def inta(self):
+        """中断响应周期：确认最高优先级的请求，返回中断类型号（vector_base + IRQ）"""
+        irq = self._get_next_interrupt()
+        if irq < 0:
+            return self.vector_base + 7  # 请求在响应前已撤销，8259A 给出 IR7（伪中断）
+        self.set_INTA(1)
+        if self.auto_eoi:
+            self.IRR &= ~(1 << irq)  # 自动 EOI：不进入 ISR，也不挡住同级和低优先级的请求
+            if self.rotate_on_aeoi:
+                self.set_lowest_priority(irq)
+            self._update_intr()
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'PIC8259A', f"中断 IRQ{irq} 被确认（自动 EOI）")
+        else:
+            self.acknowledge_interrupt(irq)
+        self.set_INTA(0)
+        return self.vector_base + irq
+
+    def eoi(self, rotate=False):
+        """非特定 EOI：结束正在服务的优先级最高的中断，返回其 IRQ（没有时为 -1）
+
+        rotate=True 时同时把该 IRQ 轮转为最低优先级（OCW2 的“非特定 EOI 循环”命令）。
+        """
+        irq = HIGHEST[self.rotation][self.ISR]
+        if irq >= 0:
+            self.end_of_interrupt(irq)
+            if rotate:
+                self.set_lowest_priority(irq)
+        return irq
+
+    def set_lowest_priority(self, irq):
+        """特定循环：指定 IRQ 为最低优先级，它的下一级成为最高优先级"""
+        self.rotation = (irq + 1) & 7
+        self.priority = PRIORITY_ORDERS[self.rotation]
+        self._update_intr()
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'PIC8259A', f"中断优先级轮转: {list(self.priority)}")
+
+    # ---------- 端口访问（A0=0 命令端口，A0=1 数据端口） ----------
+
+    def write_command(self, value):
+        """写命令端口：ICW1 或 OCW2 / OCW3"""
+        if value & 0x10:  # ICW1：开始初始化，清除 IMR 和各种特殊方式
+            self.init_step = 2
+            self.needs_icw4 = bool(value & 0x01)
+            self.single = bool(value & 0x02)
+            self.IMR = 0
+            self.auto_eoi = self.special_mask = self.rotate_on_aeoi = self.read_isr = False
+            self.rotation = 0
+            self.priority = PRIORITY_ORDERS[0]
+            self._update_intr()
+        elif value & 0x08:  # OCW3
+            if value & 0x40:
+                self.set_special_mask(value & 0x20)
+            if value & 0x02:
+                self.read_isr = bool(value & 0x01)
+        else:  # OCW2：R / SL / EOI 三位给出命令，低 3 位为级别
+            command, level = value >> 5, value & 0x07
+            if command == 0b001:
+                self.eoi()
+            elif command == 0b101:
+                self.eoi(rotate=True)
+            elif command in (0b011, 0b111):
+                if self.ISR & (1 << level):
+                    self.end_of_interrupt(level)
+                if command == 0b111:
+                    self.set_lowest_priority(level)
+            elif command == 0b110:
+                self.set_lowest_priority(level)
+            elif command in (0b100, 0b000):
+                self.rotate_on_aeoi = command == 0b100
+
+    def write_data(self, value):
+        """写数据端口：初始化序列中的 ICW2~ICW4，否则为 OCW1（IMR）"""
+        if self.init_step == 2:
+            self.vector_base = value & 0xF8
+            self.init_step = 4 if self.single else 3
+        elif self.init_step == 3:
+            self.init_step = 4  # ICW3 描述级联连接，这里的级联关系由主板固定
+        elif self.init_step == 4:
+            self.auto_eoi = bool(value & 0x02)
+            self.init_step = 0
+        else:
+            self.init_step = 0
+            self.IMR = value & 0xFF
+            self._update_intr()
+        if self.init_step == 4 and not self.needs_icw4:
+            self.init_step = 0  # 没有 ICW4
+
+    def read_command(self):
+        return self.ISR if self.read_isr else self.IRR
+
+    def read_data(self):
+        return self.IMR
+
+    def snapshot(self):
+        """保存 IRR / ISR / IMR、优先级顺序、INTA 状态、中断类型号基址、工作方式和初始化进度"""
+        return (self.IRR, self.ISR, self.IMR, self.priority, self.nested_interrupts, self.INTA,
+                self.vector_base, self.auto_eoi, self.special_mask,
+                (self.rotate_on_aeoi, self.read_isr, self.init_step, self.needs_icw4, self.single))
+
+    def restore(self, state):
+        (self.IRR, self.ISR, self.IMR, priority, self.nested_interrupts, self.INTA,
+         self.vector_base, self.auto_eoi, self.special_mask, modes) = state
+        self.rotate_on_aeoi, self.read_isr, self.init_step, self.needs_icw4, self.single = modes
+        self.rotation = priority[0]
+        self.priority = PRIORITY_ORDERS[self.rotation]
+        self._update_intr()
 
     def rotate_priority(self):
-        self.priority = self.priority[1:] + self.priority[:1]
-        print(f"中断优先级轮转: {self.priority}")
+        """优先级循环一级：原来最高的一级变为最低（查表切换状态，不重建列表）"""
+        self.rotation = (self.rotation + 1) & 7
+        self.priority = PRIORITY_ORDERS[self.rotation]
+        self._update_intr()
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'PIC8259A', f"中断优先级轮转: {list(self.priority)}")
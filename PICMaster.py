@@ -1,25 +1,63 @@
-from PIC8259A import PIC8259A
+from PIC8259A import PIC8259A, HIGHEST
+from Trace import EVENTS
 
 class PICMaster(PIC8259A):
     def __init__(self, slave_pic):
         super().__init__()
         self.slave_pic = slave_pic  # 从控制器
         self.irq2 = 0  # 使用IR2引脚 (与从8259A连接)
+        slave_pic.output = self.cascade_input  # 从片的 INT 输出接 IR2
+
+    def cascade_input(self, level):
+        """从片 INT 电平变化：有可响应的请求时在 IR2 上请求，撤销时清除 IR2 的请求"""
+        if level:
+            self.irq2 = 1
+            self.IRR |= 0b100
+        else:
+            self.IRR &= ~0b100
+        self._update_intr()
 
     def request_interrupt(self, irq_num):
         """主控制器触发中断，检查是否是级联中断"""
         if irq_num == 2:
             self.irq2 = 1  # IR2 被触发，表示需要访问从控制器
-            print("PICMaster: IR2 被触发，访问从控制器。")
-        else:
-            # 调用父类的中断确认方法
-            super().acknowledge_interrupt(irq_num)
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'PICMaster', "PICMaster: IR2 被触发，访问从控制器。")
+        # 请求先锁存在 IRR 中，等 CPU 的中断响应周期（inta）再确认
+        super().request_interrupt(irq_num)
+
+    def inta(self):
+        """级联的中断响应：IR2 上的请求由从控制器给出中断类型号"""
+        vector = super().inta()
+        if vector == self.vector_base + 2 and self.irq2:
+            self.irq2 = 0
+            vector = self.slave_pic.inta()
+            if self.slave_pic.intr:  # 从片 INT 仍有效（AEOI / 特殊屏蔽方式下没有电平变化）：IR2 跟随电平继续请求
+                self.cascade_input(1)
+            return vector
+        return vector
+
+    def eoi(self, rotate=False):
+        """非特定 EOI；正在服务的是级联的 IR2 时先向从片发 EOI，从片全部服务完才结束主片的 IR2"""
+        if HIGHEST[self.rotation][self.ISR] == 2 and self.slave_pic.ISR:
+            self.slave_pic.eoi(rotate)
+            if self.slave_pic.ISR:
+                return 2
+        return super().eoi(rotate)
+
+    def snapshot(self):
+        return super().snapshot(), self.irq2
+
+    def restore(self, state):
+        own, self.irq2 = state
+        super().restore(own)
 
     def service_interrupt(self,slave_irq):
         """主控制器服务中断，检查级联请求"""
         if self.irq2 == 1:
             self.irq2 = 0  # 重置 IR2
-            print("PICMaster: 处理中断请求，访问从控制器。")
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'PICMaster', "PICMaster: 处理中断请求，访问从控制器。")
             # 访问从控制器并响应中断
             self.slave_pic.acknowledge_interrupt(slave_irq)
         else:
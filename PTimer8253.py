@@ -1,31 +1,115 @@
+from Trace import trace, EVENTS, INSTRUCTIONS
+
+BINARY_MODULUS = 0x10000  # 二进制计数时初值 0 表示 65536
+BCD_MODULUS = 10000  # BCD 计数时初值 0 表示 10000
+ONE_SHOT_MODES = (0, 1, 4, 5)  # 计到 0 后停止（方式 0 / 4 由软件写初值触发，1 / 5 由 GATE 上升沿触发）
+GATE_TRIGGERED_MODES = (1, 5)  # GATE 上升沿（重新）装入初值并开始计数
+GATE_INHIBIT_MODES = (0, 2, 3, 4)  # GATE 为低电平时暂停计数
+NO_EVENTS = range(0)
+
+
+def to_bcd(value):
+    """十进制整数 -> BCD 编码（每 4 位一个十进制数字）"""
+    return int(str(value), 16)
+
+
+def from_bcd(value):
+    """BCD 编码 -> 十进制整数，含非法数字（A~F）时抛出 ValueError"""
+    return int(f"{value:x}", 10)
+
+
 class Timer8253:
     def __init__(self):
         # 模拟 3 个计数器的控制寄存器和计数寄存器
         self.control_register = 0  # 控制字寄存器
         self.counters = [
-            {'counter_register': 0, 'initial_value': 0, 'mode': 0, 'running': False} for _ in range(3)
+            {'counter_register': 0, 'initial_value': 0, 'mode': 0, 'running': False,
+             'bcd': False, 'gate': 1, 'output': 1, 'phase': 0,
+             'access': 3, 'write_low': None, 'latch': None, 'read_high': False} for _ in range(3)
         ]
+        self.outputs = [None, None, None]  # OUT 引脚所接的中断请求线：计数结束时调用 handler(counter)
+        self.trace = trace
+
+    def connect(self, counter, handler):
+        """把计数器的 OUT 接到 handler（例如 8259A 的 IR0），handler 为 None 时断开"""
+        self.outputs[counter] = handler
+
+    @staticmethod
+    def _mode(c):
+        """方式 6 / 7 与方式 2 / 3 相同"""
+        return c['mode'] - 4 if c['mode'] >= 6 else c['mode']
+
+    @staticmethod
+    def _value(c, field='counter_register'):
+        return from_bcd(c[field]) if c['bcd'] else c[field]
 
-    def configure(self, counter, mode, initial_value):
-        """配置指定计数器的模式和初始值"""
+    def _set_count(self, c, count):
+        c['counter_register'] = to_bcd(count) if c['bcd'] else count
+
+    def _period(self, c):
+        """方式 2 / 3 的周期（时钟数），初值 0 表示计数器的最大模数"""
+        return self._value(c, 'initial_value') or (BCD_MODULUS if c['bcd'] else BINARY_MODULUS)
+
+    def _count(self, c):
+        """方式 0 / 1 / 4 / 5 剩余的计数，计数寄存器为 0 时与周期方式相同，表示最大模数"""
+        return self._value(c) or (BCD_MODULUS if c['bcd'] else BINARY_MODULUS)
+
+    def _reload(self, c):
+        """重新装入初值：周期方式从一个新周期开始，输出回到高电平"""
+        c['counter_register'] = c['initial_value']
+        c['phase'] = self._period(c)
+        c['output'] = 1 if self._mode(c) != 0 else 0  # 方式 0 计数期间输出低电平
+
+    def configure(self, counter, mode, initial_value, bcd=False):
+        """配置指定计数器的模式和初始值（bcd=True 时初值按 BCD 编码解释）"""
         if not (0 <= counter <= 2):
             raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
+        if not (0 <= mode <= 7):
+            raise ValueError("Invalid mode. Must be 0 to 7.")
+        if bcd:
+            from_bcd(initial_value)  # 检查 BCD 编码是否合法
 
-        self.counters[counter]['mode'] = mode
-        self.counters[counter]['initial_value'] = initial_value
-        self.counters[counter]['counter_register'] = initial_value
-        self.counters[counter]['running'] = False  # 配置后默认停止运行
+        c = self.counters[counter]
+        c['mode'] = mode
+        c['bcd'] = bcd
+        c['initial_value'] = initial_value
+        self._reload(c)
+        c['running'] = False  # 配置后默认停止运行
 
-        print(f"Counter {counter} configured: mode={mode}, initial_value={initial_value}")
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Timer8253', f"Counter {counter} configured: mode={mode}, initial_value={initial_value}")
 
     def start(self, counter):
-        """启动指定的计数器"""
+        """启动指定的计数器（对方式 1 / 5 相当于一次 GATE 触发）"""
+        if not (0 <= counter <= 2):
+            raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
+
+        c = self.counters[counter]
+        c['running'] = True  # 计数寄存器为 0 时从最大模数开始计
+        if self._mode(c) in (1, 5):
+            c['output'] = 0 if self._mode(c) == 1 else 1  # 方式 1 计数期间输出低电平
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Timer8253', f"Counter {counter} started")
+
+    def set_gate(self, counter, level):
+        """设置 GATE 引脚电平，上升沿触发方式 1 / 5、重新开始方式 2 / 3 的周期"""
         if not (0 <= counter <= 2):
             raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
 
-        if self.counters[counter]['counter_register'] > 0:
-            self.counters[counter]['running'] = True
-            print(f"Counter {counter} started")
+        c = self.counters[counter]
+        level = 1 if level else 0
+        rising = level and not c['gate']
+        c['gate'] = level
+        mode = self._mode(c)
+        if rising and (mode in GATE_TRIGGERED_MODES or mode in (2, 3)):
+            self._reload(c)
+            if mode in GATE_TRIGGERED_MODES:
+                c['output'] = 0 if mode == 1 else 1
+            c['running'] = True  # 初值 0 表示最大模数，同样开始计数
+        elif not level and mode in (2, 3):
+            c['output'] = 1  # GATE 为低时方式 2 / 3 的输出强制为高电平
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Timer8253', f"Counter {counter} gate set to {level}")
 
     def stop(self, counter):
         """停止指定的计数器"""
@@ -33,32 +117,171 @@ class Timer8253:
             raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
 
         self.counters[counter]['running'] = False
-        print(f"Counter {counter} stopped")
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Timer8253', f"Counter {counter} stopped")
+
+    def _advance(self, c, clocks):
+        """把计数器 c 推进 clocks 个时钟，返回 (实际计数的时钟数, 计数结束的时钟偏移 range)
+
+        偏移从 1 开始计，只做常数次算术运算，与 clocks 的大小无关。
+        """
+        if not c['running'] or clocks <= 0:
+            return 0, NO_EVENTS
+        mode = self._mode(c)
+        if not c['gate'] and mode in GATE_INHIBIT_MODES:
+            return 0, NO_EVENTS
+
+        if mode in ONE_SHOT_MODES:
+            count = self._count(c)
+            if clocks < count:
+                self._set_count(c, count - clocks)
+                return clocks, NO_EVENTS
+            # 计到 0：方式 0 / 1 输出变高，方式 4 / 5 输出一个时钟的负脉冲后回到高电平
+            self._set_count(c, 0)
+            c['running'] = False
+            c['output'] = 1
+            return count, range(count, count + 1)
+
+        # 方式 2 / 3：每 period 个时钟到一次终点并自动重装，phase 为距下一个终点的时钟数
+        period = self._period(c)
+        phase = c['phase'] or period
+        events = range(phase, clocks + 1, period)
+        phase = (phase - clocks - 1) % period + 1
+        c['phase'] = phase
+        elapsed = period - phase  # 当前周期已经过的时钟数
+        if mode == 2:
+            self._set_count(c, phase)
+            c['output'] = 0 if phase == 1 else 1  # 计到 1 的那个时钟输出低电平
+        else:
+            # 方式 3：每个时钟减 2，前半周期输出高电平、后半周期输出低电平（奇数周期高电平多一个时钟）
+            high = (period + 1) // 2
+            if elapsed < high:
+                c['output'] = 1
+                self._set_count(c, period - 2 * elapsed)
+            else:
+                c['output'] = 0
+                self._set_count(c, period - (period & 1) - 2 * (elapsed - high))
+        return clocks, events
 
     def tick(self, counter):
         """模拟指定计数器的时钟周期"""
         if not (0 <= counter <= 2):
             raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
 
-        if self.counters[counter]['running'] and self.counters[counter]['counter_register'] > 0:
-            self.counters[counter]['counter_register'] -= 1
-            print(f"Counter {counter} tick: counter={self.counters[counter]['counter_register']}")
+        c = self.counters[counter]
+        counted, events = self._advance(c, 1)
+        if counted:
+            if self.trace.level >= INSTRUCTIONS:
+                self.trace.emit(INSTRUCTIONS, 'Timer8253',
+                                f"Counter {counter} tick: counter={c['counter_register']}")
+            if events and self.trace.level >= EVENTS:
+                if c['running']:
+                    self.trace.emit(EVENTS, 'Timer8253', f"Counter {counter} terminal count, reloaded")
+                else:
+                    self.trace.emit(EVENTS, 'Timer8253', f"Counter {counter} reached zero")
+            if events and self.outputs[counter] is not None:
+                self.outputs[counter](counter)
+
+    def advance(self, counter, clocks, notify=True):
+        """一次推进 clocks 个时钟（O(1)），返回本段内每次计数结束的时钟偏移（range，从 1 开始）
+
+        notify=False 时不触发 OUT 上的中断请求（虚拟时钟已在准确时刻单独投递）。
+        """
+        if not (0 <= counter <= 2):
+            raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
+
+        c = self.counters[counter]
+        counted, events = self._advance(c, clocks)
+        if counted and self.trace.level >= INSTRUCTIONS:
+            self.trace.emit(INSTRUCTIONS, 'Timer8253',
+                            f"Counter {counter} advanced {counted} clocks: counter={c['counter_register']}")
+        if events and self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Timer8253', f"Counter {counter} terminal count x{len(events)}",
+                            {'counter': counter, 'first': events[0], 'last': events[-1]})
+        if events and notify and self.outputs[counter] is not None:
+            self.outputs[counter](counter)  # 请求线是边沿锁存的，一段内多次计数结束只需请求一次
+        return events
+
+    def clocks_to_terminal(self, counter):
+        """距下一次计数结束还有多少个时钟，不会再结束（停止 / GATE 暂停）时返回 None"""
+        c = self.counters[counter]
+        if not c['running']:
+            return None
+        mode = self._mode(c)
+        if not c['gate'] and mode in GATE_INHIBIT_MODES:
+            return None
+        if mode in ONE_SHOT_MODES:
+            return self._count(c)
+        return c['phase'] or self._period(c)
+
+    def value_offsets(self, counter, clocks, values):
+        """接下来 clocks 个时钟里，计数寄存器在哪些时钟之后等于 values 中的某个值
+
+        返回升序的时钟偏移列表（从 1 开始），不推进计数器。values 只能是 0~9
+        （BCD 与二进制编码相同）；周期方式按相位直接求解，与 clocks 的大小无关。
+        """
+        c = self.counters[counter]
+        mode = self._mode(c)
+        counting = c['running'] and (c['gate'] or mode not in GATE_INHIBIT_MODES)
+        if counting and mode in ONE_SHOT_MODES:
+            count = self._count(c)
+            offsets = []
+            for value in values:
+                if value == 0:  # 计到 0 后停止，之后一直保持 0
+                    offsets.extend(range(count, clocks + 1))
+                elif 0 < count - value <= clocks:
+                    offsets.append(count - value)
+            return sorted(offsets)
+        if not counting:
+            return list(range(1, clocks + 1)) if c['counter_register'] in values else []
 
-            if self.counters[counter]['counter_register'] == 0:
-                self.counters[counter]['running'] = False
-                print(f"Counter {counter} reached zero")
+        period = self._period(c)
+        phase = c['phase'] or period
+        offsets = []
+        for value in values:
+            for target in self._phases_of(mode, period, value):
+                first = (phase - target) % period or period  # k 个时钟后 phase 变为 (phase - k - 1) % period + 1
+                offsets.extend(range(first, clocks + 1, period))
+        return sorted(offsets)
 
-    def write_control(self, counter, mode, initial_value):
+    @staticmethod
+    def _phases_of(mode, period, value):
+        """方式 2 / 3 中计数寄存器等于 value 时的 phase（与 _advance 的换算相反）"""
+        if mode == 2:
+            return (value,) if 1 <= value <= period else ()
+        high = (period + 1) // 2
+        phases = []
+        if (period - value) % 2 == 0 and 0 <= (period - value) // 2 < high:
+            phases.append(period - (period - value) // 2)  # 前半周期：value = period - 2 * elapsed
+        low = period - (period & 1) - value
+        if low % 2 == 0 and high <= high + low // 2 < period:
+            phases.append(period - high - low // 2)  # 后半周期
+        return phases
+
+    def reload_period(self, counter):
+        """正在计数的方式 2 / 3 计数器两次计数结束之间的时钟数，其它情况返回 None"""
+        c = self.counters[counter]
+        if not c['running'] or not c['gate'] or self._mode(c) not in (2, 3):
+            return None
+        return self._period(c)
+
+    def advance_all(self, clocks, notify=True):
+        """三个计数器同时推进 clocks 个时钟，返回各自的计数结束偏移"""
+        return tuple(self.advance(counter, clocks, notify) for counter in range(3))
+
+    def write_control(self, counter, mode, initial_value, bcd=False):
         """通过控制参数直接配置计数器"""
         if not (0 <= counter <= 2):
             raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
 
         # 设置控制寄存器的相关位
         self.control_register = (counter << 6) | (mode << 1) | 0x01  # 示例控制字逻辑
-        print(f"Control word set: counter={counter}, mode={mode}, initial_value={initial_value}")
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Timer8253',
+                            f"Control word set: counter={counter}, mode={mode}, initial_value={initial_value}")
 
         # 调用 configure 方法配置计数器
-        self.configure(counter, mode, initial_value)
+        self.configure(counter, mode, initial_value, bcd)
 
     def read_counter(self, counter):
         """读取指定计数器的当前值"""
@@ -66,17 +289,84 @@ class Timer8253:
             raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
 
         value = self.counters[counter]['counter_register']
-        print(f"Counter {counter} read: {value}")
+        if self.trace.level >= INSTRUCTIONS:
+            self.trace.emit(INSTRUCTIONS, 'Timer8253', f"Counter {counter} read: {value}")
         return value
 
+    def snapshot(self):
+        """保存控制字和三个计数器的状态"""
+        return self.control_register, tuple(tuple(c.values()) for c in self.counters)
+
+    def restore(self, state):
+        self.control_register, counters = state
+        for c, values in zip(self.counters, counters):
+            c.update(zip(c.keys(), values))
+
     def write_counter(self, counter, value):
         """向指定计数器写入初始值"""
         if not (0 <= counter <= 2):
             raise ValueError("Invalid counter number. Must be 0, 1, or 2.")
 
-        self.counters[counter]['initial_value'] = value
-        self.counters[counter]['counter_register'] = value
-        print(f"Counter {counter} written: initial_value={value}")
+        c = self.counters[counter]
+        if c['bcd']:
+            from_bcd(value)
+        c['initial_value'] = value
+        self._reload(c)
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Timer8253', f"Counter {counter} written: initial_value={value}")
+
+    # ---------- 端口访问 ----------
+
+    def write_control_word(self, value):
+        """写控制字端口（SC1 SC0 RW1 RW0 M2 M1 M0 BCD）"""
+        counter, access = value >> 6, (value >> 4) & 0x03
+        if counter == 3:
+            raise ValueError("Invalid counter number in control word.")
+        c = self.counters[counter]
+        if access == 0:  # 锁存命令：冻结当前计数值供随后读出
+            c['latch'] = c['counter_register']
+            c['read_high'] = False
+            return
+        self.control_register = value
+        self.configure(counter, (value >> 1) & 0x07, 0, bool(value & 0x01))
+        c['access'] = access
+        c['write_low'] = None
+        c['latch'] = None
+        c['read_high'] = False
+
+    def write_port(self, counter, byte):
+        """写计数器端口：按控制字的读写格式装入低字节 / 高字节，装满后开始计数"""
+        c = self.counters[counter]
+        access = c['access']
+        if access == 1:
+            value = byte
+        elif access == 2:
+            value = byte << 8
+        elif c['write_low'] is None:
+            c['write_low'] = byte  # 先低字节，等待高字节
+            return
+        else:
+            value = c['write_low'] | (byte << 8)
+            c['write_low'] = None
+        self.write_counter(counter, value)
+        if self._mode(c) not in GATE_TRIGGERED_MODES:  # 方式 0 / 2 / 3 / 4 写入初值即开始计数
+            c['running'] = True  # GATE 为低时由 _advance 暂停计数
+
+    def read_port(self, counter):
+        """读计数器端口：锁存值（如有）或当前计数值，按读写格式给出低字节 / 高字节"""
+        c = self.counters[counter]
+        value = c['latch'] if c['latch'] is not None else c['counter_register']
+        access = c['access']
+        if access == 1:
+            high = False
+        elif access == 2:
+            high = True
+        else:
+            high = c['read_high']
+            c['read_high'] = not high
+        if access != 3 or high:
+            c['latch'] = None  # 锁存值读完后解除锁存
+        return (value >> 8) & 0xFF if high else value & 0xFF
 
 # # 示例用法
 # timer = Timer8253()
@@ -1,3 +1,5 @@
+from Trace import trace, EVENTS, PINS
+
 # class Parallel8255:
 #     def __init__(self):
 #         self.control_register = 0x00  # 控制寄存器
@@ -37,95 +39,164 @@
 #             return self.port_c
 #         else:
 #             raise ValueError("Invalid port")
+
+# 按地址 A1A0 编号的内部寄存器名称（0=端口A, 1=端口B, 2=端口C, 3=控制寄存器）
+REGISTER_LABELS = ('Port A', 'Port B', 'Port C', 'Control Register')
+
+
+def _register_property(address):
+    def getter(self):
+        return self.registers[address]
+
+    def setter(self, value):
+        self.registers[address] = value
+    return property(getter, setter)
+
+
 class Parallel8255:
-    def __init__(self):
-        # 内部寄存器
-        self.control_register = 0x00  # 控制寄存器
-        self.port_a = 0x00  # 端口A
-        self.port_b = 0x00  # 端口B
-        self.port_c = 0x00  # 端口C
+    """8255 并行接口
+
+    两种工作方式，按实例选择：
+    - 寄存器级（默认）：write_register / read_register 直接读写整数寄存器；
+    - 引脚级（pin_accurate=True）：经由地址线、RD/WR/CS 控制线和数据总线完成每次访问。
+    跟踪级别达到 PINS 时总是走引脚级路径，以便记录引脚变化。
+    """
+
+    def __init__(self, pin_accurate=False):
+        # 内部寄存器：端口A、端口B、端口C、控制寄存器
+        self.registers = [0x00, 0x00, 0x00, 0x00]
+        self.pin_accurate = pin_accurate
 
         # 模拟引脚
-        self.data_lines = [0] * 8  # 数据线 D7~D0
+        self.data_bus = 0x00  # 数据线 D7~D0，打包为一个整数
         self.control_lines = {'RD': True, 'WR': True, 'CS': True, 'RESET': False}  # 控制线，默认未激活
-        self.address_lines = [0, 0]  # 地址线 A1, A0
+        self.address = 0  # 地址线 A1A0，打包为 0~3
+        self.trace = trace
+
+    port_a = _register_property(0)  # 端口A
+    port_b = _register_property(1)  # 端口B
+    port_c = _register_property(2)  # 端口C
+    control_register = _register_property(3)  # 控制寄存器
+
+    @property
+    def data_lines(self):
+        """数据线 D7~D0 的逐位视图"""
+        return [(self.data_bus >> bit) & 1 for bit in range(7, -1, -1)]
+
+    @data_lines.setter
+    def data_lines(self, bits):
+        self.data_bus = int("".join(map(str, bits)), 2)
+
+    @property
+    def address_lines(self):
+        """地址线 [A1, A0]"""
+        return [self.address >> 1, self.address & 1]
 
     def reset(self):
         """复位芯片，清除所有寄存器数据"""
-        self.control_register = 0x00
-        self.port_a = 0x00
-        self.port_b = 0x00
-        self.port_c = 0x00
+        self.registers[:] = (0x00, 0x00, 0x00, 0x00)
         self.control_lines['RESET'] = True
-        print("Chip reset. All ports set to 0.")
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Parallel8255', "Chip reset. All ports set to 0.")
+
+    # ---------- 寄存器级访问 ----------
+
+    def write_register(self, address, value):
+        """写地址 address（A1A0）处的寄存器"""
+        if self.pin_accurate or self.trace.level >= PINS:
+            self.set_address(address >> 1, address & 1)
+            self.set_control_lines(rd=True, wr=False, cs=False)  # 设置写操作
+            self.write(value)
+            return
+        self.registers[address] = value & 0xFF
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Parallel8255', f"Data written to {REGISTER_LABELS[address]}: {hex(value & 0xFF)}")
+
+    def write_registers(self, writes):
+        """在一次总线事务里依次写入 writes 中的 (地址, 值)：片选和写选通只建立一次"""
+        if self.pin_accurate or self.trace.level >= PINS:
+            self.set_control_lines(rd=True, wr=False, cs=False)
+            for address, value in writes:
+                self.set_address(address >> 1, address & 1)
+                self.write(value)
+            return
+        for address, value in writes:
+            self.registers[address] = value & 0xFF
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Parallel8255',
+                                f"Data written to {REGISTER_LABELS[address]}: {hex(value & 0xFF)}")
+
+    def read_register(self, address):
+        """读地址 address（A1A0）处的寄存器并返回其值"""
+        if self.pin_accurate or self.trace.level >= PINS:
+            self.set_address(address >> 1, address & 1)
+            self.set_control_lines(rd=False, wr=True, cs=False)  # 设置读操作
+            self.read()
+            return self.data_bus
+        data = self.registers[address]
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Parallel8255', f"Data read from {REGISTER_LABELS[address]}: {hex(data)}")
+        return data
+
+    # ---------- 引脚级访问 ----------
 
     def set_address(self, a1, a0):
         """设置地址线 A1/A0，用于选择端口"""
-        self.address_lines = [a1, a0]
-        print(f"Address lines set to: A1={a1}, A0={a0}")
+        if a1 not in (0, 1) or a0 not in (0, 1):
+            raise ValueError("Invalid address lines.")
+        self.address = (a1 << 1) | a0
+        if self.trace.level >= PINS:
+            self.trace.emit(PINS, 'Parallel8255', f"Address lines set to: A1={a1}, A0={a0}")
 
     def set_control_lines(self, rd, wr, cs):
         """设置控制线 RD, WR, CS"""
         self.control_lines['RD'] = rd
         self.control_lines['WR'] = wr
         self.control_lines['CS'] = cs
-        print(f"Control lines set to: RD={rd}, WR={wr}, CS={cs}")
+        if self.trace.level >= PINS:
+            self.trace.emit(PINS, 'Parallel8255', f"Control lines set to: RD={rd}, WR={wr}, CS={cs}")
 
     def set_data_lines(self, data):
         """设置数据线值 D7~D0"""
-        self.data_lines = [int(bit) for bit in bin(data)[2:].zfill(8)]
-        print(f"Data lines set to: {self.data_lines}")
+        self.data_bus = data & 0xFF
+        if self.trace.level >= PINS:
+            self.trace.emit(PINS, 'Parallel8255', f"Data lines set to: {self.data_lines}")
 
     def get_data_lines(self):
         """获取数据线值 D7~D0"""
-        return int("".join(map(str, self.data_lines)), 2)
+        return self.data_bus
 
     def write(self, data):
-        """向指定端口写入数据"""
+        """向地址线选中的端口写入数据"""
         if self.control_lines['CS'] == False and self.control_lines['WR'] == False:  # 检查片选和写使能信号
             self.set_data_lines(data)
-            address = self.address_lines
-            if address == [0, 0]:  # 选择端口A
-                self.port_a = self.get_data_lines()
-                print(f"Data written to Port A: {hex(self.port_a)}")
-            elif address == [0, 1]:  # 选择端口B
-                self.port_b = self.get_data_lines()
-                print(f"Data written to Port B: {hex(self.port_b)}")
-            elif address == [1, 0]:  # 选择端口C
-                self.port_c = self.get_data_lines()
-                print(f"Data written to Port C: {hex(self.port_c)}")
-            elif address == [1, 1]:  # 控制寄存器
-                self.control_register = self.get_data_lines()
-                print(f"Data written to Control Register: {hex(self.control_register)}")
-            else:
-                raise ValueError("Invalid address lines.")
+            self.registers[self.address] = self.data_bus
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Parallel8255',
+                                f"Data written to {REGISTER_LABELS[self.address]}: {hex(self.data_bus)}")
         else:
-            print("Write operation failed: Control signals not valid.")
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Parallel8255', "Write operation failed: Control signals not valid.")
 
     def read(self):
-        """从指定端口读取数据"""
+        """从地址线选中的端口读取数据"""
         if self.control_lines['CS'] == False and self.control_lines['RD'] == False:  # 检查片选和读使能信号
-            address = self.address_lines
-            if address == [0, 0]:  # 选择端口A
-                data = self.port_a
-                self.set_data_lines(data)
-                print(f"Data read from Port A: {hex(data)}")
-            elif address == [0, 1]:  # 选择端口B
-                data = self.port_b
-                self.set_data_lines(data)
-                print(f"Data read from Port B: {hex(data)}")
-            elif address == [1, 0]:  # 选择端口C
-                data = self.port_c
-                self.set_data_lines(data)
-                print(f"Data read from Port C: {hex(data)}")
-            elif address == [1, 1]:  # 控制寄存器
-                data = self.control_register
-                self.set_data_lines(data)
-                print(f"Data read from Control Register: {hex(data)}")
-            else:
-                raise ValueError("Invalid address lines.")
+            data = self.registers[self.address]
+            self.set_data_lines(data)
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Parallel8255', f"Data read from {REGISTER_LABELS[self.address]}: {hex(data)}")
         else:
-            print("Read operation failed: Control signals not valid.")
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Parallel8255', "Read operation failed: Control signals not valid.")
+
+    def snapshot(self):
+        """保存内部寄存器和引脚状态"""
+        return tuple(self.registers), self.data_bus, tuple(self.control_lines.items()), self.address
+
+    def restore(self, state):
+        registers, self.data_bus, control_lines, self.address = state
+        self.registers[:] = registers
+        self.control_lines = dict(control_lines)
 
     def configure_ports(self):
         """根据控制寄存器配置端口工作模式"""
@@ -142,23 +213,29 @@ class Parallel8255:
         """设置端口工作模式：0=输入，1=输出"""
         if port == 'A':
             if mode == 0:
-                print("Port A set to Input mode.")
+                if self.trace.level >= EVENTS:
+                    self.trace.emit(EVENTS, 'Parallel8255', "Port A set to Input mode.")
             elif mode == 1:
-                print("Port A set to Output mode.")
+                if self.trace.level >= EVENTS:
+                    self.trace.emit(EVENTS, 'Parallel8255', "Port A set to Output mode.")
             else:
                 raise ValueError("Invalid mode for port A")
         elif port == 'B':
             if mode == 0:
-                print("Port B set to Input mode.")
+                if self.trace.level >= EVENTS:
+                    self.trace.emit(EVENTS, 'Parallel8255', "Port B set to Input mode.")
             elif mode == 1:
-                print("Port B set to Output mode.")
+                if self.trace.level >= EVENTS:
+                    self.trace.emit(EVENTS, 'Parallel8255', "Port B set to Output mode.")
             else:
                 raise ValueError("Invalid mode for port B")
         elif port == 'C':
             if mode == 0:
-                print("Port C set to Input mode.")
+                if self.trace.level >= EVENTS:
+                    self.trace.emit(EVENTS, 'Parallel8255', "Port C set to Input mode.")
             elif mode == 1:
-                print("Port C set to Output mode.")
+                if self.trace.level >= EVENTS:
+                    self.trace.emit(EVENTS, 'Parallel8255', "Port C set to Output mode.")
             else:
                 raise ValueError("Invalid mode for port C")
         else:
@@ -0,0 +1,141 @@
+from collections import deque, namedtuple
+
+from Trace import trace, EVENTS
+
+TICK_HANDLER = '_op_tick_timer'
+WRITE_HANDLERS = ('_op_write_ctrl', '_op_write_port')
+MIN_RUN = 2  # 至少这么多条连续的指令才融合
+# 融合后跟踪粒度不同的来源：计数器按段推进，不再逐时钟记录
+UNFUSED_ONLY_SOURCES = frozenset(('Timer8253',))
+
+# 等价性检查的结果：不融合时执行的指令条数 executed，融合后实际分派的条数 dispatched
+Equivalence = namedtuple('Equivalence', ['equivalent', 'difference', 'report', 'executed', 'dispatched'])
+
+
+class FusionReport(namedtuple('FusionReport', ['instructions', 'superinstructions', 'covered'])):
+    """融合结果：程序指令条数、融合的段数（从段首进入时各执行一条超级指令）、段内的指令条数"""
+    __slots__ = ()
+
+    @property
+    def ratio(self):
+        """融合比：段内指令条数 / 段数，即从段首进入时每条超级指令平均代替几条指令"""
+        return self.covered / self.superinstructions if self.superinstructions else 1.0
+
+    def __str__(self):
+        return (f"窥孔融合: {self.instructions} 条指令中 {self.covered} 条融合为 "
+                f"{self.superinstructions} 条超级指令，融合比 {self.ratio:.1f}")
+
+
+class Fuser:
+    """装载阶段的窥孔融合：把预译码 IR 中的连续同类指令替换为一条超级指令
+
+    - N 条连续的 `TICK_TIMER c`（单时钟）-> EU._op_tick_run(c, N)：按段推进计数器，
+      LED3 / Fan3 的阈值动作只在计数值命中的那些时钟补做；
+    - 连续的 WRITE_CTRL / WRITE_PORT -> EU._op_write_ports(...)：一次 8255 总线事务。
+
+    程序长度不变：段内每一项都换成从该项到段尾的超级指令，执行完把 IP 移到段尾，
+    跳转到段中间或从中断返回到段中间时同样按段执行。标签、过程入口等都是单独的 IR 项，自然地把段隔开。
+    """
+
+    def __init__(self, program, eu):
+        self.program = program  # EU.decode_program 的结果，原地修改
+        self.eu = eu
+        self.runs = {}  # 段首 IP -> 段内原来的 IR 项列表
+
+    def fuse(self):
+        program = self.program
+        tick_run = self.eu._op_tick_run
+        write_ports = self.eu._op_write_ports
+        suffixes = {}  # (计数器, 剩余条数) -> IR 项：各段相同长度的尾部共用同一个元组
+        ip = 0
+        while ip < len(program):
+            end = ip + 1
+            entry = program[ip]
+            name = entry[0].__name__
+            if name == TICK_HANDLER and self._single_tick(entry[1]):
+                while end < len(program) and program[end] is entry:  # 相同的源码行绑定为同一个元组
+                    end += 1
+                if end - ip >= MIN_RUN:
+                    counter = entry[1][0]
+                    entries = []
+                    for remaining in range(end - ip, 0, -1):
+                        key = (counter, remaining)
+                        if key not in suffixes:
+                            suffixes[key] = (tick_run, key)
+                        entries.append(suffixes[key])
+                    self._replace(ip, entries)
+            elif name in WRITE_HANDLERS:
+                while end < len(program) and program[end][0].__name__ in WRITE_HANDLERS:
+                    end += 1
+                if end - ip >= MIN_RUN:
+                    writes = tuple(self._register_write(*program[line]) for line in range(ip, end))
+                    self._replace(ip, [(write_ports, (writes[line - ip:],)) for line in range(ip, end)])
+            ip = end
+        return self.report()
+
+    @staticmethod
+    def _single_tick(args):
+        return len(args) == 1 or args[1] == 1  # TICK_TIMER c n 只在 n 个时钟之后检查一次阈值，不能合并
+
+    def _register_write(self, handler, args):
+        """WRITE_CTRL / WRITE_PORT 的 IR 项 -> (8255 寄存器地址, 值)"""
+        if handler.__name__ == '_op_write_ctrl':
+            return self.eu.CONTROL_REGISTER, args[0]
+        port, value = args
+        return self.eu.PORT_REGISTER[port], value
+
+    def _replace(self, start, entries):
+        end = start + len(entries)
+        self.runs[start] = self.program[start:end]
+        self.program[start:end] = entries
+
+    def unfuse(self, ip):
+        """第 ip 条指令被修改时拆掉覆盖它的那一段，返回恢复原样的 IP 范围（调用方让相应的块失效）"""
+        for start, entries in self.runs.items():
+            if start <= ip < start + len(entries):
+                del self.runs[start]
+                self.program[start:start + len(entries)] = entries
+                return range(start, start + len(entries))
+        return range(0)
+
+    def report(self):
+        return FusionReport(len(self.program), len(self.runs), sum(len(entries) for entries in self.runs.values()))
+
+
+def _recorded_run(instructions, fused, max_instructions):
+    """headless 运行一遍，返回 (CPU, 事件级跟踪记录)；运行期间借用共享跟踪器，结束后还原"""
+    from final import CPU  # 延迟导入：final 在装载时导入本模块
+
+    saved = trace.level, trace.sinks, trace.ring
+    trace.level, trace.sinks, trace.ring = EVENTS, [], deque()
+    try:
+        # 逐条分派：每条指令之后都检查 INTR，是判断中断时机是否一致的基准
+        cpu = CPU(None, list(instructions), headless=True, compile_blocks=False, fuse=fused)
+        cpu.run_cpu(max_instructions)
+        records = [(record.source, record.message, record.data) for record in trace.ring
+                   if record.source not in UNFUSED_ONLY_SOURCES]
+    finally:
+        trace.level, trace.sinks, trace.ring = saved
+    return cpu, records
+
+
+def prove_equivalence(instructions, max_instructions=None):
+    """分别以融合 / 不融合方式运行同一程序，比较设备事件序列、整机快照和执行的指令条数
+
+    两次运行都应以 HLT 结束。返回 Equivalence，difference 给出第一处差异（等价时为 None）。
+    """
+    reference, expected = _recorded_run(instructions, False, max_instructions)
+    cpu, actual = _recorded_run(instructions, True, max_instructions)
+    executed = cpu.instruction_count + cpu.eu.fused_instructions
+    difference = None
+    if actual != expected:
+        index = next((i for i, pair in enumerate(zip(expected, actual)) if pair[0] != pair[1]),
+                     min(len(expected), len(actual)))
+        difference = (f"第 {index} 条设备事件不同: {expected[index] if index < len(expected) else None} -> "
+                      f"{actual[index] if index < len(actual) else None}")
+    elif cpu.snapshot() != reference.snapshot():
+        difference = "整机状态不同"
+    elif executed != reference.instruction_count:
+        difference = f"执行的指令条数不同: {reference.instruction_count} -> {executed}"
+    return Equivalence(difference is None, difference, cpu.fusion, reference.instruction_count,
+                       cpu.instruction_count)
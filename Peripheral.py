@@ -1,48 +1,102 @@
 import random
 
+from DeviceRegistry import DeviceRegistry
+from Trace import trace, EVENTS
+
+DEFAULT_DEVICES = ("LED1", "LED2", "LED3", "Fan1", "Fan2", "Fan3")
+
+
 class Peripheral:
-    def __init__(self):
-        self.devices = {
-            "LED1": {"state": 0, "value": None},
-            "LED2": {"state": 0, "value": None},
-            "LED3": {"state": 0, "value": None},
-            "Fan1": {"state": 0, "value": None},
-            "Fan2": {"state": 0, "value": None},
-            "Fan3": {"state": 0, "value": None}
-        }
+    def __init__(self, devices=DEFAULT_DEVICES):
+        # 设备表：按下标存储状态，可以继续 devices.add(名称, room=..., group=...) 登记任意多个设备
+        self.devices = DeviceRegistry(devices)
         self.display = ""
         self.eu = None
+        self.trace = trace
 
     def set_eu(self, eu):
         self.eu = eu
 
     def control_device(self, device, state, value=None):
         if device in self.devices:
-            self.devices[device]["state"] = state
-            self.devices[device]["value"] = value
+            self.devices.set(self.devices.ids[device], state, value)
             status = f"{device} {'ON' if state else 'OFF'}"
             if value is not None:
                 status += f" (Value: {value})"
-            print(status)
-            # 同步更新GUI
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Peripheral', status)
+            # 发布到 GUI 的更新队列，由 Tk 线程按帧刷新
             if self.eu and self.eu.gui:  # 确保有GUI实例
                 self.eu.gui.control_device(device, state)
         else:
-            print("Unknown device")
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Peripheral', "Unknown device")
 
     def update_display(self, message):
         self.display = message
-        print(f"Display: {message}")
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'Peripheral', f"Display: {message}")
 
     def query_status(self, device):
         if device in self.devices:
-            state = "ON" if self.devices[device]["state"] else "OFF"
-            value = self.devices[device]["value"]
+            state = "ON" if self.devices.state(device) else "OFF"
+            value = self.devices.value(device)
             if value is not None:
                 return f"{device} is {state} with Value: {value}"
             return f"{device} is {state}"
         return "Unknown Device"
 
+    def query_selection(self, terms):
+        """STATUS 指令：单个设备名时与 query_status 相同，否则统计选择子选中的设备，如 Fan ROOM=kitchen: 2/5 ON"""
+        if len(terms) == 1 and terms[0] in self.devices:
+            return self.query_status(terms[0])
+        devices = self.devices.parse_selector(terms)
+        if devices is None:
+            return "Unknown Device"
+        return f"{' '.join(terms)}: {self.devices.count_on(devices)}/{len(devices)} ON"
+
+    def switch_selection(self, terms, state):
+        """SWITCH 指令：把选择子选中的设备全部打开 / 关闭，返回状态改变了的设备数；不认识的选择子返回 None"""
+        if len(terms) == 1 and terms[0] in self.devices:
+            self.control_device(terms[0], state)
+            return 1
+        devices = self.devices.parse_selector(terms)
+        if devices is None:
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Peripheral', "Unknown device")
+            return None
+        gui = self.eu.gui if self.eu else None
+        changed = self.devices.set_states(devices, state, collect=gui is not None)
+        if gui is not None:  # 只发布状态确实变化了的设备
+            names = self.devices.names
+            for device in changed:
+                gui.control_device(names[device], state)
+            changed = len(changed)
+        if self.trace.level >= EVENTS:  # 批量操作只记一条事件
+            self.trace.emit(EVENTS, 'Peripheral', f"{' '.join(terms)} {'ON' if state else 'OFF'} "
+                                                  f"({changed}/{len(devices)} changed)")
+        return changed
+
+    def write_device(self, index, value):
+        """端口写：第 index 个设备（按 devices 的顺序）的开关状态，非 0 为开"""
+        if index >= len(self.devices):
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'Peripheral', "Unknown device")
+            return
+        self.control_device(self.devices.names[index], 1 if value else 0)
+
+    def read_device(self, index):
+        """端口读：第 index 个设备的开关状态，没有该设备时读到 0xFF"""
+        return self.devices.states[index] if index < len(self.devices) else 0xFF
+
+    def snapshot(self):
+        """保存所有设备的状态和显示内容"""
+        return self.devices.snapshot(), self.display
+
+    def restore(self, state):
+        devices, self.display = state
+        self.devices.restore(devices)
+
     def check_device_status(self, device):
         # Simulate random faults
         return "Faulty" if random.randint(0, 10) > 8 else "Normal"
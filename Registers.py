@@ -0,0 +1,248 @@
+from array import array
+
+REGISTER_NAMES = ('AX', 'BX', 'CX', 'DX', 'SP', 'BP', 'SI', 'DI',
+                  'IP', 'CS', 'DS', 'ES', 'SS')
+REGISTER_INDEX = {name: index for index, name in enumerate(REGISTER_NAMES)}
+AX, BX, CX, DX, SP, BP, SI, DI, IP, CS, DS, ES, SS = range(len(REGISTER_NAMES))
+
+# FLAGS 寄存器各标志位的位置（与 8086 一致）
+FLAG_BITS = {'CF': 0, 'PF': 2, 'AF': 4, 'ZF': 6, 'SF': 7, 'TF': 8, 'IF': 9, 'DF': 10, 'OF': 11}
+FLAG_NAMES = tuple(FLAG_BITS)
+CF_MASK, PF_MASK, AF_MASK, ZF_MASK, SF_MASK, TF_MASK, IF_MASK, DF_MASK, OF_MASK = (
+    1 << bit for bit in FLAG_BITS.values())
+# 由运算结果决定、可以惰性求值的状态标志；TF / IF / DF 是控制标志，始终直接保存在 word 里
+ARITHMETIC_MASK = CF_MASK | PF_MASK | AF_MASK | ZF_MASK | SF_MASK | OF_MASK
+# 低 8 位中 1 的个数为偶数时 PF 置位
+PARITY = bytes(0 if bin(value).count('1') & 1 else PF_MASK for value in range(256))
+
+# 惰性标志记录的运算类别：ADC / SBB / CMP / NEG / TEST 分别归入 ADD / SUB / SUB / SUB / LOGIC
+LAZY_ADD, LAZY_SUB, LAZY_INC, LAZY_DEC, LAZY_LOGIC, LAZY_SHL, LAZY_SHR, LAZY_SAR, LAZY_MUL = range(9)
+
+
+class RegisterFile:
+    """以 array('H') 存储的 16 位寄存器组
+
+    热路径直接用整数下标访问 values（见 AX、IP 等常量），
+    按名称访问的字典式接口保留给装载阶段、跟踪和旧代码使用。
+    """
+    __slots__ = ('values',)
+
+    def __init__(self):
+        self.values = array('H', bytes(2 * len(REGISTER_NAMES)))
+
+    def __getitem__(self, name):
+        return self.values[REGISTER_INDEX[name]]
+
+    def __setitem__(self, name, value):
+        self.values[REGISTER_INDEX[name]] = value & 0xFFFF
+
+    def __contains__(self, name):
+        return name in REGISTER_INDEX
+
+    def __iter__(self):
+        return iter(REGISTER_NAMES)
+
+    def __len__(self):
+        return len(REGISTER_NAMES)
+
+    def __eq__(self, other):
+        if isinstance(other, RegisterFile):
+            return self.values == other.values
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+    def keys(self):
+        return REGISTER_NAMES
+
+    def items(self):
+        return zip(REGISTER_NAMES, self.values)
+
+    def as_dict(self):
+        return dict(zip(REGISTER_NAMES, self.values))
+
+    def snapshot(self):
+        return self.values.tobytes()
+
+    def restore(self, state):
+        # 原地覆盖，预译码阶段绑定的操作数闭包仍然引用同一个数组
+        self.values[:] = array('H', state)
+
+
+def _register_property(index):
+    def getter(self):
+        return self.values[index]
+
+    def setter(self, value):
+        self.values[index] = value & 0xFFFF
+    return property(getter, setter)
+
+
+for _index, _name in enumerate(REGISTER_NAMES):
+    setattr(RegisterFile, _name.lower(), _register_property(_index))
+
+
+class Flags:
+    """打包成 16 位 FLAGS 字的标志寄存器，状态标志惰性求值
+
+    ALU 不在每次运算后计算 CF/PF/AF/ZF/SF/OF，只在 lazy 里记下
+    (运算类别, 操作数 a, 操作数 b, 未截断的结果, 符号位)；读取这些标志时
+    （条件转移、PUSHF、跟踪、快照）才按记录求值。word 中的控制标志始终有效，
+    状态标志只在 lazy 为 None 时有效，需要完整的 FLAGS 字时读 value。
+    """
+    __slots__ = ('word', 'lazy')
+
+    def __init__(self, word=0):
+        self.word = word
+        self.lazy = None
+
+    @property
+    def value(self):
+        """求值后的完整 FLAGS 字"""
+        if self.lazy is not None:
+            self.word = _evaluate(self.word, *self.lazy)
+            self.lazy = None
+        return self.word
+
+    @value.setter
+    def value(self, word):
+        self.word = word
+        self.lazy = None
+
+    def carry(self):
+        """只求 CF（ADC / SBB / INC / DEC 等需要进位输入的运算使用），返回 0 或 1"""
+        if self.lazy is None:
+            return self.word & CF_MASK
+        kind, a, b, raw, sign = self.lazy
+        return 1 if _carry(self.word, kind, a, b, raw, sign) else 0
+
+    def zero(self):
+        """只求 ZF，不触发完整求值"""
+        if self.lazy is None:
+            return self.word & ZF_MASK
+        _, _, _, raw, sign = self.lazy
+        return not raw & ((sign << 1) - 1)
+
+    def sign(self):
+        """只求 SF，不触发完整求值"""
+        if self.lazy is None:
+            return self.word & SF_MASK
+        return self.lazy[3] & self.lazy[4]
+
+    def __getitem__(self, name):
+        return (self.value >> FLAG_BITS[name]) & 1
+
+    def __setitem__(self, name, value):
+        mask = 1 << FLAG_BITS[name]
+        word = self.value
+        self.word = word | mask if value else word & ~mask
+
+    def __contains__(self, name):
+        return name in FLAG_BITS
+
+    def __iter__(self):
+        return iter(FLAG_NAMES)
+
+    def __eq__(self, other):
+        if isinstance(other, Flags):
+            return self.value == other.value
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+    def keys(self):
+        return FLAG_NAMES
+
+    def items(self):
+        return self.as_dict().items()
+
+    def as_dict(self):
+        word = self.value
+        return {name: (word >> bit) & 1 for name, bit in FLAG_BITS.items()}
+
+    def snapshot(self):
+        return self.value
+
+    def restore(self, state):
+        self.value = state
+
+
+def _carry(word, kind, a, b, raw, sign):
+    if kind == LAZY_ADD or kind == LAZY_SHL:
+        return raw & (sign << 1)  # 进位 / 最后移出的位落在符号位的上一位
+    if kind == LAZY_SUB:
+        return raw < 0  # 借位
+    if kind == LAZY_INC or kind == LAZY_DEC:
+        return word & CF_MASK  # INC / DEC 不影响 CF，记录时已把原来的 CF 存入 word
+    if kind == LAZY_SHR or kind == LAZY_SAR:
+        return (a >> (b - 1)) & 1
+    if kind == LAZY_MUL:
+        return raw > (sign << 1) - 1  # 乘积的高半部分不为 0
+    return 0
+
+
+def _evaluate(word, kind, a, b, raw, sign):
+    """按惰性记录求出全部状态标志，返回新的 FLAGS 字"""
+    result = raw & ((sign << 1) - 1)
+    carry = _carry(word, kind, a, b, raw, sign)
+    word = (word & ~ARITHMETIC_MASK) | PARITY[result & 0xFF]
+    if carry:
+        word |= CF_MASK
+    if not result:
+        word |= ZF_MASK
+    if result & sign:
+        word |= SF_MASK
+    if kind <= LAZY_DEC:  # 加减类运算：AF 为低 4 位向高位的进位 / 借位
+        word |= (a ^ b ^ result) & AF_MASK
+        if kind == LAZY_ADD or kind == LAZY_INC:
+            overflow = (a ^ result) & (b ^ result) & sign
+        else:
+            overflow = (a ^ b) & (a ^ result) & sign
+    elif kind == LAZY_SHL:
+        overflow = bool(result & sign) != bool(carry)
+    elif kind == LAZY_SHR:
+        overflow = a & sign  # 移位前的最高位
+    elif kind == LAZY_MUL:
+        overflow = carry
+    else:  # LOGIC / SAR
+        overflow = 0
+    if overflow:
+        word |= OF_MASK
+    return word
+
+
+def _flag_property(mask):
+    def getter(self):
+        return 1 if self.value & mask else 0
+
+    def setter(self, value):
+        word = self.value
+        self.word = word | mask if value else word & ~mask
+    return property(getter, setter)
+
+
+for _name, _bit in FLAG_BITS.items():
+    setattr(Flags, _name.lower(), _flag_property(1 << _bit))
+
+
+def _less(flags):
+    return bool(flags.sign()) != bool(flags.value & OF_MASK)
+
+
+# 条件转移的条件 -> 判断函数（参数为 Flags），尽量只求所需的标志
+CONDITIONS = {
+    'Z': lambda flags: flags.zero(), 'NZ': lambda flags: not flags.zero(),
+    'C': lambda flags: flags.carry(), 'NC': lambda flags: not flags.carry(),
+    'S': lambda flags: flags.sign(), 'NS': lambda flags: not flags.sign(),
+    'O': lambda flags: flags.value & OF_MASK, 'NO': lambda flags: not flags.value & OF_MASK,
+    'P': lambda flags: flags.value & PF_MASK, 'NP': lambda flags: not flags.value & PF_MASK,
+    'A': lambda flags: not (flags.carry() or flags.zero()), 'BE': lambda flags: flags.carry() or flags.zero(),
+    'L': _less, 'GE': lambda flags: not _less(flags),
+    'LE': lambda flags: flags.zero() or _less(flags), 'G': lambda flags: not (flags.zero() or _less(flags)),
+}
@@ -0,0 +1,227 @@
+import heapq
+import itertools
+
+from IOBus import TIMER_PORTS
+from Trace import trace, EVENTS
+
+CPU_HZ = 4772727  # 8086 主频（IBM PC 为 4.77 MHz）
+TIMER_DIVISOR = 4  # 8253 的输入时钟为 CPU 时钟的 1/4（约 1.19 MHz）
+
+# 各处理方法的基本时钟周期数（参考 8086 手册中寄存器操作数形式的典型值）
+CYCLES = {
+    '_op_mov': 2, '_op_add': 3, '_op_sub': 3, '_op_and': 3, '_op_or': 3, '_op_xor': 3,
+    '_op_not': 3, '_op_mul': 118, '_op_div': 144, '_op_adc': 3, '_op_sbb': 3, '_op_neg': 3,
+    '_op_shl': 8, '_op_shr': 8, '_op_sar': 8, '_op_rol': 8, '_op_ror': 8, '_op_rcl': 8, '_op_rcr': 8,
+    '_op_pushf': 10, '_op_popf': 8,
+    '_op_push': 11, '_op_pop': 8, '_op_jmp': 15, '_op_call': 19, '_op_ret': 8, '_op_hlt': 2,
+    '_op_cmp': 3, '_op_test': 3, '_op_inc': 2, '_op_dec': 2,
+    # 条件转移和循环按转移成功计（不转移时少 12 个周期左右）
+    '_op_jcc': 16, '_op_loop': 17, '_op_loope': 18, '_op_loopne': 19, '_op_jcxz': 18,
+    'movsb': 18, 'movsw': 18, 'cmpsb': 22, 'cmpsw': 22, 'scasb': 15, 'scasw': 15,
+    'stosb': 11, 'stosw': 11, 'lodsb': 12, 'lodsw': 12, '_op_rep': 9, 'stc': 2, 'clc': 2,
+    'sti': 2, 'cli': 2, '_op_int': 51, '_op_iret': 24, '_op_eoi': 10,
+    '_op_in': 10, '_op_out': 10, '_op_in_dx': 8, '_op_out_dx': 8,
+    # 外设操作相当于若干条 OUT / IN 指令
+    '_op_voice': 20, '_op_voice_reg': 20, '_op_status': 20, '_op_switch': 20,
+    '_op_config_timer': 30, '_op_start_timer': 10, '_op_stop_timer': 10, '_op_tick_timer': 10,
+    '_op_write_ctrl': 10, '_op_write_port': 10, '_op_read_port': 10,
+    # 伪指令不占用执行时间
+    '_op_nop': 0, '_op_segment': 0, '_op_define': 0, '_op_proc': 0, '_op_endp': 0, '_op_label': 0,
+}
+DEFAULT_CYCLES = 4  # 未列出的指令（如字符串解释兜底的行）
+IMMEDIATE_CYCLES = 2  # 立即数源操作数的额外周期
+MEMORY_CYCLES = {'mem': 6 + 8, 'ind': 5 + 8, 'based': 8 + 8}  # 有效地址计算 + 一次字访问
+STRING_CYCLES = {'movs': 17, 'cmps': 22, 'scas': 15, 'stos': 10, 'lods': 13}  # REP 每个元素的周期数
+INTERRUPT_CYCLES = 61  # 响应外部中断（两个 INTA 周期 + 压栈 + 读向量）
+TIMER_HANDLERS = frozenset(('_op_config_timer', '_op_start_timer', '_op_stop_timer', '_op_tick_timer'))
+
+
+def instruction_cycles(handler, args):
+    """预译码指令的时钟周期数"""
+    cycles = CYCLES.get(handler.__name__, DEFAULT_CYCLES)
+    for arg in args:
+        kind = getattr(getattr(arg, 'spec', None), 'kind', None)
+        if kind in MEMORY_CYCLES:
+            cycles += MEMORY_CYCLES[kind]
+        elif kind == 'imm' and handler.__name__ not in ('_op_jmp', '_op_call'):
+            cycles += IMMEDIATE_CYCLES
+    return cycles
+
+
+def element_cycles(handler, args):
+    """REP 串操作每个元素的周期数，其它指令为 0"""
+    return STRING_CYCLES[args[0]] if handler.__name__ == '_op_rep' else 0
+
+
+def touches_timer(handler, args):
+    """指令是否可能读写 8253（执行前要把它推进到当前时间，执行后重新预测计数结束）"""
+    name = handler.__name__
+    if name in ('_op_in', '_op_out'):
+        return args[0] in TIMER_PORTS
+    return name in TIMER_HANDLERS or name in ('_op_in_dx', '_op_out_dx')  # DX 端口在运行时才知道
+
+
+class Scheduler:
+    """离散事件虚拟时钟
+
+    虚拟时间以 CPU 时钟周期为单位：CPU 每执行一条指令按其周期数推进时间，
+    8253 按 CPU 时钟 / TIMER_DIVISOR 惰性地批量推进（Timer8253.advance_all）。
+    将来的事件（计数结束、定时的语音输入、设备变化）放在按时间排序的堆里；
+    CPU 执行 HLT 时直接跳到下一个事件，而不是空转。
+    """
+
+    def __init__(self, cpu_hz=CPU_HZ, timer_divisor=TIMER_DIVISOR, until=None):
+        self.cpu_hz = cpu_hz
+        self.timer_divisor = timer_divisor
+        self.now = 0  # 当前虚拟时间（CPU 周期）
+        self.until = until  # 仿真截止时间（CPU 周期），None 表示直到没有事件
+        self.queue = []  # [时间, 序号, 回调, 参数, 有效]
+        self.sequence = itertools.count()  # 同一时刻的事件按加入顺序执行
+        self.timer = None
+        self.timer_clock = 0  # 8253 已推进到的输入时钟数
+        self.terminal_listeners = {}  # 计数器 -> 计数结束回调列表
+        self.terminal_events = {}  # 计数器 -> 已排队的计数结束事件
+        self.woken = False
+        self.dispatched = 0  # 已执行的事件数
+        self.trace = trace
+
+    def cycles(self, seconds):
+        """秒 -> CPU 周期"""
+        return round(seconds * self.cpu_hz)
+
+    def seconds(self, cycles=None):
+        """CPU 周期 -> 秒，缺省为当前虚拟时间"""
+        return (self.now if cycles is None else cycles) / self.cpu_hz
+
+    def at(self, when, callback, *args):
+        """在虚拟时间 when（CPU 周期）执行 callback(*args)，返回可用于 cancel 的事件"""
+        event = [max(when, self.now), next(self.sequence), callback, args, True]
+        heapq.heappush(self.queue, event)
+        return event
+
+    def after(self, delay, callback, *args):
+        return self.at(self.now + delay, callback, *args)
+
+    def at_seconds(self, seconds, callback, *args):
+        return self.at(self.cycles(seconds), callback, *args)
+
+    @staticmethod
+    def cancel(event):
+        event[4] = False  # 惰性删除：出堆时跳过
+
+    @property
+    def next_time(self):
+        """下一个有效事件的时间，没有事件时返回 None"""
+        queue = self.queue
+        while queue and not queue[0][4]:
+            heapq.heappop(queue)
+        return queue[0][0] if queue else None
+
+    def elements_before_next_event(self, base, per_element):
+        """从现在开始的 REP 串操作执行到下一个事件到达时（含正在执行的元素）的元素数，没有事件时返回 None"""
+        when = self.next_time
+        if when is None:
+            return None
+        return max(1, -((self.now + base - when) // per_element))
+
+    def wake(self):
+        """事件回调调用它来唤醒执行 HLT 等待的 CPU"""
+        self.woken = True
+
+    # ---------- 8253 ----------
+
+    def attach_timer(self, timer):
+        """接管 8253：OUT 上接的中断请求改由虚拟时钟在计数结束的准确时刻投递"""
+        self.timer = timer
+        self.timer_clock = self.now // self.timer_divisor
+        for counter, handler in enumerate(timer.outputs):
+            if handler is not None:
+                self.on_terminal_count(counter, handler)
+
+    def sync_timer(self):
+        """把 8253 推进到当前虚拟时间"""
+        clock = self.now // self.timer_divisor
+        if self.timer is not None and clock > self.timer_clock:
+            self.timer.advance_all(clock - self.timer_clock, notify=False)
+        self.timer_clock = clock
+
+    def on_terminal_count(self, counter, callback):
+        """计数器每次计数结束时调用 callback(counter)"""
+        self.terminal_listeners.setdefault(counter, []).append(callback)
+        self.timer_changed()
+
+    def timer_changed(self):
+        """8253 被重新编程（配置 / 启动 / 停止 / 手动推进）后重新预测计数结束时间"""
+        self.sync_timer()
+        for counter in self.terminal_listeners:
+            self._schedule_terminal(counter)
+
+    def _schedule_terminal(self, counter):
+        event = self.terminal_events.pop(counter, None)
+        if event is not None:
+            self.cancel(event)
+        clocks = self.timer.clocks_to_terminal(counter)
+        if clocks is not None:
+            when = (self.timer_clock + clocks) * self.timer_divisor
+            self.terminal_events[counter] = self.at(when, self._terminal_count, counter, when)
+
+    def _terminal_count(self, counter, when):
+        # 8253 本身不在这里推进（由 sync_timer 惰性追上），周期方式下一次结束正好在一个周期之后
+        self.terminal_events.pop(counter, None)
+        for callback in self.terminal_listeners[counter]:
+            callback(counter)
+        if counter not in self.terminal_events:  # 回调里没有重新编程 8253
+            period = self.timer.reload_period(counter)
+            if period is not None:
+                when += period * self.timer_divisor
+                self.terminal_events[counter] = self.at(when, self._terminal_count, counter, when)
+
+    # ---------- 事件执行 ----------
+
+    def run_due(self):
+        """执行所有时间已到的事件"""
+        queue = self.queue
+        while queue and queue[0][0] <= self.now:
+            when, _, callback, args, active = heapq.heappop(queue)
+            if active:
+                self.dispatched += 1
+                callback(*args)
+
+    def idle(self, ready=None):
+        """CPU 停机等待：直接跳到下一个事件并执行，直到某个事件唤醒 CPU
+
+        ready 为可选的无参函数（例如“有可响应的中断”），返回真值时同样唤醒 CPU。
+        返回 True 表示 CPU 被唤醒，False 表示没有更多事件或已到截止时间。
+        """
+        self.woken = False
+        while True:
+            if ready is not None and ready():
+                return True
+            when = self.next_time
+            if when is None:
+                return False
+            if self.until is not None and when > self.until:
+                self.now = max(self.now, self.until)
+                return False
+            self.now = max(self.now, when)
+            self.run_due()
+            if self.woken:
+                self.woken = False
+                return True
+
+
+def deliver_voice(scheduler, eu, code, register='AX'):
+    """语音模块送来一条语音码：写入寄存器并唤醒 CPU（程序用 VOICE AX 处理）"""
+    eu.registers[register] = code
+    if scheduler.trace.level >= EVENTS:
+        scheduler.trace.emit(EVENTS, 'Scheduler', f"{scheduler.seconds():.3f}s 语音输入 {code:02d}")
+    scheduler.wake()
+
+
+def schedule_voice(scheduler, cpu, seconds, code, register='AX'):
+    return scheduler.at_seconds(seconds, deliver_voice, scheduler, cpu.eu, code, register)
+
+
+def schedule_device(scheduler, cpu, seconds, device, state):
+    """定时的设备状态变化（例如手动开关），不唤醒 CPU"""
+    return scheduler.at_seconds(seconds, cpu.board.peripheral.control_device, device, state)
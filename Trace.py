@@ -0,0 +1,109 @@
+import json
+from collections import deque, namedtuple
+
+# 跟踪级别：数值越大输出越详细
+OFF = 0  # 关闭
+EVENTS = 1  # 设备动作、伪指令、停机等事件
+INSTRUCTIONS = 2  # 每条指令执行后的寄存器 / 标志状态、定时器时钟
+PINS = 3  # 8255 地址线 / 控制线 / 数据线等引脚级变化
+
+LEVEL_NAMES = {'off': OFF, 'events': EVENTS, 'instructions': INSTRUCTIONS, 'pins': PINS}
+
+TraceRecord = namedtuple('TraceRecord', ['seq', 'level', 'source', 'message', 'data'])
+
+
+class ConsoleSink:
+    """把记录的消息原样打印到终端（与原来的 print 输出一致）"""
+
+    def write(self, record):
+        print(record.message)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """带缓冲的 JSONL 文件输出，每条记录一行，便于离线分析"""
+
+    def __init__(self, path, buffer_size=1 << 20):
+        self.file = open(path, 'w', encoding='utf-8', buffering=buffer_size)
+
+    def write(self, record):
+        self.file.write(json.dumps(record._asdict(), ensure_ascii=False))
+        self.file.write('\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Tracer:
+    """所有模块共享的分级跟踪器
+
+    调用方先判断 `tracer.level >= 级别` 再格式化消息，
+    因此关闭跟踪时每个跟踪点只多一次整数比较。
+    """
+
+    def __init__(self, level=PINS, console=True, ring_size=0):
+        self.level = level
+        self.sinks = [ConsoleSink()] if console else []
+        self.ring = deque(maxlen=ring_size) if ring_size else None
+        self.seq = 0
+
+    def set_level(self, level):
+        if isinstance(level, str):
+            level = LEVEL_NAMES[level.lower()]
+        if not (OFF <= level <= PINS):
+            raise ValueError(f"Invalid trace level: {level}")
+        self.level = level
+
+    def enable_ring(self, size):
+        """保存最近 size 条记录的环形缓冲区"""
+        self.ring = deque(self.ring or (), maxlen=size)
+
+    def disable_ring(self):
+        self.ring = None
+
+    def records(self):
+        return list(self.ring) if self.ring is not None else []
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+        sink.flush()
+
+    def set_console(self, enabled):
+        self.sinks = [sink for sink in self.sinks if not isinstance(sink, ConsoleSink)]
+        if enabled:
+            self.sinks.insert(0, ConsoleSink())
+
+    def emit(self, level, source, message, data=None):
+        if level > self.level:
+            return
+        self.seq += 1
+        record = TraceRecord(self.seq, level, source, message, data)
+        if self.ring is not None:
+            self.ring.append(record)
+        for sink in self.sinks:
+            sink.write(record)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+
+
+# 默认跟踪器：保持原有的终端输出（引脚级）
+trace = Tracer()
@@ -0,0 +1,606 @@
+import contextlib
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from Assembler import CACHE_DIRECTORY, load_source
+from Decoder import decode
+from final import CPU, EU
+from Memory import Memory, PAGE_SIZE
+from Peephole import prove_equivalence
+from PIC8259A import PIC8259A, PRIORITY_ORDERS
+from PTimer8253 import Timer8253
+from Registers import CS
+from Trace import trace, OFF, INSTRUCTIONS, PINS
+
+# 基准测试用的循环体：寄存器 / 立即数 / 内存 / 寄存器间接寻址混合
+LOOP_BODY = [
+    "MOV AX 1",
+    "MOV BX 2",
+    "ADD AX BX",
+    "SUB AX 1",
+    "AND AX 255",
+    "OR BX AX",
+    "XOR CX BX",
+    "MOV [10] AX",
+    "MOV SI 10",
+    "MOV DX [SI]",
+    "PUSH DX",
+    "POP CX",
+]
+
+
+# 一个家庭控制器的典型程序：定时器计数 + 语音控制家电 + 8255 端口读写
+HOME_PROGRAM = [
+    "CONFIG_TIMER 1 1 20",
+    "START_TIMER 1",
+    "VOICE 01",
+    "TICK_TIMER 1",
+    "VOICE 05",
+    "TICK_TIMER 1",
+    "VOICE 02",
+    "WRITE_CTRL 0x80",
+    "WRITE_PORT A 0x0F",
+    "READ_PORT A",
+    "STATUS LED1",
+] + LOOP_BODY * 20 + ["HLT"]
+
+# 锁步仿真用的家庭程序：语音码来自每个家庭各自的 AX / BX，只用寄存器操作数
+LOCKSTEP_BODY = [
+    "VOICE AX",
+    "TICK_TIMER 1",
+    "VOICE BX",
+    "STATUS LED1",
+    "ADD CX AX",
+    "SUB DX BX",
+    "XOR SI CX",
+    "AND SI 255",
+    "WRITE_PORT A 0x0F",
+    "READ_PORT A",
+]
+LOCKSTEP_PROGRAM = ["CONFIG_TIMER 1 1 20", "START_TIMER 1"] + LOCKSTEP_BODY * 50 + ["HLT"]
+
+
+def _report(name, count, elapsed):
+    print(f"{name:<24} {count:>10} 条指令  {elapsed:8.3f} s  {count / elapsed:12.0f} 条/秒")
+
+
+def bench_predecode(iterations=5000):
+    """比较字符串解释路径与预译码 IR 路径的每秒指令数"""
+    eu = EU()
+    eu.set_memory(Memory())
+    count = iterations * len(LOOP_BODY)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for instruction in LOOP_BODY:
+            eu._execute_text(instruction)
+    source_elapsed = time.perf_counter() - start
+
+    program = eu.decode_program(LOOP_BODY)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for handler, args in program:
+            handler(*args)
+    decoded_elapsed = time.perf_counter() - start
+
+    print("== 预译码 IR vs 字符串解释 ==")
+    _report("字符串解释路径", count, source_elapsed)
+    _report("预译码 IR 路径", count, decoded_elapsed)
+    print(f"加速比: {source_elapsed / decoded_elapsed:.2f}x")
+
+
+def _run_headless(program, predecode=True):
+    cpu = CPU(Memory(), program, predecode=predecode, headless=True)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        cpu.run()
+        elapsed = time.perf_counter() - start
+    return cpu, elapsed
+
+
+def bench_headless(iterations=2000):
+    """headless 不限速模式下整机的吞吐量（关闭跟踪）"""
+    program = LOOP_BODY * iterations + ["HLT"]
+    print("== headless 不限速运行 ==")
+    for predecode in (False, True):
+        cpu, elapsed = _run_headless(program, predecode)
+        _report("预译码 IR" if predecode else "字符串解释", cpu.instruction_count, elapsed)
+
+
+def bench_trace(iterations=2000):
+    """不同跟踪配置下的吞吐量：关闭 / 仅环形缓冲 / 终端输出"""
+    program = LOOP_BODY * iterations + ["HLT"]
+    print("== 跟踪开销 ==")
+    configs = [
+        ("关闭", OFF, False, 0),
+        ("逐指令 -> 环形缓冲", INSTRUCTIONS, False, 1024),
+        ("引脚级 -> 终端", PINS, True, 0),
+    ]
+    for name, level, console, ring_size in configs:
+        trace.set_level(level)
+        trace.set_console(console)
+        if ring_size:
+            trace.enable_ring(ring_size)
+        else:
+            trace.disable_ring()
+        cpu, elapsed = _run_headless(program)
+        _report(name, cpu.instruction_count, elapsed)
+    trace.set_level(OFF)
+    trace.disable_ring()
+
+
+def bench_blocks(budget=300000):
+    """循环程序：逐条分派 vs 基本块编译"""
+    program = LOOP_BODY + ["JMP 0"]
+    print("== 基本块编译 ==")
+    for compile_blocks in (False, True):
+        cpu = CPU(Memory(), program, headless=True, compile_blocks=compile_blocks)
+        start = time.perf_counter()
+        cpu.run_cpu(max_instructions=budget)
+        elapsed = time.perf_counter() - start
+        _report("基本块" if compile_blocks else "逐条分派", cpu.instruction_count, elapsed)
+
+
+def bench_snapshot(count=20000):
+    """整机检查点保存 / 恢复速率"""
+    cpu, _ = _run_headless(LOOP_BODY * 10 + ["HLT"])
+    start = time.perf_counter()
+    for _ in range(count):
+        state = cpu.snapshot()
+    snapshot_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(count):
+        cpu.restore(state)
+    restore_elapsed = time.perf_counter() - start
+    print("== 检查点 ==")
+    print(f"snapshot: {count / snapshot_elapsed:10.0f} 次/秒   restore: {count / restore_elapsed:10.0f} 次/秒")
+
+
+def bench_timer(clocks=1193182):
+    """8253 推进一秒钟的输入时钟（1.19 MHz）：逐个 tick vs 解析式 advance"""
+    print("== 8253 批量推进 ==")
+    timer = Timer8253()
+    timer.configure(0, 2, 0)  # 方式 2，周期 65536（PC 的 18.2 Hz 时钟中断）
+    timer.start(0)
+    start = time.perf_counter()
+    for _ in range(clocks):
+        timer.tick(0)
+    tick_elapsed = time.perf_counter() - start
+    ticked = timer.counters[0]['counter_register']
+
+    timer.configure(0, 2, 0)
+    timer.start(0)
+    start = time.perf_counter()
+    events = timer.advance(0, clocks)
+    advance_elapsed = time.perf_counter() - start
+    print(f"tick x{clocks}: {tick_elapsed:8.3f} s   advance({clocks}): {advance_elapsed * 1e6:8.1f} us   "
+          f"计数终点 {len(events)} 次   结果一致: {ticked == timer.counters[0]['counter_register']}")
+
+
+def bench_day(hours=24):
+    """虚拟时钟：一整天的家庭自动化（每分钟一条语音输入，8253 计数器 0 以 18.2 Hz 计数结束）"""
+    from Scheduler import Scheduler, schedule_voice
+    program = ["CONFIG_TIMER 0 2 0", "START_TIMER 0", "loop:", "HLT", "VOICE AX", "STATUS Fan1", "JMP loop"]
+    scheduler = Scheduler()
+    scheduler.until = scheduler.cycles(hours * 3600)
+    cpu = CPU(None, program, headless=True, scheduler=scheduler)
+    terminal_counts = []
+    scheduler.on_terminal_count(0, terminal_counts.append)
+    for minute in range(hours * 60):
+        schedule_voice(scheduler, cpu, minute * 60 + 30, (5, 6, 1, 2)[minute % 4])
+    start = time.perf_counter()
+    cpu.run()
+    elapsed = time.perf_counter() - start
+    print("== 虚拟时钟 ==")
+    print(f"虚拟 {scheduler.seconds() / 3600:.1f} h  用时 {elapsed:6.2f} s  指令 {cpu.instruction_count}  "
+          f"事件 {scheduler.dispatched}  计数结束 {len(terminal_counts)} 次")
+
+
+def bench_interrupts(seconds=60, hz=1000):
+    """8253 计数器 0 经 8259A IRQ0 驱动的中断处理程序：HLT 等待 vs 忙循环（TICK_TIMER）"""
+    from Scheduler import Scheduler
+    handler = ["isr:", "ADD BX 1", "EOI", "IRET"]
+    setup = ["MOV [32] isr", "MOV [34] 0", f"CONFIG_TIMER 0 2 {1193182 // hz}", "START_TIMER 0", "STI"]
+    print("== 定时器中断 ==")
+    scheduler = Scheduler()
+    scheduler.until = scheduler.cycles(seconds)
+    cpu = CPU(None, setup + ["idle:", "HLT", "JMP idle"] + handler, headless=True, scheduler=scheduler)
+    start = time.perf_counter()
+    cpu.run()
+    elapsed = time.perf_counter() - start
+    print(f"虚拟时钟 HLT 等待: 虚拟 {seconds} s  中断 {cpu.eu.registers['BX']} 次  用时 {elapsed:6.3f} s  "
+          f"{cpu.eu.registers['BX'] / elapsed:10.0f} 中断/秒")
+    program = setup + ["MOV CX 0", "loop:", "TICK_TIMER 0 50", "ADD CX 1", "JMP loop"] + handler
+    for compile_blocks in (False, True):
+        cpu = CPU(None, list(program), headless=True, compile_blocks=compile_blocks)
+        start = time.perf_counter()
+        cpu.run_cpu(max_instructions=300000)
+        elapsed = time.perf_counter() - start
+        _report(f"{'基本块' if compile_blocks else '逐条分派'} 中断 {cpu.eu.registers['BX']} 次",
+                cpu.instruction_count, elapsed)
+
+
+def _scan_next_interrupt(pic):
+    """查表之前的做法：按优先级列表逐位检查（作为对照）"""
+    pending = pic.IRR & ~pic.IMR
+    for irq in pic.priority:
+        if pic.ISR & (1 << irq):
+            return -1
+        if pending & (1 << irq):
+            return irq
+    return -1
+
+
+def bench_pic(rounds=20000):
+    """15 条中断线全部有请求时的优先级判定：逐位扫描 vs 查表，以及级联的完整响应 / EOI 周期"""
+    from Board import Board
+    print("== 8259A 优先级判定 ==")
+    board = Board()
+    pic, slave = board.pic, board.slave_pic
+    lines = [(pic, irq) for irq in (0, 1, 3, 4, 5, 6, 7)] + [(slave, irq) for irq in range(8)]
+    for rotation in (0, 5):
+        pic.rotation = slave.rotation = rotation
+        pic.priority = slave.priority = PRIORITY_ORDERS[rotation]
+        pic.IRR = 1 << ((rotation - 1) & 7)  # 只有最低优先级的一级有请求：逐位扫描要走完整个列表
+        for name, resolve in (("逐位扫描", _scan_next_interrupt), ("查表", PIC8259A._get_next_interrupt)):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                resolve(pic)
+            elapsed = time.perf_counter() - start
+            print(f"{name:8} 优先级状态 {rotation}: {elapsed / rounds * 1e9:8.0f} ns/次")
+    pic.rotation = slave.rotation = 0
+    pic.priority = slave.priority = PRIORITY_ORDERS[0]
+    pic.IRR = 0
+    start = time.perf_counter()
+    vectors = 0
+    for _ in range(rounds // len(lines)):
+        for chip, irq in lines:
+            chip.request_interrupt(irq)
+        while pic.intr:
+            pic.inta()
+            pic.eoi()
+            vectors += 1
+    elapsed = time.perf_counter() - start
+    print(f"15 线全部请求: 响应 + EOI {vectors} 次  {elapsed / vectors * 1e6:8.2f} us/次")
+
+
+def bench_8255(count=200000):
+    """8255 端口写：引脚级 vs 寄存器级"""
+    from Parallel8255 import Parallel8255
+    print("== 8255 端口写 ==")
+    for pin_accurate in (True, False):
+        chip = Parallel8255(pin_accurate)
+        write = chip.write_register
+        start = time.perf_counter()
+        for value in range(count):
+            write(value & 3, value)
+        elapsed = time.perf_counter() - start
+        _report("引脚级" if pin_accurate else "寄存器级", count, elapsed)
+
+
+def bench_io(budget=300000):
+    """端口访问：专用的 WRITE_PORT / READ_PORT 指令 vs 经 I/O 译码表的 OUT / IN"""
+    print("== I/O 端口 ==")
+    programs = (("WRITE_PORT / READ_PORT", ["loop:", "WRITE_PORT A 0x55", "READ_PORT A", "JMP loop"]),
+                ("OUT / IN (立即数端口)", ["MOV AX 85", "loop:", "OUT 0x60 AL", "IN AL 0x60", "JMP loop"]),
+                ("OUT / IN (DX 端口)", ["MOV AX 85", "MOV DX 96", "loop:", "OUT DX AL", "IN AL DX", "JMP loop"]))
+    for name, program in programs:
+        cpu = CPU(None, program, headless=True)
+        start = time.perf_counter()
+        cpu.run_cpu(max_instructions=budget)
+        elapsed = time.perf_counter() - start
+        _report(name, cpu.instruction_count, elapsed)
+
+
+def bench_branch(budget=300000):
+    """轮询 8255 端口位的紧凑循环：目标在装载时解析为整数 IP，执行时不查符号表"""
+    print("== 条件转移轮询循环 ==")
+    program = ["MOV CX 0", "poll:", "IN AL 0x61", "TEST AX 1", "JNZ ready", "LOOP poll", "ready:", "HLT"]
+    for name, options in (("字符串解释", {'predecode': False}), ("预译码 IR", {'compile_blocks': False}),
+                          ("基本块", {})):
+        cpu = CPU(None, program, headless=True, **options)
+        start = time.perf_counter()
+        cpu.run_cpu(max_instructions=budget)
+        elapsed = time.perf_counter() - start
+        _report(name, cpu.instruction_count, elapsed)
+
+
+def bench_alu(budget=300000):
+    """惰性标志：纯算术循环 vs 每条运算后都用 PUSHF 读取标志（强制求值）"""
+    print("== 惰性标志 ==")
+    body = ["ADD AX BX", "SUB CX AX", "ADC DX 7", "SBB BX 3", "XOR SI AX", "SHL DI 1"]
+    programs = (("标志不被读取", ["loop:"] + body + ["JMP loop"]),
+                ("每条运算后 PUSHF", ["loop:"] + [line for op in body for line in (op, "PUSHF", "POP BP")] +
+                 ["JMP loop"]))
+    for name, program in programs:
+        cpu = CPU(None, program, headless=True, compile_blocks=False)
+        start = time.perf_counter()
+        cpu.run_cpu(max_instructions=budget)
+        elapsed = time.perf_counter() - start
+        operations = cpu.instruction_count * len(body) // (len(program) - 1)  # 只计算术 / 逻辑运算
+        print(f"{name:<20} {operations:>10} 次运算  {elapsed:8.3f} s  {operations / elapsed:12.0f} 次/秒")
+
+
+def bench_string(count=60000, budget=200000):
+    """串操作：REP 前缀的整段切片执行 vs 逐条 MOVSB / STOSB / CMPSB 循环（按字节/秒计）"""
+    print("== REP 串操作 ==")
+    setup = ["MOV AX 4096", "MOV DS AX", "MOV AX 8192", "MOV ES AX", "MOV SI 0", "MOV DI 0"]
+    for operation in ("MOVSB", "STOSB", "CMPSB"):
+        prefix = "REPE" if operation == "CMPSB" else "REP"
+        cpu = CPU(None, setup + [f"MOV CX {count}", f"{prefix} {operation}", "HLT"], headless=True)
+        start = time.perf_counter()
+        cpu.run_cpu()
+        elapsed = time.perf_counter() - start
+        bulk = count / elapsed
+        cpu = CPU(None, setup + ["loop:", operation, "JMP loop"], headless=True)
+        start = time.perf_counter()
+        cpu.run_cpu(max_instructions=budget)
+        elapsed = time.perf_counter() - start
+        single = cpu.instruction_count / 2 / elapsed
+        print(f"{prefix + ' ' + operation:<12} 整段: {bulk:14.0f} 字节/秒   逐条: {single:12.0f} 字节/秒   "
+              f"加速比: {bulk / single:.0f}x")
+
+
+# 与 bench_branch 相同的轮询循环，手工汇编成 .COM 机器码：
+# MOV CX,0 / poll: IN AL,61H / TEST AX,1 / JNZ ready / LOOP poll / ready: HLT
+POLL_COM = bytes.fromhex("B90000" "E461" "A90100" "7502" "E2F7" "F4")
+
+
+def bench_machine(budget=300000, decodes=20000):
+    """机器码路径：按物理地址缓存的译码结果 vs 每次重新从预取队列取字节译码"""
+    print("== 8086 机器码 ==")
+    cpu = CPU(None, [], headless=True)
+    machine = cpu.load_com(POLL_COM)
+    start = time.perf_counter()
+    cpu.run_cpu(max_instructions=budget)
+    elapsed = time.perf_counter() - start
+    _report("译码缓存", cpu.instruction_count, elapsed)
+    print(f"译码 {machine.decoded} 次  命中率 {1 - machine.decoded / cpu.instruction_count:.4%}  "
+          f"预取 {cpu.biu.prefetch.fetches} 次")
+    base = machine.registers[CS] << 4
+    addresses = [base + offset for offset in (0x103, 0x105, 0x108, 0x10A)]
+    start = time.perf_counter()
+    for index in range(decodes):
+        machine.decode(addresses[index & 3])
+    elapsed = time.perf_counter() - start
+    print(f"单纯译码: {decodes / elapsed:12.0f} 条/秒")
+
+
+def bench_startup(lines=20000, rounds=5):
+    """装载开销：每次扫描 + 译码源代码 vs 映射磁盘缓存里的目标文件（只剩绑定操作数）"""
+    print("== 装载：源代码 vs 目标文件缓存 ==")
+    program = [".DATA", "DW total 0", ".CODE"]
+    for i in range(lines // 4):
+        program += [f"step{i}:", f"MOV AX {i}", f"ADD BX AX", f"CMP BX {i * 3}"]
+    program.append("HLT")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "startup.asm")
+        with open(path, "w", encoding="utf-8") as source:
+            source.write("\n".join(program))
+        start = time.perf_counter()
+        load_source(path)  # 第一次：汇编并写入缓存
+        assemble_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(rounds):
+            CPU(None, list(program), headless=True).load_program()
+        source_elapsed = (time.perf_counter() - start) / rounds
+        start = time.perf_counter()
+        for _ in range(rounds):
+            cpu = CPU(None, [], headless=True)
+            cpu.load_object(load_source(path)[0])
+            cpu.load_program()
+        cached_elapsed = (time.perf_counter() - start) / rounds
+        size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(directory, CACHE_DIRECTORY)))
+    print(f"{len(program)} 行  首次汇编 + 写缓存: {assemble_elapsed * 1000:8.1f} ms   目标文件 {size / 1024:.0f} KB")
+    print(f"源代码装载: {source_elapsed * 1000:8.1f} ms   目标文件装载: {cached_elapsed * 1000:8.1f} ms   "
+          f"加速比: {source_elapsed / cached_elapsed:.2f}x")
+
+
+def bench_fusion(repeat=200, ticks=50):
+    """窥孔融合：控制脚本里成串的 TICK_TIMER 和端口写，逐条执行 vs 超级指令"""
+    print("== 窥孔融合 ==")
+    body = (["TICK_TIMER 1"] * ticks + ["VOICE 09"] + ["TICK_TIMER 1"] * ticks + ["VOICE 10",
+            "WRITE_CTRL 0x80", "WRITE_PORT A 0x0F", "WRITE_PORT B 0x55", "WRITE_PORT C 0x3C", "READ_PORT A"])
+    program = ["CONFIG_TIMER 1 2 40", "START_TIMER 1"] + body * repeat + ["HLT"]
+    for fuse in (False, True):
+        start = time.perf_counter()
+        CPU(None, list(program), headless=True, fuse=fuse).load_program()
+        load_elapsed = time.perf_counter() - start
+        cpu = CPU(None, list(program), headless=True, fuse=fuse)
+        start = time.perf_counter()
+        cpu.run_cpu()
+        elapsed = time.perf_counter() - start - load_elapsed  # 只计执行，装载（含融合）单独列出
+        _report("超级指令" if fuse else "逐条执行", cpu.instruction_count + cpu.eu.fused_instructions, elapsed)
+        print(f"{'':<24} 装载 {load_elapsed * 1000:8.1f} ms")
+        if fuse:
+            print(f"{cpu.fusion}   实际分派 {cpu.instruction_count} 条")
+    result = prove_equivalence(program)
+    print(f"与不融合的运行逐事件核对: {'一致' if result.equivalent else result.difference}")
+
+
+def bench_dashboard(devices=10000, frames=30):
+    """Canvas 面板：所有设备每帧都随机翻转时，一帧的更新 + 重画耗时"""
+    print("== Canvas 设备面板 ==")
+    try:
+        import tkinter as tk
+    except ImportError:
+        print("未安装 tkinter，跳过")
+        return
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:  # 没有图形环境
+        print(f"无法创建 Tk 窗口（{error}），跳过")
+        return
+    import random
+    from Dashboard import Dashboard
+    from DisplayQueue import DisplayQueue
+    canvas = tk.Canvas(root, width=1200, height=800)
+    canvas.pack()
+    names = [f"{kind}{number}" for number in range(devices // 2) for kind in ("LED", "Fan")]
+    dashboard = Dashboard(canvas, names, 1200, 800)
+    updates = DisplayQueue()
+    rng = random.Random(0)
+    elapsed = 0.0
+    for _ in range(frames):
+        for name in names:
+            updates.publish(name, rng.randrange(2))
+        start = time.perf_counter()
+        dashboard.update(updates.drain())
+        root.update_idletasks()
+        elapsed += time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(frames):
+        dashboard.page(1)
+        root.update_idletasks()
+    page_elapsed = time.perf_counter() - start
+    root.destroy()
+    print(f"{devices} 个设备  图形项 {len(dashboard.slots) * 2}  每帧 {elapsed / frames * 1000:6.2f} ms   "
+          f"翻页 {page_elapsed / frames * 1000:6.2f} ms")
+
+
+def bench_registry(devices=100000, rooms=50):
+    """设备表：10 万个设备上的 STATUS / SWITCH 批量指令"""
+    print("== 设备表批量查询 ==")
+    cpu = CPU(None, [], headless=True)
+    registry = cpu.board.peripheral.devices
+    start = time.perf_counter()
+    for number in range(devices):
+        registry.add(f"{'Fan' if number % 3 == 0 else 'LED'}{100 + number}", room=f"room{number % rooms}",
+                     group=f"floor{number % 4}")
+    print(f"登记 {len(registry)} 个设备: {(time.perf_counter() - start) * 1000:8.1f} ms")
+    eu = cpu.eu
+    for line in ("SWITCH ON ALL", "STATUS ALL", "STATUS Fan", "SWITCH OFF Fan ROOM=room7", "STATUS Fan ROOM=room7",
+                 "SWITCH OFF GROUP=floor2", "STATUS LED GROUP=floor2"):
+        handler, args = eu.bind(decode(line, eu.symbols))
+        start = time.perf_counter()
+        handler(*args)
+        elapsed = time.perf_counter() - start
+        print(f"{line:<28} {elapsed * 1000:8.2f} ms   {cpu.board.peripheral.display}")
+
+
+def _memory_cost(memory):
+    """Memory 实际占用的字节数：写过的页（匿名 mmap 只为它们分配物理内存）加页表"""
+    return sum(memory.dirty) * PAGE_SIZE + sys.getsizeof(memory.dirty) + sys.getsizeof(memory.code)
+
+
+def bench_memory():
+    """每个实例的内存占用：1 MB 的 Python 整数列表 vs mmap 地址空间
+
+    匿名 mmap 只有写过的页才分配物理内存，Memory 的占用按写过的页数加页表（dirty / code）计算，
+    不受进程里其它测试分配、释放内存的影响。
+    """
+    list_bytes = sys.getsizeof([0] * Memory().size)
+    memory = Memory()
+    memory.write_word(0x400, 0x1234)  # 典型程序只会触及少数页
+    pages = sum(memory.dirty) * PAGE_SIZE
+    bookkeeping = _memory_cost(memory) - pages
+    print("== 内存占用 ==")
+    print(f"1 MB 整数列表: {list_bytes / 1024:10.0f} KB/实例   Memory: {(pages + bookkeeping) / 1024:10.1f} KB/实例"
+          f"（写过的页 {pages / 1024:.0f} KB + 页表 {bookkeeping / 1024:.1f} KB）")
+
+
+def bench_homes(counts=(1, 10, 100, 500)):
+    """同一进程内托管 N 个互相独立的家庭（各自的 CPU、内存和主板）时的扩展性
+
+    每个家庭的内存占用单独再跑一遍测量：tracemalloc 统计 Python 对象（IR、主板、寄存器等），
+    加上 Memory 写过的页和页表，不受进程里其它测试分配、释放内存的影响。
+    """
+    print("== 多家庭扩展性 ==")
+    for homes in counts:
+        start = time.perf_counter()
+        cpus = [CPU(None, HOME_PROGRAM, headless=True) for _ in range(homes)]
+        build_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        for cpu in cpus:
+            cpu.run()
+        run_elapsed = time.perf_counter() - start
+        count = sum(cpu.instruction_count for cpu in cpus)
+        isolated = all(cpu.board.peripheral.devices.state("Fan1") == 1 and
+                       cpu.board.timer.counters[1]["counter_register"] == 18 for cpu in cpus)
+        del cpus
+        gc.collect()
+        tracemalloc.start()
+        cpus = [CPU(None, HOME_PROGRAM, headless=True) for _ in range(homes)]
+        for cpu in cpus:
+            cpu.run()
+        objects = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        per_home = (objects + sum(_memory_cost(cpu.biu.memory) for cpu in cpus)) / homes
+        del cpus
+        gc.collect()
+        print(f"{homes:>5} 个家庭  创建 {build_elapsed / homes * 1e3:7.3f} ms/个  "
+              f"{count / run_elapsed:12.0f} 条/秒  {per_home / 1024:8.1f} KB/个  状态独立: {isolated}")
+
+
+def bench_fleet(programs=2000, chunksize=50):
+    """进程池批量运行：1..N 个工作进程的吞吐量扩展性"""
+    from Fleet import scaling, print_scaling
+    print("== 进程池批量运行 ==")
+    print_scaling(scaling([HOME_PROGRAM] * programs, chunksize=chunksize))
+
+
+def bench_lockstep(homes=10000, scalar_homes=200):
+    """同一程序、不同语音输入的 N 个家庭：逐个标量运行 vs numpy 锁步"""
+    try:
+        import numpy as np
+        from Lockstep import Lockstep, verify
+    except ImportError:
+        print("== numpy 锁步仿真 ==\n未安装 numpy，跳过")
+        return
+    rng = np.random.default_rng(0)
+    inputs = {"AX": rng.integers(0, 14, homes), "BX": rng.integers(0, 14, homes)}
+
+    start = time.perf_counter()
+    count = 0
+    for home in range(scalar_homes):
+        cpu = CPU(None, LOCKSTEP_PROGRAM, headless=True)
+        cpu.eu.registers["AX"] = int(inputs["AX"][home])
+        cpu.eu.registers["BX"] = int(inputs["BX"][home])
+        cpu.run()
+        count += cpu.instruction_count
+    scalar_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lockstep = Lockstep(LOCKSTEP_PROGRAM, homes)
+    for name, values in inputs.items():
+        lockstep.set_register(name, values)
+    lockstep.run()
+    lockstep_elapsed = time.perf_counter() - start
+
+    print("== numpy 锁步仿真 ==")
+    _report(f"标量 EU x{scalar_homes}", count, scalar_elapsed)
+    _report(f"锁步 x{homes}", lockstep.instruction_count, lockstep_elapsed)
+    speedup = (lockstep.instruction_count / lockstep_elapsed) / (count / scalar_elapsed)
+    mismatched = verify(LOCKSTEP_PROGRAM, homes, inputs, sample=range(0, homes, homes // 50))
+    print(f"聚合加速比: {speedup:.0f}x   抽样逐位核对: {'一致' if not mismatched else mismatched}")
+
+
+if __name__ == "__main__":
+    trace.set_level(OFF)
+    bench_predecode()
+    bench_headless()
+    bench_trace()
+    bench_blocks()
+    bench_snapshot()
+    bench_timer()
+    bench_day()
+    bench_interrupts()
+    bench_pic()
+    bench_8255()
+    bench_io()
+    bench_alu()
+    bench_branch()
+    bench_string()
+    bench_machine()
+    bench_startup()
+    bench_fusion()
+    bench_dashboard()
+    bench_registry()
+    bench_memory()
+    bench_homes()
+    bench_lockstep()
+    bench_fleet()
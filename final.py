@@ -1,20 +1,37 @@
+import argparse
+import sys
 import threading
-import time
-
-from Peripheral import Peripheral
-from PTimer8253 import Timer8253
-from Parallel8255 import Parallel8255
-import tkinter as tk
-from tkinter import ttk
-
-peripheral = Peripheral()
-timer = Timer8253()
-parallel8255 = Parallel8255()
+from collections import namedtuple
+
+from BlockCompiler import BlockCache
+from Board import Board
+from Clock import Clock
+from Trace import trace, EVENTS, INSTRUCTIONS, LEVEL_NAMES, JsonlSink
+from Dashboard import Dashboard
+from DisplayQueue import DisplayQueue, FRAME_RATE
+from Decoder import OperandSpec, decode, parse_io, JCC_CONDITIONS, LOOP_OPS, REP_PREFIXES, STRING_OPS, SWITCH_STATES
+from Assembler import load_source
+from Loader import SymbolTable, scan_symbols, load_com, COM_SEGMENT, DATA_ORIGIN
+from Machine8086 import Machine, PrefetchQueue, InvalidOpcode
+from Peephole import Fuser
+from Scheduler import INTERRUPT_CYCLES, element_cycles, instruction_cycles, touches_timer
+from Memory import Memory, linear_address, ADDRESS_MASK
+from Registers import (RegisterFile, Flags, CONDITIONS, REGISTER_INDEX, AX, CX, DX, SI, DI, IP, CS, DS, ES, SS,
+                       CF_MASK, TF_MASK, IF_MASK, OF_MASK, DF_MASK,
+                       LAZY_ADD, LAZY_SUB, LAZY_INC, LAZY_DEC, LAZY_LOGIC, LAZY_SHL, LAZY_SHR, LAZY_SAR, LAZY_MUL)
+
+try:
+    import tkinter as tk
+    from tkinter import ttk
+except ImportError:  # 没有图形环境（如构建服务器）时只能以 headless 模式运行
+    tk = ttk = None
 
 class BIU:
     def __init__(self, memory, instructions):
         self.memory = memory
         self.instructions = instructions  # 将指令列表传递给BIU
+        self.program = None  # 预译码后的指令队列，由 CPU 在装载时填充
+        self.prefetch = PrefetchQueue(memory)  # 执行机器码时使用的 6 字节预取队列
 
     def fetch_instruction(self, ip):
         # 确保 IP 寄存器的值在有效范围内
@@ -24,34 +41,102 @@ class BIU:
             return 'HLT'  # 如果 IP 超出范围，返回 HLT 指令以停止执行
 
 
+EUSnapshot = namedtuple('EUSnapshot', ['registers', 'flags', 'call_stack', 'procedures',
+                                       'data_segment', 'labels', 'current_segment'])
+CPUSnapshot = namedtuple('CPUSnapshot', ['eu', 'memory', 'board'])
+
+
+class Operand:
+    """预解析的操作数访问器，get/set 为装载时绑定好的闭包，spec 供块编译器使用"""
+    __slots__ = ('get', 'set', 'spec')
+
+    def __init__(self, spec, get, set=None):
+        self.spec = spec
+        self.get = get
+        self.set = set
+
+
 class EU:
-    def __init__(self):
-        self.registers = {
-            'AX': 0, 'BX': 0, 'CX': 0, 'DX': 0,
-            'SP': 0, 'BP': 0, 'SI': 0, 'DI': 0,
-            'IP': 0, 'CS': 0, 'DS': 0, 'ES': 0, 'SS': 0
-        }
-        self.status_flags = {'CF': 0, 'PF': 0, 'ZF': 0, 'SF': 0, 'OF': 0, 'DF': 0, 'IF': 0}
+    VOICE_MAP = {
+        "01": {"device": "LED1", "state": 1},
+        "02": {"device": "LED1", "state": 0},
+        "03": {"device": "LED2", "state": 1},
+        "04": {"device": "LED2", "state": 0},
+        "05": {"device": "Fan1", "state": 1},
+        "06": {"device": "Fan1", "state": 0},
+        "07": {"device": "Fan2", "state": 1},
+        "08": {"device": "Fan2", "state": 0},
+        "09": {"device": "LED3", "state": 1},
+        "10": {"device": "LED3", "state": 0},
+        "11": {"device": "Fan3", "state": 1},
+        "12": {"device": "Fan3", "state": 0},
+    }
+    PORT_ADDRESS = {"A": (0, 0), "B": (0, 1), "C": (1, 0)}  # 端口 -> 地址线 A1, A0
+    PORT_REGISTER = {port: a1 * 2 + a0 for port, (a1, a0) in PORT_ADDRESS.items()}  # 端口 -> 8255 寄存器地址
+    CONTROL_REGISTER = 3  # A1A0 = 11 选中 8255 控制寄存器
+    TIMER_THRESHOLDS = (2, 3, 5)  # TICK_TIMER 读到这些计数值时驱动 LED3 / Fan3（见 _timer_effects）
+    SEGMENT_MESSAGES = {'CODE': "切换到代码段", 'DATA': "切换到数据段", 'STACK': "切换到堆栈段"}
+    DATA_KIND_NAMES = {'DB': "字节", 'DW': "字", 'DD': "双字"}
+
+    # 预译码操作码 -> 处理方法
+    DISPATCH = {
+        'NOP': '_op_nop', 'SEGMENT': '_op_segment', 'DEFINE': '_op_define',
+        'PROC': '_op_proc', 'ENDP': '_op_endp', 'LABEL': '_op_label',
+        'VOICE': '_op_voice', 'VOICE_REG': '_op_voice_reg', 'STATUS': '_op_status', 'SWITCH': '_op_switch',
+        'CONFIG_TIMER': '_op_config_timer', 'START_TIMER': '_op_start_timer',
+        'STOP_TIMER': '_op_stop_timer', 'TICK_TIMER': '_op_tick_timer',
+        'WRITE_CTRL': '_op_write_ctrl', 'WRITE_PORT': '_op_write_port', 'READ_PORT': '_op_read_port',
+        'HLT': '_op_hlt', 'MOV': '_op_mov', 'ADD': '_op_add', 'SUB': '_op_sub',
+        'MUL': '_op_mul', 'DIV': '_op_div', 'AND': '_op_and', 'OR': '_op_or',
+        'XOR': '_op_xor', 'NOT': '_op_not', 'PUSH': '_op_push', 'POP': '_op_pop',
+        'ADC': '_op_adc', 'SBB': '_op_sbb', 'NEG': '_op_neg', 'PUSHF': '_op_pushf', 'POPF': '_op_popf',
+        'SHL': '_op_shl', 'SAL': '_op_shl', 'SHR': '_op_shr', 'SAR': '_op_sar',
+        'ROL': '_op_rol', 'ROR': '_op_ror', 'RCL': '_op_rcl', 'RCR': '_op_rcr',
+        'JMP': '_op_jmp', 'CALL': '_op_call', 'RET': '_op_ret',
+        'CMP': '_op_cmp', 'TEST': '_op_test', 'INC': '_op_inc', 'DEC': '_op_dec', 'JCC': '_op_jcc',
+        'LOOP': '_op_loop', 'LOOPE': '_op_loope', 'LOOPNE': '_op_loopne', 'JCXZ': '_op_jcxz',
+        'MOVSB': 'movsb', 'MOVSW': 'movsw', 'CMPSB': 'cmpsb', 'CMPSW': 'cmpsw',
+        'SCASB': 'scasb', 'SCASW': 'scasw', 'STOSB': 'stosb', 'STOSW': 'stosw',
+        'LODSB': 'lodsb', 'LODSW': 'lodsw', 'REP': '_op_rep',
+        'STC': 'stc', 'CLC': 'clc', 'STI': 'sti', 'CLI': 'cli',
+        'INT': '_op_int', 'IRET': '_op_iret', 'EOI': '_op_eoi',
+        'IN': '_op_in', 'OUT': '_op_out', 'IN_DX': '_op_in_dx', 'OUT_DX': '_op_out_dx',
+    }
+    SHIFTS = ('SHL', 'SAL', 'SHR', 'SAR', 'ROL', 'ROR', 'RCL', 'RCR')  # 第二个操作数为移位次数
+    VECTOR_SIZE = 4  # 中断向量表位于 0:0 ~ 0:3FFH（数据段初值装在它之后），每项为处理程序的偏移（IP）和段（CS）两个字
+
+    def __init__(self, board=None):
+        self.registers = RegisterFile()  # 16 位寄存器组，按名称或下标访问
+        self.status_flags = Flags()  # 打包的 16 位 FLAGS 字
         self.call_stack = []
         self.memory = None
-        self.procedures = {}  # 存储过程定义的入口点
-        self.data_segment = {}  # 存储数据定义
-        self.labels = {}  # 存储标签位置
+        self.symbols = SymbolTable()  # 装载阶段建立的符号表
+        self.object_program = self.object_bound = self.object_ir = None  # 延迟绑定的目标文件（见 link_object）
+        self.procedures = self.symbols.procedures  # 存储过程定义的入口点
+        self.data_segment = self.symbols.data  # 存储数据定义
+        self.labels = self.symbols.labels  # 存储标签位置
         self.current_segment = 'CODE'  # 初始设置为代码段
         self.comments = []  # 用于存储解析过程中遇到的注释
-        self.timer = timer
-        self.parallel_interface = parallel8255
+        self.board = board if board is not None else Board()  # 本机独占的外设芯片
+        self.peripheral = self.board.peripheral
+        self.timer = self.board.timer
+        self.parallel_interface = self.board.parallel
+        self.pic = self.board.pic
+        self.io = self.board.io
+        self.rep_budget = None  # REP 串操作一次最多执行的元素数，None 表示不限
+        self.string_elements = 0  # 上一条 REP 串操作实际执行的元素数（虚拟时钟据此计算周期）
+        self.fused_instructions = 0  # 超级指令替原来的指令多执行的条数（见 Peephole）
+        self.budget = sys.maxsize  # 下一条超级指令最多可以执行的指令条数，有指令预算时由运行循环设置
         self.gui = None
+        self.trace = trace
 
     def set_gui(self, gui):
         self.gui = gui
 
     def control_device(self, device, state):
-        # 当需要控制设备时将调用
+        # 当需要控制设备时将调用；headless 模式下没有 GUI，直接忽略
         if self.gui:
             self.gui.control_device(device, state)
-        else:
-            raise ValueError("GUI is not set")
 
 
     def set_memory(self, memory):
@@ -64,53 +149,148 @@ class EU:
     def print_flags(self):
         print(f"标志寄存器状态: {self.status_flags}")
 
-    def alu(self, opcode, a, b=0, cf=0):
-        res = 0
-        if opcode == 'ADD':
-            res = (a + b + cf) & 0xFFFF
-            self.status_flags['OF'] = 1 if ((a > 0 > res and b > 0) or (a < 0 < res and b < 0)) else 0
-        elif opcode == 'SUB':
+    def trace_state(self):
+        """把当前标志和寄存器状态记录为一条逐指令跟踪记录"""
+        flags = self.status_flags.as_dict()
+        registers = self.registers.as_dict()
+        self.trace.emit(INSTRUCTIONS, 'EU',
+                        f"标志寄存器状态: {flags}\n寄存器状态: {registers}\n--------------------",
+                        {'ip': registers['IP'], 'flags': flags, 'registers': registers})
+
+    def alu(self, opcode, a, b=0, cf=0, size=2):
+        """执行一次运算，返回截断到 size 字节的结果
+
+        状态标志不在这里计算：只把运算类别、操作数和未截断的结果记入 status_flags.lazy，
+        等到条件转移、PUSHF、跟踪等真正读取时再求值（见 Registers.Flags）。
+        ADC / SBB 忽略 cf 参数，从 CF 取进位输入。
+        """
+        flags = self.status_flags
+        sign = 0x80 if size == 1 else 0x8000
+        mask = (sign << 1) - 1
+        a &= mask
+        b &= mask
+        if opcode == 'ADD' or opcode == 'ADC':
+            if opcode == 'ADC':
+                cf = flags.carry()
+            res = a + b + cf
+            flags.lazy = (LAZY_ADD, a, b, res, sign)
+        elif opcode == 'SUB' or opcode == 'SBB' or opcode == 'CMP':
+            if opcode == 'SBB':
+                cf = flags.carry()
             res = a - b - cf
-            if res < 0:
-                self.status_flags['CF'] = 1
-                res += 0x10000
-            self.status_flags['OF'] = 1 if ((a < 0 < b and res > 0) or (a > 0 > b and res < 0)) else 0
+            flags.lazy = (LAZY_SUB, a, b, res, sign)
+        elif opcode == 'NEG':
+            res = -a
+            flags.lazy = (LAZY_SUB, 0, a, res, sign)
+        elif opcode == 'INC' or opcode == 'DEC':
+            # INC / DEC 不影响 CF：先把当前 CF 落到 word 里，求值时原样保留
+            flags.word = (flags.word & ~CF_MASK) | flags.carry()
+            if opcode == 'INC':
+                res = a + 1
+                flags.lazy = (LAZY_INC, a, 1, res, sign)
+            else:
+                res = a - 1
+                flags.lazy = (LAZY_DEC, a, 1, res, sign)
+        elif opcode in ('AND', 'OR', 'XOR', 'TEST'):
+            res = a & b if opcode == 'AND' or opcode == 'TEST' else a | b if opcode == 'OR' else a ^ b
+            flags.lazy = (LAZY_LOGIC, 0, 0, res, sign)
+        elif opcode == 'NOT':
+            res = ~a  # NOT 不影响标志
         elif opcode == 'MUL':
-            res = (a * b) & 0xFFFF
+            res = a * b
+            flags.lazy = (LAZY_MUL, a, b, res, sign)
         elif opcode == 'DIV':
             res = a // b if b != 0 else 0
-        elif opcode in ['AND', 'OR', 'XOR', 'NOT']:
-            if opcode == 'AND':
-                res = a & b
-            elif opcode == 'OR':
-                res = a | b
-            elif opcode == 'XOR':
-                res = a ^ b
-            elif opcode == 'NOT':
-                res = ~a & 0xFFFF
-
-        # Update flags
-        self.status_flags['ZF'] = 1 if res == 0 else 0
-        self.status_flags['SF'] = 1 if res & 0x8000 else 0
+            flags.lazy = (LAZY_LOGIC, 0, 0, res, sign)
+        elif opcode in self.SHIFTS:
+            res = self._shift(opcode, a, b & 0xFF, sign)
+        else:
+            raise ValueError(f"未知的运算: {opcode}")
+        return res & mask
+
+    def _shift(self, opcode, a, count, sign):
+        """移位 / 循环移位，count 为 0 时结果和标志都不变"""
+        if not count:
+            return a
+        flags = self.status_flags
+        if opcode == 'SHL' or opcode == 'SAL':
+            res = a << count
+            flags.lazy = (LAZY_SHL, a, count, res, sign)
+            return res
+        if opcode == 'SHR':
+            res = a >> count
+            flags.lazy = (LAZY_SHR, a, count, res, sign)
+            return res
+        if opcode == 'SAR':
+            signed = a - (sign << 1) if a & sign else a
+            res = signed >> count
+            flags.lazy = (LAZY_SAR, signed, count, res, sign)
+            return res
+        # 循环移位只改变 CF 和 OF，其余状态标志保持原值，所以直接求值（这类指令很少出现在热循环里）
+        bits = sign.bit_length()
+        mask = (sign << 1) - 1
+        word = flags.value & ~(CF_MASK | OF_MASK)
+        if opcode == 'ROL' or opcode == 'ROR':
+            shift = count % bits
+            if opcode == 'ROL':
+                res = ((a << shift) | (a >> (bits - shift))) & mask
+                carry = res & 1
+                overflow = bool(res & sign) != bool(carry)
+            else:
+                res = ((a >> shift) | (a << (bits - shift))) & mask
+                carry = res & sign
+                overflow = bool(res & sign) != bool(res & (sign >> 1))
+        else:  # RCL / RCR：CF 作为第 bits 位一起循环
+            shift = count % (bits + 1)
+            wide = (flags.carry() << bits) | a
+            wide_mask = (mask << 1) | 1
+            if opcode == 'RCL':
+                wide = ((wide << shift) | (wide >> (bits + 1 - shift))) & wide_mask
+            else:
+                wide = ((wide >> shift) | (wide << (bits + 1 - shift))) & wide_mask
+            res = wide & mask
+            carry = wide >> bits
+            if opcode == 'RCL':
+                overflow = bool(res & sign) != bool(carry)
+            else:
+                overflow = bool(res & sign) != bool(res & (sign >> 1))
+        if carry:
+            word |= CF_MASK
+        if overflow:
+            word |= OF_MASK
+        flags.word = word
         return res
 
+    def load_symbols(self, symbols, data):
+        """从目标文件装入符号表，并把数据段初值整块写入 DS 段（代替 parse_data_segment）"""
+        self.symbols.restore(symbols.snapshot())
+        if self.memory is not None and data:
+            self.memory.write_block(linear_address(self.registers.values[DS], DATA_ORIGIN), data)
+
     def parse_data_segment(self, instructions):
-        data_start = False
-        for instruction in instructions:
-            instruction = instruction.strip()
-            if instruction.startswith(".DATA"):
-                data_start = True
-                continue
-            if instruction.startswith(".CODE") or instruction.startswith(".STACK"):
-                data_start = False
-                continue
-            if data_start:
-                parts = instruction.split()
-                opcode = parts[0]
-                if opcode in ["DB", "DW", "DD"]:
-                    label = parts[1].rstrip(":")
-                    value = int(parts[2], 0)
-                    self.data_segment[label] = value
+        """装载阶段第一遍：建立标签、过程和数据的符号表，并把数据初值写入 DS 段"""
+        self.symbols.clear()
+        scan_symbols(instructions, self.symbols)
+        if self.memory is not None:
+            for label, (offset, size) in self.symbols.data_layout.items():
+                value = self.symbols.data[label]
+                for i in range(size):  # 小端序逐字节写入
+                    self.write_byte(offset + i, value >> (8 * i))
+
+    @staticmethod
+    def segment_for(*base_registers):
+        """以 BP 为基址的寻址默认使用 SS 段，其余使用 DS 段"""
+        return SS if 'BP' in base_registers else DS
+
+    def read_memory(self, offset, segment=DS):
+        """按字读取 段:偏移 处的内存"""
+        return self.memory.read_word(linear_address(self.registers.values[segment], offset))
+
+    def write_memory(self, offset, value, segment=DS):
+        self.memory.write_word(linear_address(self.registers.values[segment], offset), value)
+
+    def write_byte(self, offset, value, segment=DS):
+        self.memory.write_byte(linear_address(self.registers.values[segment], offset), value)
 
     def get_value(self, operand):
         # 立即数寻址
@@ -124,16 +304,18 @@ class EU:
         # 标签寻址
         if operand in self.data_segment:
             return self.data_segment[operand]  # 从数据段获取标签对应的值
+        if operand in self.labels:
+            return self.labels[operand]  # 代码标签 -> 指令位置（跳转目标）
+        if operand in self.procedures:
+            return self.procedures[operand]  # 过程名 -> 过程入口
 
-        # 直接寻址（[address]）
+        # 直接寻址（[address]），按字访问 DS 段
         if operand.startswith('[') and operand.endswith(']'):
             operand = operand[1:-1]  # 去除括号
             if operand.isdigit():
-                addr = int(operand)
-                return self.memory[addr]
+                return self.read_memory(int(operand))
             else:
-                addr = self.registers[operand]
-                return self.memory[addr]
+                return self.read_memory(self.registers[operand], self.segment_for(operand))
 
         raise ValueError(f"无法解析操作数: {operand}")
 
@@ -146,26 +328,31 @@ class EU:
             operand = operand[1:-1]  # 去除括号
             # 检查是否为纯数字地址
             if operand.isdigit():
-                addr = int(operand)
-                self.memory[addr] = value
+                self.write_memory(int(operand), value)
             else:
                 # 处理寄存器间接寻址
-                addr = self.registers[operand]
-                self.memory[addr] = value
+                self.write_memory(self.registers[operand], value, self.segment_for(operand))
         # 基址加变址寻址
         elif '+' in operand:
             base, index = operand[1:-1].split('+')
-            addr = self.registers[base] + self.registers[index]
-            self.memory[addr] = value
+            offset = self.registers[base] + self.registers[index]
+            self.write_memory(offset, value, self.segment_for(base, index))
         # 相对寻址
         elif operand.startswith('[') and operand[1:3] == 'IP':
             offset = int(operand[4:-1])
-            addr = self.registers['IP'] + offset
-            self.memory[addr] = value
+            self.write_memory(self.registers['IP'] + offset, value, CS)
         else:
             raise ValueError(f"无效的操作数: {operand}")
 
     def execute_instruction(self, instruction):
+        """字符串解释路径：每次执行都重新解析源代码"""
+        if not self._execute_text(instruction):
+            return False
+        if self.trace.level >= INSTRUCTIONS:
+            self.trace_state()
+        return True
+
+    def _execute_text(self, instruction):
         instruction = instruction.split(";")[0].strip()  # 移除注释
         parts = instruction.split()
 
@@ -176,152 +363,68 @@ class EU:
 
         # 段定义伪指令
         if opcode == ".CODE":
-            print("切换到代码段")
-            self.current_segment = 'CODE'
+            self._op_segment('CODE')
         elif opcode == ".DATA":
-            print("切换到数据段")
-            self.current_segment = 'DATA'
+            self._op_segment('DATA')
         elif opcode == ".STACK":
-            print("切换到堆栈段")
-            self.current_segment = 'STACK'
-
-        # 数据定义伪指令
-        elif opcode == "DB":  # 定义字节数据
-            label = parts[1].rstrip(':')
-            value = int(parts[2], 0)
-            self.data_segment[label] = value
-            print(f"定义字节数据: {label} = {value}")
-        elif opcode == "DW":  # 定义字数据
-            label = parts[1].rstrip(':')
-            value = int(parts[2], 0)
-            self.data_segment[label] = value
-            print(f"定义字数据: {label} = {value}")
-        elif opcode == "DD":  # 定义双字数据
-            label = parts[1].rstrip(':')
-            value = int(parts[2], 0)
-            self.data_segment[label] = value
-            print(f"定义双字数据: {label} = {value}")
+            self._op_segment('STACK')
+
+        # 数据定义伪指令（字节 / 字 / 双字）
+        elif opcode in ("DB", "DW", "DD"):
+            self._op_define(opcode, parts[1].rstrip(':'), int(parts[2], 0))
 
         # 过程定义伪指令
         elif opcode == "PROC":  # 定义过程（函数）
-            label = parts[1]
-            self.procedures[label] = self.registers['IP']
-            print(f"过程 {label} 定义在位置 {self.registers['IP']}")
+            self._op_proc(parts[1])
         elif opcode == "ENDP":  # 结束过程
-            print("过程结束")
+            self._op_endp()
 
         # 标签处理
         elif ':' in opcode:  # 处理标签
-            label = opcode.rstrip(':')
-            self.labels[label] = self.registers['IP']
-            print(f"标签 {label} 定义在位置 {self.registers['IP']}")
+            self._op_label(opcode.rstrip(':'))
 
         if opcode == "VOICE":
-            voice_code = parts[1]
-            voice_map = {
-                "01": {"device": "LED1", "state": 1},
-                "02": {"device": "LED1", "state": 0},
-                "03": {"device": "LED2", "state": 1},
-                "04": {"device": "LED2", "state": 0},
-                "05": {"device": "Fan1", "state": 1},
-                "06": {"device": "Fan1", "state": 0},
-                "07": {"device": "Fan2", "state": 1},
-                "08": {"device": "Fan2", "state": 0},
-                "09": {"device": "LED3", "state": 1},
-                "10": {"device": "LED3", "state": 0},
-                "11": {"device": "Fan3", "state": 1},
-                "12": {"device": "Fan3", "state": 0},
-            }
-            if voice_code in voice_map:
-                action = voice_map[voice_code]
-                peripheral.control_device(action["device"], action["state"])
-                peripheral.update_display(f"{action['device']} {'ON' if action['state'] else 'OFF'}")
+            if parts[1] in self.registers:
+                self._op_voice(self.voice_code(self.registers[parts[1]]))
             else:
-                peripheral.update_display("Unknown Command")
-
+                self._op_voice(parts[1])
         elif opcode == "STATUS":
-            device = parts[1]
-            status = peripheral.query_status(device)
-            peripheral.update_display(status)
+            self._op_status(*parts[1:])
+        elif opcode == "SWITCH":
+            if parts[1] not in SWITCH_STATES:
+                raise ValueError("SWITCH 的第一个参数必须是 ON 或 OFF")
+            self._op_switch(SWITCH_STATES[parts[1]], *parts[2:])
 
         if opcode == "CONFIG_TIMER":
-            # 配置计数器：计数器编号、模式和初始值
-            counter_id = int(parts[1])  # 获取计数器编号（0, 1, 2）
-            mode = int(parts[2])  # 获取模式
-            initial_value = int(parts[3])  # 获取初始计数值
-            self.timer.write_control(counter_id, mode, initial_value)  # 使用8253的逻辑配置计数器
-
+            # 配置计数器：计数器编号（0, 1, 2）、模式和初始值
+            self._op_config_timer(int(parts[1]), int(parts[2]), int(parts[3]))
         elif opcode == "START_TIMER":
-            counter_id = int(parts[1])  # 获取计数器编号
-            self.timer.start(counter_id)  # 启动指定计数器
-
+            self._op_start_timer(int(parts[1]))
         elif opcode == "STOP_TIMER":
-            counter_id = int(parts[1])  # 获取计数器编号
-            self.timer.stop(counter_id)  # 停止指定计数器
-
+            self._op_stop_timer(int(parts[1]))
         elif opcode == "TICK_TIMER":
-            counter_id = int(parts[1])  # 获取计数器编号
-            self.timer.tick(counter_id)  # 模拟时钟周期
-            counter_value = self.timer.read_counter(counter_id)  # 读取当前计数值
-
-            # 根据计数器的值，执行外设控制逻辑
-            if counter_value == 3:
-                peripheral.control_device("LED3", 1)
-                print("Display: LED3 ON")
-                self.gui.control_device("LED3", 1)
-            elif counter_value == 5:
-                peripheral.control_device("Fan3", 1)
-                self.gui.control_device("FAN3", 1)
-                print("Display: Fan3 ON")
-            elif counter_value == 2:
-                print("Display: LED3 OFF")
-                self.gui.control_device("LED3", 0)
+            self._op_tick_timer(*(int(part) for part in parts[1:3]))
 
         if opcode == "WRITE_CTRL":
-            value = int(parts[1], 16)  # 将十六进制字符串转换为整数
-            self.parallel_interface.set_address(1, 1)  # 地址线选择控制寄存器
-            self.parallel_interface.set_control_lines(rd=True, wr=False, cs=False)  # 设置写操作
-            self.parallel_interface.write(value)  # 写入控制寄存器的值
-
+            self._op_write_ctrl(int(parts[1], 16))  # 将十六进制字符串转换为整数
         elif opcode == "WRITE_PORT":
             port = parts[1]
-            value = int(parts[2], 16)
-
-            if port == "A":
-                self.parallel_interface.set_address(0, 0)  # 地址线选择端口A
-            elif port == "B":
-                self.parallel_interface.set_address(0, 1)  # 地址线选择端口B
-            elif port == "C":
-                self.parallel_interface.set_address(1, 0)  # 地址线选择端口C
-            else:
+            if port not in self.PORT_ADDRESS:
                 raise ValueError("Invalid port specified")
-
-            self.parallel_interface.set_control_lines(rd=True, wr=False, cs=False)  # 设置写操作
-            self.parallel_interface.write(value)  # 写入端口值
-
+            self._op_write_port(port, int(parts[2], 16))
         elif opcode == "READ_PORT":
             # 从指定端口读取数据
             port = parts[1]
-
-            if port == "A":
-                self.parallel_interface.set_address(0, 0)  # 地址线选择端口A
-            elif port == "B":
-                self.parallel_interface.set_address(0, 1)  # 地址线选择端口B
-            elif port == "C":
-                self.parallel_interface.set_address(1, 0)  # 地址线选择端口C
-            else:
+            if port not in self.PORT_ADDRESS:
                 raise ValueError("Invalid port specified")
-
-            self.parallel_interface.set_control_lines(rd=False, wr=True, cs=False)  # 设置读操作
-            self.parallel_interface.read()  # 读取端口值
+            self._op_read_port(port)
 
         # 其他普通指令（如MOV、ADD等），这里省略常规指令的执行部分
         else:
             parts = instruction.split()
             opcode = parts[0]
             if opcode == "HLT":
-                print("停止执行")
-                return False
+                return self._op_hlt()
             elif opcode == "MOV":
                 dest, src = parts[1], parts[2]
                 self.write_value(dest, self.get_value(src))
@@ -341,10 +444,10 @@ class EU:
                 dest, src = parts[1], parts[2]
                 result = self.alu('DIV', self.get_value(dest), self.get_value(src))
                 self.write_value(dest, result)
-            elif opcode in ["AND", "OR", "XOR", "NOT"]:
+            elif opcode in ["AND", "OR", "XOR", "NOT", "NEG", "ADC", "SBB"] or opcode in self.SHIFTS:
                 dest = parts[1]
-                if opcode == "NOT":
-                    result = self.alu('NOT', self.get_value(dest))
+                if opcode in ("NOT", "NEG"):
+                    result = self.alu(opcode, self.get_value(dest))
                 else:
                     src = parts[2]
                     result = self.alu(opcode, self.get_value(dest), self.get_value(src))
@@ -352,11 +455,16 @@ class EU:
             elif opcode == "PUSH":
                 value = self.get_value(parts[1])
                 self.call_stack.append(value)
+            elif opcode == "PUSHF":
+                self._op_pushf()
+            elif opcode == "POPF":
+                self._op_popf()
             elif opcode == "POP":
                 if self.call_stack:
                     self.write_value(parts[1], self.call_stack.pop())
                 else:
-                    print("栈空，无法弹出")
+                    if self.trace.level >= EVENTS:
+                        self.trace.emit(EVENTS, 'EU', "栈空，无法弹出")
             elif opcode == "JMP":
                 target = self.get_value(parts[1])
                 self.registers['IP'] = target - 1  # 减去1是因为在执行完当前指令后IP会自动加1
@@ -365,10 +473,15 @@ class EU:
                 target = self.get_value(parts[1])
                 self.registers['IP'] = target - 1  # 同上
             elif opcode == "RET":
-                if self.call_stack:
-                    self.registers['IP'] = self.call_stack.pop()
-                else:
-                    print("栈空，无法返回")
+                self._op_ret()
+            elif opcode in ("CMP", "TEST"):
+                self.alu('CMP' if opcode == "CMP" else 'TEST', self.get_value(parts[1]), self.get_value(parts[2]))
+            elif opcode in ("INC", "DEC"):
+                self.write_value(parts[1], self.alu(opcode, self.get_value(parts[1])))
+            elif opcode in JCC_CONDITIONS:
+                self._op_jcc(JCC_CONDITIONS[opcode], self.get_value(parts[1]))
+            elif opcode in LOOP_OPS:
+                getattr(self, self.DISPATCH[LOOP_OPS[opcode]])(self.get_value(parts[1]))
 
             elif opcode == "MOVSB":
                 self.movsb()
@@ -378,57 +491,727 @@ class EU:
                 self.cmpsb()
             elif opcode == "CMPSW":
                 self.cmpsw()
+            elif opcode in ("SCASB", "SCASW", "STOSB", "STOSW", "LODSB", "LODSW"):
+                getattr(self, opcode.lower())()
+            elif opcode in REP_PREFIXES:
+                if len(parts) < 2 or parts[1] not in STRING_OPS:
+                    raise ValueError(f"{opcode} 后面必须是串操作指令")
+                self._op_rep(*STRING_OPS[parts[1]], REP_PREFIXES[opcode])
             elif opcode == "STC":
                 self.stc()
             elif opcode == "CLC":
                 self.clc()
+            elif opcode == "STI":
+                self.sti()
+            elif opcode == "CLI":
+                self.cli()
+            elif opcode == "INT":
+                self._op_int(int(parts[1], 0))
+            elif opcode == "IRET":
+                self._op_iret()
+            elif opcode == "EOI":
+                self._op_eoi()
+            elif opcode in ("IN", "OUT"):
+                port, width = parse_io(opcode, parts)
+                if port == 'DX':
+                    port = self.registers.values[DX]
+                if opcode == "IN":
+                    self._op_in(port, width)
+                else:
+                    self._op_out(port, width)
 
-        self.print_flags()
-        self.print_reg()
         return True
 
+    # ---------- 预译码（IR）执行路径 ----------
+
+    def operand(self, spec):
+        """把 OperandSpec 绑定为当前 EU 上的操作数访问器"""
+        kind, value = spec
+        registers = self.registers.values  # 寄存器按下标访问，不再做字符串哈希
+        memory = self.memory
+
+        if kind == 'imm':
+            return Operand(spec, lambda: value)
+        if kind == 'data':
+            data_segment = self.data_segment
+            return Operand(spec, lambda: data_segment[value])
+        if kind == 'reg':
+            index = REGISTER_INDEX[value]
+
+            def set_reg(result):
+                registers[index] = result & 0xFFFF
+            return Operand(spec, lambda: registers[index], set_reg)
+        # 内存操作数按字访问，物理地址 = 段寄存器 * 16 + 有效地址
+        read_word, write_word = memory.read_word, memory.write_word
+        if kind == 'mem':
+            def set_mem(result):
+                write_word((registers[DS] << 4) + value, result)
+            return Operand(spec, lambda: read_word((registers[DS] << 4) + value), set_mem)
+        if kind == 'ind':
+            index = REGISTER_INDEX[value]
+            segment = self.segment_for(value)
+
+            def set_ind(result):
+                write_word((registers[segment] << 4) + registers[index], result)
+            return Operand(spec, lambda: read_word((registers[segment] << 4) + registers[index]), set_ind)
+        if kind == 'based':
+            base, index = REGISTER_INDEX[value[0]], REGISTER_INDEX[value[1]]
+            segment = self.segment_for(*value)
+
+            def address():
+                return (registers[segment] << 4) + ((registers[base] + registers[index]) & 0xFFFF)
+
+            def set_based(result):
+                write_word(address(), result)
+            return Operand(spec, lambda: read_word(address()), set_based)
+        raise ValueError(f"无法解析操作数: {spec}")
+
+    def bind(self, op):
+        """把预译码记录绑定为 (处理方法, 参数) 二元组"""
+        handler = getattr(self, self.DISPATCH[op.opcode])
+        args = tuple(self.operand(arg) if type(arg) is OperandSpec else arg for arg in op.args)
+        return handler, args
+
+    def decode_program(self, instructions):
+        """装载阶段：把整段程序预译码为 IR，无法预译码的行回退到字符串解释路径"""
+        program = []
+        bound = {}  # 相同源码行只绑定一次，重复的 TICK_TIMER 等指令共享同一条 IR
+        for instruction in instructions:
+            entry = bound.get(instruction)
+            if entry is None:
+                op = decode(instruction, self.symbols)
+                if op is None:
+                    entry = (self._execute_text, (instruction,))
+                else:
+                    entry = self.bind(op)
+                bound[instruction] = entry
+            program.append(entry)
+        return program
+
+    def link_object(self, program):
+        """目标文件装载：IR 里先放占位项，每一行第一次执行（或被块编译器读取）时才还原并绑定
+
+        大程序装载时不再为每条指令建立操作数闭包，只执行到的指令付出绑定的代价。
+        """
+        self.object_program = program
+        self.object_bound = [None] * len(program.table)
+        # 所有占位项共用一个元组：执行到占位项时 IP 就是它的下标
+        self.object_ir = [(self._op_bind, ())] * len(program.lines)
+        return self.object_ir
+
+    def bind_at(self, ip):
+        """绑定目标文件的第 ip 条指令，替换 IR 中的占位项并返回 (处理方法, 参数)"""
+        program = self.object_program
+        line = program.lines[ip]
+        entry = self.object_bound[line]
+        if entry is None:
+            op = program.op(line)
+            entry = (self._execute_text, (program.table[line][0],)) if op is None else self.bind(op)
+            self.object_bound[line] = entry
+        self.object_ir[ip] = entry
+        return entry
+
+    def _op_bind(self):
+        handler, args = self.bind_at(self.registers.values[IP])
+        return handler(*args)
+
+    def _op_nop(self):
+        pass
+
+    def _op_segment(self, segment):
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'EU', self.SEGMENT_MESSAGES[segment])
+        self.current_segment = segment
+
+    def _op_define(self, directive, label, value):
+        self.data_segment[label] = value
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'EU', f"定义{self.DATA_KIND_NAMES[directive]}数据: {label} = {value}")
+
+    def _op_proc(self, label):
+        self.procedures[label] = self.registers['IP']
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'EU', f"过程 {label} 定义在位置 {self.registers['IP']}")
+
+    def _op_endp(self):
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'EU', "过程结束")
+
+    def _op_label(self, label):
+        self.labels[label] = self.registers['IP']
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'EU', f"标签 {label} 定义在位置 {self.registers['IP']}")
+
+    def _op_voice(self, voice_code):
+        if voice_code in self.VOICE_MAP:
+            action = self.VOICE_MAP[voice_code]
+            self.peripheral.control_device(action["device"], action["state"])
+            self.peripheral.update_display(f"{action['device']} {'ON' if action['state'] else 'OFF'}")
+        else:
+            self.peripheral.update_display("Unknown Command")
+
+    @staticmethod
+    def voice_code(value):
+        """寄存器中的语音码 -> VOICE_MAP 的两位编码，如 5 -> '05'"""
+        return f"{value:02d}"
+
+    def _op_voice_reg(self, source):
+        self._op_voice(self.voice_code(source.get()))
+
+    def _op_status(self, *terms):
+        # STATUS 设备名，或 STATUS ALL / STATUS Fan ROOM=kitchen 等选择子（统计开启的设备数）
+        status = self.peripheral.query_selection(terms)
+        self.peripheral.update_display(status)
+
+    def _op_switch(self, state, *terms):
+        # SWITCH ON|OFF 选择子：批量打开 / 关闭，例如 SWITCH OFF Fan ROOM=kitchen
+        if self.peripheral.switch_selection(terms, state) is None:
+            self.peripheral.update_display("Unknown Device")
+        else:
+            self.peripheral.update_display(f"{' '.join(terms)} {'ON' if state else 'OFF'}")
+
+    def _op_config_timer(self, counter_id, mode, initial_value):
+        self.timer.write_control(counter_id, mode, initial_value)  # 使用8253的逻辑配置计数器
+
+    def _op_start_timer(self, counter_id):
+        self.timer.start(counter_id)  # 启动指定计数器
+
+    def _op_stop_timer(self, counter_id):
+        self.timer.stop(counter_id)  # 停止指定计数器
+
+    def _op_tick_timer(self, counter_id, clocks=1):
+        if clocks == 1:
+            self.timer.tick(counter_id)  # 模拟时钟周期
+        else:
+            self.timer.advance(counter_id, clocks)  # 一次推进多个时钟周期
+        self._timer_effects(self.timer.read_counter(counter_id))  # 读取当前计数值
+
+    def _timer_effects(self, counter_value):
+        # 根据计数器的值，执行外设控制逻辑
+        if counter_value == 3:
+            self.peripheral.control_device("LED3", 1)
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'EU', "Display: LED3 ON")
+            self.control_device("LED3", 1)
+        elif counter_value == 5:
+            self.peripheral.control_device("Fan3", 1)
+            self.control_device("FAN3", 1)
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'EU', "Display: Fan3 ON")
+        elif counter_value == 2:
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'EU', "Display: LED3 OFF")
+            self.control_device("LED3", 0)
+
+    def _op_tick_run(self, counter_id, length):
+        """length 条连续的 TICK_TIMER counter_id（Peephole 融合成的超级指令）
+
+        按段推进计数器，只在计数值落到 TIMER_THRESHOLDS 的那些时钟补做外设动作；
+        计数结束使 INTR 有效且 IF 置位时停在那个时钟，剩下的 TICK_TIMER 在中断返回后逐条执行。
+        超出指令预算（budget）的部分不执行，从下一次运行接着执行。
+        """
+        length = min(length, self.budget)
+        timer = self.timer
+        wired = timer.outputs[counter_id] is not None  # OUT 接了中断请求线：每次计数结束单独请求一次
+        enabled = self.status_flags.word & IF_MASK
+        hits = timer.value_offsets(counter_id, length, self.TIMER_THRESHOLDS)
+        done = 0
+        for position, target in enumerate(hits + [length]):
+            while done < target:
+                step = target - done
+                if enabled and self.pic.intr:
+                    step = 1  # 进入时已有待响应的中断（块内前面的指令引起）
+                elif wired:
+                    terminal = timer.clocks_to_terminal(counter_id)
+                    if terminal is not None and terminal < step:
+                        step = terminal
+                timer.advance(counter_id, step)
+                done += step
+                if enabled and self.pic.intr:
+                    break
+            if done == target and position < len(hits):
+                self._timer_effects(timer.read_counter(counter_id))
+            if enabled and self.pic.intr:
+                break
+        registers = self.registers.values
+        registers[IP] = (registers[IP] + done - 1) & 0xFFFF  # 运行循环再加 1，落在最后执行的那条之后
+        self.fused_instructions += done - 1
+
+    def _op_write_ctrl(self, value):
+        self.parallel_interface.write_register(self.CONTROL_REGISTER, value)  # 写入控制寄存器的值
+
+    def _op_write_port(self, port, value):
+        self.parallel_interface.write_register(self.PORT_REGISTER[port], value)  # 写入端口值
+
+    def _op_write_ports(self, writes):
+        """连续的 WRITE_CTRL / WRITE_PORT（Peephole 融合成的超级指令）：writes 为 (寄存器地址, 值) 元组"""
+        writes = writes[:self.budget]  # 没有预算时切片返回原元组
+        self.parallel_interface.write_registers(writes)  # 一次总线事务
+        registers = self.registers.values
+        registers[IP] = (registers[IP] + len(writes) - 1) & 0xFFFF
+        self.fused_instructions += len(writes) - 1
+
+    def _op_read_port(self, port):
+        self.parallel_interface.read_register(self.PORT_REGISTER[port])  # 读取端口值
+
+    def _op_in(self, port, width):
+        registers = self.registers.values
+        if width == 1:
+            registers[AX] = (registers[AX] & 0xFF00) | self.io.read(port)  # IN AL：只改变低字节
+        else:
+            registers[AX] = self.io.read_word(port)
+
+    def _op_out(self, port, width):
+        value = self.registers.values[AX]
+        if width == 1:
+            self.io.write(port, value & 0xFF)
+        else:
+            self.io.write_word(port, value)
+
+    def _op_in_dx(self, width):
+        self._op_in(self.registers.values[DX], width)
+
+    def _op_out_dx(self, width):
+        self._op_out(self.registers.values[DX], width)
+
+    def _op_hlt(self):
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'EU', "停止执行")
+        return False
+
+    def _op_mov(self, dest, src):
+        dest.set(src.get())
+
+    def _op_add(self, dest, src):
+        # 最常见的两种运算不经过 alu 的分派，直接记录惰性标志
+        a = dest.get() & 0xFFFF
+        b = src.get() & 0xFFFF
+        result = a + b
+        self.status_flags.lazy = (LAZY_ADD, a, b, result, 0x8000)
+        dest.set(result & 0xFFFF)
+
+    def _op_sub(self, dest, src):
+        a = dest.get() & 0xFFFF
+        b = src.get() & 0xFFFF
+        result = a - b
+        self.status_flags.lazy = (LAZY_SUB, a, b, result, 0x8000)
+        dest.set(result & 0xFFFF)
+
+    def _op_adc(self, dest, src):
+        dest.set(self.alu('ADC', dest.get(), src.get()))
+
+    def _op_sbb(self, dest, src):
+        dest.set(self.alu('SBB', dest.get(), src.get()))
+
+    def _op_neg(self, dest):
+        dest.set(self.alu('NEG', dest.get()))
+
+    def _op_cmp(self, dest, src):
+        a = dest.get() & 0xFFFF
+        b = src.get() & 0xFFFF
+        self.status_flags.lazy = (LAZY_SUB, a, b, a - b, 0x8000)
+
+    def _op_test(self, dest, src):
+        self.status_flags.lazy = (LAZY_LOGIC, 0, 0, dest.get() & src.get() & 0xFFFF, 0x8000)
+
+    def _op_inc(self, dest):
+        dest.set(self.alu('INC', dest.get()))
+
+    def _op_dec(self, dest):
+        dest.set(self.alu('DEC', dest.get()))
+
+    def _op_mul(self, dest, src):
+        dest.set(self.alu('MUL', dest.get(), src.get()))
+
+    def _op_div(self, dest, src):
+        dest.set(self.alu('DIV', dest.get(), src.get()))
+
+    def _op_and(self, dest, src):
+        dest.set(self.alu('AND', dest.get(), src.get()))
+
+    def _op_or(self, dest, src):
+        dest.set(self.alu('OR', dest.get(), src.get()))
+
+    def _op_xor(self, dest, src):
+        dest.set(self.alu('XOR', dest.get(), src.get()))
+
+    def _op_not(self, dest):
+        dest.set(self.alu('NOT', dest.get()))
+
+    def _op_shl(self, dest, count):
+        dest.set(self.alu('SHL', dest.get(), count.get()))
+
+    def _op_shr(self, dest, count):
+        dest.set(self.alu('SHR', dest.get(), count.get()))
+
+    def _op_sar(self, dest, count):
+        dest.set(self.alu('SAR', dest.get(), count.get()))
+
+    def _op_rol(self, dest, count):
+        dest.set(self.alu('ROL', dest.get(), count.get()))
+
+    def _op_ror(self, dest, count):
+        dest.set(self.alu('ROR', dest.get(), count.get()))
+
+    def _op_rcl(self, dest, count):
+        dest.set(self.alu('RCL', dest.get(), count.get()))
+
+    def _op_rcr(self, dest, count):
+        dest.set(self.alu('RCR', dest.get(), count.get()))
+
+    def _op_pushf(self):
+        self.call_stack.append(self.status_flags.value)
+
+    def _op_popf(self):
+        if self.call_stack:
+            self.status_flags.value = self.call_stack.pop()
+        else:
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'EU', "栈空，无法弹出")
+
+    def _op_push(self, src):
+        self.call_stack.append(src.get())
+
+    def _op_pop(self, dest):
+        if self.call_stack:
+            dest.set(self.call_stack.pop())
+        else:
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'EU', "栈空，无法弹出")
+
+    def _op_jmp(self, target):
+        self.registers.values[IP] = (target.get() - 1) & 0xFFFF  # 减去1是因为在执行完当前指令后IP会自动加1
+
+    def _op_call(self, target):
+        registers = self.registers.values
+        self.call_stack.append(registers[IP] + 1)  # Push the next instruction address
+        registers[IP] = (target.get() - 1) & 0xFFFF
+
+    # 条件转移和循环指令的目标在装载时已解析为整数 IP，执行时不再查符号表
+
+    def _op_jcc(self, condition, target):
+        if CONDITIONS[condition](self.status_flags):
+            self.registers.values[IP] = (target - 1) & 0xFFFF
+
+    def _op_loop(self, target):
+        registers = self.registers.values
+        registers[CX] = (registers[CX] - 1) & 0xFFFF  # LOOP 系列不影响标志
+        if registers[CX]:
+            registers[IP] = (target - 1) & 0xFFFF
+
+    def _op_loope(self, target):
+        registers = self.registers.values
+        registers[CX] = (registers[CX] - 1) & 0xFFFF
+        if registers[CX] and self.status_flags.zero():
+            registers[IP] = (target - 1) & 0xFFFF
+
+    def _op_loopne(self, target):
+        registers = self.registers.values
+        registers[CX] = (registers[CX] - 1) & 0xFFFF
+        if registers[CX] and not self.status_flags.zero():
+            registers[IP] = (target - 1) & 0xFFFF
+
+    def _op_jcxz(self, target):
+        registers = self.registers.values
+        if not registers[CX]:
+            registers[IP] = (target - 1) & 0xFFFF
+
+    def _op_ret(self):
+        if self.call_stack:
+            # 返回地址是 CALL 的下一条指令，减 1 抵消执行后 IP 的自增
+            self.registers['IP'] = self.call_stack.pop() - 1
+        else:
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'EU', "栈空，无法返回")
+
+    # ---------- 串操作 ----------
+
+    def _string_addresses(self):
+        """源操作数 DS:SI，目的操作数 ES:DI"""
+        registers = self.registers.values
+        return (linear_address(registers[DS], registers[SI]),
+                linear_address(registers[ES], registers[DI]))
+
+    def _advance_string(self, size, count=1, indexes=(SI, DI)):
+        """根据方向标志把 SI / DI 前进 count 个元素"""
+        registers = self.registers.values
+        step = -size * count if self.status_flags.word & DF_MASK else size * count
+        for index in indexes:
+            registers[index] = (registers[index] + step) & 0xFFFF
+
+    def _string_block(self, segment, index, size, count):
+        """count 个元素在内存中占据的 (最低物理地址, 字节数)；偏移在段内回绕或超出 1 MB 时返回 None"""
+        registers = self.registers.values
+        offset = registers[index]
+        length = size * count
+        low = offset - length + size if self.status_flags.word & DF_MASK else offset
+        if low < 0 or low + length > 0x10000:
+            return None
+        address = linear_address(registers[segment], low)
+        return (address, length) if address + length <= self.memory.size else None
+
+    def _read_element(self, address, size):
+        return self.memory.read_byte(address) if size == 1 else self.memory.read_word(address)
+
+    def _movs(self, size, count):
+        memory = self.memory
+        source = self._string_block(DS, SI, size, count) if count > 1 else None
+        dest = self._string_block(ES, DI, size, count) if source is not None else None
+        if dest is not None and dest[0] + dest[1] <= memory.rom_base:
+            (source, length), dest = source, dest[0]
+            # 逐元素复制时，目的区在复制方向前方与源区重叠的部分会以两者的距离为周期重复
+            backward = self.status_flags.word & DF_MASK
+            distance = source - dest if backward else dest - source
+            if not 0 < distance < size:
+                view = memory.view
+                if 0 < distance < length:
+                    if backward:
+                        pattern = bytes(view[source + length - distance:source + length])
+                        data = (pattern * (length // distance + 1))[-length:]
+                    else:
+                        pattern = bytes(view[source:source + distance])
+                        data = (pattern * (length // distance + 1))[:length]
+                else:
+                    data = bytes(view[source:source + length])
+                memory.write_block(dest, data)
+                self._advance_string(size, count)
+                return count
+        for _ in range(count):
+            source, dest = self._string_addresses()
+            if size == 1:
+                memory.write_byte(dest, memory.read_byte(source))
+            else:
+                memory.write_word(dest, memory.read_word(source))
+            self._advance_string(size)
+        return count
+
+    def _cmps(self, size, count, repeat_zf=None):
+        """比较 DS:SI 与 ES:DI，REPE（repeat_zf=1）在第一个不相等的元素处停止，返回执行的元素数"""
+        if repeat_zf == 1 and count > 1:
+            source = self._string_block(DS, SI, size, count)
+            dest = self._string_block(ES, DI, size, count)
+            if source is not None and dest is not None:
+                view = self.memory.view
+                length = source[1]
+                # 两块按小端整数异或：最低（或最高）的非零字节就是第一个不相等的字节
+                difference = (int.from_bytes(view[source[0]:source[0] + length], 'little') ^
+                              int.from_bytes(view[dest[0]:dest[0] + length], 'little'))
+                if not difference:
+                    element = count - 1
+                elif self.status_flags.word & DF_MASK:
+                    element = (length - 1 - ((difference.bit_length() - 1) >> 3)) // size
+                else:
+                    element = (((difference & -difference).bit_length() - 1) >> 3) // size
+                self._advance_string(size, element)
+                source, dest = self._string_addresses()
+                self.alu('CMP', self._read_element(source, size), self._read_element(dest, size), size=size)
+                self._advance_string(size)
+                return element + 1
+        for done in range(1, count + 1):
+            source, dest = self._string_addresses()
+            self.alu('CMP', self._read_element(source, size), self._read_element(dest, size), size=size)
+            self._advance_string(size)
+            if repeat_zf is not None and bool(self.status_flags.zero()) != repeat_zf:
+                break
+        return done
+
+    def _scas(self, size, count, repeat_zf=None):
+        """用 AL / AX 与 ES:DI 比较，REPNE 在第一个相等的元素处停止、REPE 在第一个不相等的元素处停止"""
+        registers = self.registers.values
+        value = registers[AX] & 0xFF if size == 1 else registers[AX]
+        if repeat_zf is not None and size == 1 and count > 1:
+            dest = self._string_block(ES, DI, 1, count)
+            if dest is not None:
+                block = bytes(self.memory.view[dest[0]:dest[0] + count])
+                target = bytes((value,))
+                backward = self.status_flags.word & DF_MASK
+                if repeat_zf:  # REPE：跳过连续等于 AL 的字节
+                    remaining = len(block.rstrip(target) if backward else block.lstrip(target))
+                    element = count - remaining
+                else:  # REPNE：查找 AL
+                    found = block.rfind(target) if backward else block.find(target)
+                    element = -1 if found < 0 else (count - 1 - found if backward else found)
+                if element < 0 or element >= count:
+                    element = count - 1
+                self._advance_string(1, element, (DI,))
+                self.alu('CMP', value, self.memory.read_byte(self._string_addresses()[1]), size=1)
+                self._advance_string(1, 1, (DI,))
+                return element + 1
+        for done in range(1, count + 1):
+            self.alu('CMP', value, self._read_element(self._string_addresses()[1], size), size=size)
+            self._advance_string(size, 1, (DI,))
+            if repeat_zf is not None and bool(self.status_flags.zero()) != repeat_zf:
+                break
+        return done
+
+    def _stos(self, size, count):
+        """把 AL / AX 存入 ES:DI"""
+        memory = self.memory
+        value = self.registers.values[AX]
+        dest = self._string_block(ES, DI, size, count) if count > 1 else None
+        if dest is not None and dest[0] + dest[1] <= memory.rom_base:
+            memory.write_block(dest[0], (value & 0xFF).to_bytes(1, 'little') * count if size == 1
+                               else value.to_bytes(2, 'little') * count)
+            self._advance_string(size, count, (DI,))
+            return count
+        for _ in range(count):
+            dest = self._string_addresses()[1]
+            if size == 1:
+                memory.write_byte(dest, value)
+            else:
+                memory.write_word(dest, value)
+            self._advance_string(size, 1, (DI,))
+        return count
+
+    def _lods(self, size, count):
+        """从 DS:SI 取到 AL / AX；重复执行时只有最后一个元素留在累加器里"""
+        registers = self.registers.values
+        self._advance_string(size, count - 1, (SI,))
+        element = self._read_element(self._string_addresses()[0], size)
+        registers[AX] = (registers[AX] & 0xFF00) | element if size == 1 else element
+        self._advance_string(size, 1, (SI,))
+        return count
+
+    def _op_rep(self, operation, size, repeat_zf):
+        """REP / REPE / REPNE 前缀：按 CX 成批执行串操作
+
+        rep_budget 限制本次最多执行的元素数（虚拟时钟按下一个事件的到达时间给出）；
+        没做完时 IP 退回本指令，CX / SI / DI 停在中断到达的元素边界，中断返回后继续。
+        """
+        registers = self.registers.values
+        count = registers[CX]
+        self.string_elements = 0
+        if not count:
+            return
+        budget = self.rep_budget
+        run = count if budget is None or budget >= count else budget
+        if operation in ('cmps', 'scas'):
+            done = getattr(self, '_' + operation)(size, run, repeat_zf)
+            stopped = bool(self.status_flags.zero()) != repeat_zf
+        else:
+            done = getattr(self, '_' + operation)(size, run)
+            stopped = False
+        registers[CX] = count - done
+        self.string_elements = done
+        if registers[CX] and not stopped:
+            registers[IP] = (registers[IP] - 1) & 0xFFFF
+
     def movsb(self):
         """Move byte from source index (SI) to destination index (DI) and update indices."""
-        byte = self.memory[self.registers['SI']]
-        self.memory[self.registers['DI']] = byte
-        # Update SI and DI based on the direction flag
-        if self.status_flags['DF'] == 0:  # Increment
-            self.registers['SI'] += 1
-            self.registers['DI'] += 1
-        else:  # Decrement
-            self.registers['SI'] -= 1
-            self.registers['DI'] -= 1
+        self._movs(1, 1)
 
     def movsw(self):
         """Move word from source index (SI) to destination index (DI) and update indices."""
-        word = (self.memory[self.registers['SI']] << 8) | self.memory[self.registers['SI'] + 1]
-        self.memory[self.registers['DI']] = word & 0xFF
-        self.memory[self.registers['DI'] + 1] = (word >> 8) & 0xFF
-        # Update SI and DI based on the direction flag
-        if self.status_flags['DF'] == 0:  # Increment
-            self.registers['SI'] += 2
-            self.registers['DI'] += 2
-        else:  # Decrement
-            self.registers['SI'] -= 2
-            self.registers['DI'] -= 2
+        self._movs(2, 1)
 
     def cmpsb(self):
-        """Compare byte at source index (SI) with destination index (DI)."""
-        byte1 = self.memory[self.registers['SI']]
-        byte2 = self.memory[self.registers['DI']]
-        self.alu('SUB', byte1, byte2)
+        """Compare byte at source index (SI) with destination index (DI) and update indices."""
+        self._cmps(1, 1)
 
     def cmpsw(self):
-        """Compare word at source index (SI) with destination index (DI)."""
-        word1 = (self.memory[self.registers['SI']] << 8) | self.memory[self.registers['SI'] + 1]
-        word2 = (self.memory[self.registers['DI']] << 8) | self.memory[self.registers['DI'] + 1]
-        self.alu('SUB', word1, word2)
+        """Compare word at source index (SI) with destination index (DI) and update indices."""
+        self._cmps(2, 1)
+
+    def scasb(self):
+        """Compare AL with the byte at destination index (DI) and update DI."""
+        self._scas(1, 1)
+
+    def scasw(self):
+        """Compare AX with the word at destination index (DI) and update DI."""
+        self._scas(2, 1)
+
+    def stosb(self):
+        """Store AL at destination index (DI) and update DI."""
+        self._stos(1, 1)
+
+    def stosw(self):
+        """Store AX at destination index (DI) and update DI."""
+        self._stos(2, 1)
+
+    def lodsb(self):
+        """Load the byte at source index (SI) into AL and update SI."""
+        self._lods(1, 1)
+
+    def lodsw(self):
+        """Load the word at source index (SI) into AX and update SI."""
+        self._lods(2, 1)
 
     def stc(self):
-        self.status_flags['CF'] = 1
+        self.status_flags.value |= CF_MASK
 
     def clc(self):
-        self.status_flags['CF'] = 0
+        self.status_flags.value &= ~CF_MASK
+
+    def sti(self):
+        self.status_flags.word |= IF_MASK
+
+    def cli(self):
+        self.status_flags.word &= ~IF_MASK
+
+    # ---------- 中断 ----------
+
+    def _enter_interrupt(self, vector, return_ip):
+        """压入 FLAGS、CS 和返回地址，清除 IF / TF，返回向量表中处理程序的入口 IP"""
+        registers = self.registers.values
+        flags = self.status_flags
+        self.call_stack.append(flags.value)
+        self.call_stack.append(registers[CS])
+        self.call_stack.append(return_ip)
+        flags.word &= ~(IF_MASK | TF_MASK)
+        address = vector * self.VECTOR_SIZE
+        target = self.memory.read_word(address)
+        registers[CS] = self.memory.read_word(address + 2)
+        if self.trace.level >= EVENTS:
+            self.trace.emit(EVENTS, 'EU', f"中断 {vector:02X}H，转到 {target}",
+                            {'vector': vector, 'return': return_ip, 'target': target})
+        return target
+
+    def set_vector(self, vector, target, segment=0):
+        """在中断向量表中登记处理程序（程序里也可以用 MOV [4*类型号] 标签 写入）"""
+        address = vector * self.VECTOR_SIZE
+        self.memory.write_word(address, target)
+        self.memory.write_word(address + 2, segment)
+
+    def interrupt(self):
+        """在指令边界响应 INTR：向 8259A 取中断类型号，下一条执行的就是处理程序的第一条指令"""
+        registers = self.registers.values
+        registers[IP] = self._enter_interrupt(self.pic.inta(), registers[IP])
+
+    def _op_int(self, vector):
+        registers = self.registers.values
+        registers[IP] = (self._enter_interrupt(vector, registers[IP] + 1) - 1) & 0xFFFF
+
+    def _op_iret(self):
+        if len(self.call_stack) < 3:
+            if self.trace.level >= EVENTS:
+                self.trace.emit(EVENTS, 'EU', "栈空，无法从中断返回")
+            return
+        registers = self.registers.values
+        return_ip = self.call_stack.pop()
+        registers[CS] = self.call_stack.pop()
+        self.status_flags.value = self.call_stack.pop()
+        registers[IP] = (return_ip - 1) & 0xFFFF
+
+    def _op_eoi(self):
+        self.pic.eoi()  # 相当于向主片写非特定 EOI 命令（OUT 20H, 20H）
+
+    def snapshot(self):
+        """保存 EU 状态：寄存器组和 FLAGS 是连续缓冲区，其余为浅拷贝"""
+        return EUSnapshot(self.registers.snapshot(), self.status_flags.value, self.call_stack.copy(),
+                          self.procedures.copy(), self.data_segment.copy(), self.labels.copy(),
+                          self.current_segment)
+
+    def restore(self, state):
+        """原地恢复 EU 状态，已预译码的 IR 无需重新绑定"""
+        self.registers.restore(state.registers)
+        self.status_flags.value = state.flags
+        self.call_stack[:] = state.call_stack
+        for target, saved in ((self.procedures, state.procedures),
+                              (self.data_segment, state.data_segment),
+                              (self.labels, state.labels)):
+            target.clear()
+            target.update(saved)
+        self.current_segment = state.current_segment
 
     def print_data_segment(self):
         """打印数据段的内容"""
@@ -450,95 +1233,400 @@ class EU:
 
 
 class GUI:
-    def __init__(self):
+    SCROLL_KEYS = {'<Up>': ('scroll_by', -1), '<Down>': ('scroll_by', 1),
+                   '<Prior>': ('page', -1), '<Next>': ('page', 1),
+                   '<Home>': ('scroll_to', 0), '<End>': ('scroll_to', sys.maxsize)}
+
+    def __init__(self, devices=("LED1", "LED2", "LED3", "Fan1", "Fan2", "Fan3")):
+        if tk is None:
+            raise RuntimeError("tkinter is not available, use CPU(..., headless=True)")
         self.root = tk.Tk()
         self.root.title("CPU Simulator")
-
-        # LED状态
-        self.led1_label = ttk.Label(self.root, text="LED1: Off")
-        self.led1_label.grid(row=0, column=0)
-        self.led2_label = ttk.Label(self.root, text="LED2: Off")
-        self.led2_label.grid(row=0, column=1)
-        self.led3_label = ttk.Label(self.root, text="LED3: Off")
-        self.led3_label.grid(row=0, column=2)
-
-        # 风扇状态
-        self.fan1_label = ttk.Label(self.root, text="Fan1: Off")
-        self.fan1_label.grid(row=1, column=0)
-        self.fan2_label = ttk.Label(self.root, text="Fan2: Off")
-        self.fan2_label.grid(row=1, column=1)
-        self.fan3_label = ttk.Label(self.root, text="Fan3: Off")
-        self.fan3_label.grid(row=1, column=2)
+        self.root.rowconfigure(0, weight=1)
+        self.root.columnconfigure(0, weight=1)
+
+        # 所有设备画在同一个 Canvas 上，由设备表生成，只为可见的格子建立图形项
+        self.canvas = tk.Canvas(self.root, highlightthickness=0, takefocus=True)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self.root, orient="vertical", command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.dashboard = Dashboard(self.canvas, devices, 300, 100)
+        self.canvas.bind("<Configure>", self.on_resize)
+        for key, (action, amount) in self.SCROLL_KEYS.items():
+            self.root.bind(key, lambda event, action=action, amount=amount: self.scroll(action, amount))
+        self.canvas.bind("<MouseWheel>", lambda event: self.scroll('scroll_by', -1 if event.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda event: self.scroll('scroll_by', -1))  # X11 的滚轮
+        self.canvas.bind("<Button-5>", lambda event: self.scroll('scroll_by', 1))
+
+        # CPU 线程只往队列里发布状态，控件由 Tk 线程按帧刷新
+        self.updates = DisplayQueue()
+        self.frame_interval = 1000 // FRAME_RATE  # 毫秒
 
     def control_device(self, device, state):
-        if device.startswith("LED"):
-            self.update_led_status(int(device[3:]), state)
-        elif device.startswith("Fan"):
-            self.update_fan_status(int(device[3:]), state)
-
-    def update_led_status(self, led_num, status):
-        if status:
-            new_text = "On"
-        else:
-            new_text = "Off"
-        if led_num == 1:
-            self.led1_label.config(text=f"LED1: {new_text}")
-        elif led_num == 2:
-            self.led2_label.config(text=f"LED2: {new_text}")
-        elif led_num == 3:
-            self.led3_label.config(text=f"LED3: {new_text}")
-
-    def update_fan_status(self, fan_num, status):
-        if status:
-            new_text = "On"
-        else:
-            new_text = "Off"
-        if fan_num == 1:
-            self.fan1_label.config(text=f"Fan1: {new_text}")
-        elif fan_num == 2:
-            self.fan2_label.config(text=f"Fan2: {new_text}")
-        elif fan_num == 3:
-            self.fan3_label.config(text=f"Fan3: {new_text}")
+        """可在 CPU 线程中调用：只记录状态，不碰 Tk 控件"""
+        self.updates.publish(device, state)
+
+    def refresh(self):
+        """Tk 线程中每帧执行一次：加上新登记的设备，只重画这一帧内状态变化了的可见设备"""
+        if self.dashboard.sync():
+            self.scrollbar.set(*self.dashboard.view())
+        self.dashboard.update(self.updates.drain())
+        self.root.after(self.frame_interval, self.refresh)
+
+    def on_resize(self, event):
+        self.dashboard.resize(event.width, event.height)
+        self.scrollbar.set(*self.dashboard.view())
+
+    def scroll(self, action, amount):
+        if getattr(self.dashboard, action)(amount):
+            self.scrollbar.set(*self.dashboard.view())
+
+    def yview(self, command, *args):
+        """滚动条的回调：('moveto', 比例) 或 ('scroll', 数量, 'units' / 'pages')"""
+        if command == "moveto":
+            self.scroll('scroll_to', int(float(args[0]) * self.dashboard.rows))
+        elif command == "scroll":
+            self.scroll('page' if args[1] == "pages" else 'scroll_by', int(args[0]))
 
     # GUI窗口
     def run(self):
         self.root.geometry("300x100")
+        self.root.after(self.frame_interval, self.refresh)
         self.root.mainloop()
 
 
 class CPU:
-    def __init__(self, memory, instructions):
+    GUI_IPS = 0.5  # GUI 模式下每 2 秒执行一条指令，便于观察 GUI 变化
+
+    def __init__(self, memory, instructions, predecode=True, headless=False, clock=None,
+                 compile_blocks=True, board=None, scheduler=None, fuse=False):
+        if scheduler is not None and fuse:
+            raise ValueError("窥孔融合暂不支持虚拟时钟")
+        if memory is None:
+            memory = Memory()
         self.biu = BIU(memory, instructions)  # 将指令列表传递给BIU
-        self.eu = EU()
-        self.gui = GUI()
+        self.eu = EU(board)
+        self.board = self.eu.board
+        self.headless = headless
+        # headless 模式完全不创建 Tk 根窗口
+        self.gui = None if headless else GUI(self.board.peripheral.devices)
         self.eu.set_gui(self.gui)
         self.eu.set_memory(memory)
-        peripheral.set_eu(self.eu)
+        self.board.peripheral.set_eu(self.eu)
         self.instructions = instructions
+        self.predecode = predecode  # False 时使用逐条解析源码的字符串解释路径
+        self.compile_blocks = compile_blocks  # 不限速且未开启逐指令跟踪时按基本块执行
+        self.blocks = None
+        self.max_instructions = None  # 指令预算，None 表示不限；块模式下剩余条数不够一整块时改为逐条执行，各路径停在同一条指令
+        if clock is None:
+            clock = Clock.unthrottled() if headless else Clock.realtime(self.GUI_IPS)
+        self.clock = clock
+        self.instruction_count = 0  # 本次运行已执行的指令数
         self.running = False
-
-    def run_cpu(self):
+        self.scheduler = scheduler  # 离散事件虚拟时钟，设置后按指令周期推进时间、HLT 时快进
+        self.cycles = None  # 每条指令的时钟周期数（仅虚拟时钟模式）
+        self.machine = None  # 装入 .COM 程序后执行机器码（见 load_com）
+        self.object_program = None  # 由 Assembler 生成的目标文件，装载时不再扫描和译码源代码
+        self.fuse = fuse  # 装载时把连续的 TICK_TIMER / 端口写融合为超级指令（仅预译码路径）
+        self.fuser = None
+        self.fusion = None  # 融合结果 FusionReport
+        if scheduler is not None:
+            scheduler.attach_timer(self.board.timer)
+
+    def load_object(self, program):
+        """使用 Assembler 生成的 ObjectProgram 代替源代码指令列表"""
+        self.object_program = program
+        self.instructions = self.biu.instructions = program.instructions
+
+    def load_program(self):
+        """装载阶段：解析数据段并把指令预译码为 IR"""
+        program = self.object_program
+        if program is not None:
+            self.eu.load_symbols(program.symbols, program.data)
+        else:
+            self.eu.parse_data_segment(self.instructions)  # 解析数据段
+        if self.predecode:
+            if program is None:
+                self.biu.program = self.eu.decode_program(self.instructions)
+            else:
+                self.biu.program = self.eu.link_object(program)
+                if self.scheduler is not None or self.fuse:  # 周期表和融合都在运行前按处理方法扫描，需要全部绑定
+                    for ip in range(len(self.biu.program)):
+                        self.eu.bind_at(ip)
+            if self.fuse:
+                self.fuser = Fuser(self.biu.program, self.eu)
+                self.fusion = self.fuser.fuse()
+            leaders = set(self.eu.labels.values()) | set(self.eu.procedures.values())
+            self.blocks = BlockCache(self.biu.program, self.eu.registers.values, leaders,
+                                     None if program is None else self.eu.bind_at)
+            if self.scheduler is not None:
+                self.cycles = [instruction_cycles(handler, args) for handler, args in self.biu.program]
+
+    def load_com(self, image, segment=COM_SEGMENT):
+        """装入 .COM 机器码映像，之后 run_cpu 从 CS:IP 取字节译码执行，不再使用源代码指令列表"""
+        if self.scheduler is not None:
+            raise ValueError("机器码模式暂不支持虚拟时钟")
+        self.machine = Machine(self.eu, self.biu.prefetch)
+        self.machine.install_dos_services()
+        load_com(self.biu.memory, self.eu.registers.values, image, segment)
+        return self.machine
+
+    def patch_instruction(self, ip, instruction):
+        """运行期间修改第 ip 条指令（自修改代码），同时让覆盖它的已编译块失效"""
+        self.instructions[ip] = instruction
+        self.object_program = None  # 再次装载时从修改后的指令列表重新译码
+        if self.biu.program is not None:
+            if self.fuser is not None:
+                for start in self.fuser.unfuse(ip):  # 同一段的超级指令里还是修改前的指令
+                    self.blocks.invalidate(start)
+            self.biu.program[ip] = self.eu.decode_program([instruction])[0]
+            self.blocks.invalidate(ip)
+            if self.cycles is not None:
+                self.cycles[ip] = instruction_cycles(*self.biu.program[ip])
+
+    def run_cpu(self, max_instructions=None):
         self.running = True
-        self.eu.parse_data_segment(self.instructions)  # 解析数据段
-        while self.running:
+        if max_instructions is not None:
+            self.max_instructions = max_instructions
+        if self.machine is not None:
+            self.clock.start()
+            self._run_machine()
+            return
+        self.load_program()
+        self.clock.start()
+        if not self.predecode:
+            self._run_source()
+        elif self.scheduler is not None:
+            self._run_scheduled()
+        elif self.compile_blocks and not self.clock.throttled and self.eu.trace.level < INSTRUCTIONS:
+            self._run_blocks()
+        else:
+            self._run_decoded()
+
+    def stop(self):
+        """请求停止运行（可从其它线程调用），运行循环在下一条指令或下一个块处退出"""
+        self.running = False
+
+    def _run_blocks(self):
+        """按基本块执行：每个块是一个编译好的 Python 函数，块边界处检查停止条件"""
+        registers = self.eu.registers.values
+        flags = self.eu.status_flags
+        pic = self.board.pic
+        length = len(self.biu.program)
+        program = self.biu.program
+        blocks = self.blocks.blocks
+        lookup = self.blocks.lookup
+        limit = self.max_instructions if self.max_instructions is not None else sys.maxsize
+        budgeted, eu, fused = self._fused_budget()
+        count = 0
+        while self.running and count < limit:
+            if pic.intr and flags.word & IF_MASK:  # 中断在块边界响应
+                self.eu.interrupt()
+            ip = registers[IP]
+            if ip >= length:
+                if self.eu.trace.level >= EVENTS:
+                    self.eu.trace.emit(EVENTS, 'CPU', "IP 寄存器超出指令范围，停止执行")
+                break
+            block = blocks[ip]
+            if block is None:
+                block = lookup(ip)
+            if block is None or count + block[1] > limit:  # 冷代码、或剩余的指令条数不够一整块时逐条分派
+                handler, args = program[ip]
+                count += 1
+                if budgeted:
+                    eu.budget = limit - count + 1
+                if handler(*args) is False:
+                    break
+                if budgeted:
+                    limit -= eu.fused_instructions - fused  # 超级指令多执行的条数同样计入预算
+                    fused = eu.fused_instructions
+                registers[IP] = (registers[IP] + 1) & 0xFFFF
+                continue
+            count += block[1]
+            if budgeted:
+                eu.budget = limit - count + 1  # 超级指令只会是块的最后一条
+            if block[0]() is False:
+                break
+            if budgeted:
+                limit -= eu.fused_instructions - fused
+                fused = eu.fused_instructions
+            registers[IP] = (registers[IP] + 1) & 0xFFFF
+        self.instruction_count = count
+        eu.budget = sys.maxsize
+
+    def _run_decoded(self):
+        """通过分派表执行预译码后的 IR"""
+        registers = self.eu.registers.values
+        flags = self.eu.status_flags
+        pic = self.board.pic
+        program = self.biu.program
+        tracer = self.eu.trace
+        pace = self.clock.pace if self.clock.throttled else None
+        limit = self.max_instructions if self.max_instructions is not None else sys.maxsize
+        budgeted, eu, fused = self._fused_budget()
+        count = 0
+        while self.running and count < limit:
+            if pic.intr and flags.word & IF_MASK:  # 没有中断请求时只多一次整数判断
+                self.eu.interrupt()
+            ip = registers[IP]
+            if ip >= len(program):
+                if self.eu.trace.level >= EVENTS:
+                    self.eu.trace.emit(EVENTS, 'CPU', "IP 寄存器超出指令范围，停止执行")
+                break
+            handler, args = program[ip]
+            count += 1
+            if budgeted:
+                eu.budget = limit - count + 1
+            if handler(*args) is False:
+                break
+            if budgeted:
+                limit -= eu.fused_instructions - fused  # 超级指令多执行的条数同样计入预算
+                fused = eu.fused_instructions
+            if tracer.level >= INSTRUCTIONS:
+                self.eu.trace_state()
+            registers[IP] = (registers[IP] + 1) & 0xFFFF  # 成功执行指令后，IP寄存器自增
+            if pace is not None:
+                pace()
+        self.instruction_count = count
+        eu.budget = sys.maxsize
+
+    def _fused_budget(self):
+        """融合且有指令预算时，超级指令要按剩余预算截断：返回 (是否截断, EU, 当前的 fused_instructions)"""
+        return self.fuser is not None and self.max_instructions is not None, self.eu, self.eu.fused_instructions
+
+    def _run_machine(self):
+        """机器码路径：按 CS:IP 的物理地址查译码缓存，未命中时从预取队列取字节译码"""
+        machine = self.machine
+        cache = machine.cache
+        decode = machine.decode
+        registers = self.eu.registers.values
+        flags = self.eu.status_flags
+        pic = self.board.pic
+        tracer = self.eu.trace
+        pace = self.clock.pace if self.clock.throttled else None
+        limit = self.max_instructions if self.max_instructions is not None else sys.maxsize
+        count = 0
+        while self.running and count < limit:
+            if pic.intr and flags.word & IF_MASK:
+                machine.interrupt()
+            ip = registers[IP]
+            address = ((registers[CS] << 4) + ip) & ADDRESS_MASK
+            entry = cache.get(address)
+            if entry is None:
+                try:
+                    entry = decode(address)
+                except InvalidOpcode as error:
+                    if tracer.level >= EVENTS:
+                        tracer.emit(EVENTS, 'CPU', f"{registers[CS]:04X}:{ip:04X} {error}，停止执行")
+                    break
+            handler, args, length = entry
+            registers[IP] = (ip + length) & 0xFFFF  # 先指向下一条指令，转移和 CALL 以它为基准
+            count += 1
+            if handler(*args) is False:
+                break
+            if tracer.level >= INSTRUCTIONS:
+                self.eu.trace_state()
+            if pace is not None:
+                pace()
+        self.instruction_count = count
+
+    def _run_scheduled(self):
+        """虚拟时钟模式：每条指令按周期数推进虚拟时间，到期事件在指令边界执行，HLT 时快进到下一个事件"""
+        scheduler = self.scheduler
+        registers = self.eu.registers.values
+        flags = self.eu.status_flags
+        pic = self.board.pic
+        program = self.biu.program
+        cycles = self.cycles
+        timer_ops = [touches_timer(handler, args) for handler, args in program]
+        element_costs = [element_cycles(handler, args) for handler, args in program]
+        eu = self.eu
+        tracer = self.eu.trace
+        queue = scheduler.queue
+        until = scheduler.until if scheduler.until is not None else sys.maxsize
+        limit = self.max_instructions if self.max_instructions is not None else sys.maxsize
+
+        def interrupt_ready():
+            return pic.intr and flags.word & IF_MASK
+
+        count = 0
+        while self.running and count < limit and scheduler.now < until:
+            if pic.intr and flags.word & IF_MASK:
+                self.eu.interrupt()
+                scheduler.now += INTERRUPT_CYCLES
+            ip = registers[IP]
+            if ip >= len(program):
+                if tracer.level >= EVENTS:
+                    tracer.emit(EVENTS, 'CPU', "IP 寄存器超出指令范围，停止执行")
+                break
+            handler, args = program[ip]
+            count += 1
+            if timer_ops[ip]:
+                scheduler.sync_timer()  # 程序读写 8253 之前先把它推进到当前时间
+            per_element = element_costs[ip]
+            if per_element:  # REP 串操作：允许中断时做到下一个事件到达的元素为止
+                eu.rep_budget = (scheduler.elements_before_next_event(cycles[ip], per_element)
+                                 if flags.word & IF_MASK else None)
+            result = handler(*args)
+            scheduler.now += cycles[ip]
+            if per_element:
+                scheduler.now += per_element * eu.string_elements
+            if timer_ops[ip]:
+                scheduler.timer_changed()
+            if result is False:  # HLT：等待下一个唤醒 CPU 的事件
+                if not scheduler.idle(interrupt_ready):
+                    break
+            elif queue and queue[0][0] <= scheduler.now:
+                scheduler.run_due()
+            if tracer.level >= INSTRUCTIONS:
+                self.eu.trace_state()
+            registers[IP] = (registers[IP] + 1) & 0xFFFF
+        scheduler.sync_timer()
+        self.instruction_count = count
+
+    def _run_source(self):
+        """字符串解释路径：每一步都重新解析源代码"""
+        pace = self.clock.pace if self.clock.throttled else None
+        limit = self.max_instructions if self.max_instructions is not None else sys.maxsize
+        count = 0
+        while self.running and count < limit:
+            if self.eu.pic.intr and self.eu.status_flags.word & IF_MASK:
+                self.eu.interrupt()
             if self.eu.registers['IP'] >= len(self.instructions):
-                print("IP 寄存器超出指令范围，停止执行")
+                if self.eu.trace.level >= EVENTS:
+                    self.eu.trace.emit(EVENTS, 'CPU', "IP 寄存器超出指令范围，停止执行")
                 break
             instruction = self.biu.fetch_instruction(self.eu.registers['IP'])
+            count += 1
             if instruction == 'HLT':  # 如果指令是HLT，则停止执行
-                print("停止执行")
+                if self.eu.trace.level >= EVENTS:
+                    self.eu.trace.emit(EVENTS, 'CPU', "停止执行")
                 break
             if not self.eu.execute_instruction(instruction):
                 break
             self.eu.registers['IP'] += 1  # 成功执行指令后，IP寄存器自增
-            time.sleep(2)  # 延迟以便于观察GUI变化
+            if pace is not None:
+                pace()
+        self.instruction_count = count
+
+    def snapshot(self):
+        """保存整机状态（EU、内存和外设），可用于大量检查点"""
+        return CPUSnapshot(self.eu.snapshot(), self.biu.memory.snapshot(), self.board.snapshot())
+
+    def restore(self, state):
+        self.eu.restore(state.eu)
+        self.biu.memory.restore(state.memory)  # 原地恢复，BIU / EU / 操作数闭包共享同一块内存
+        self.board.restore(state.board)
 
     def run(self):
+        if self.headless:
+            self.run_cpu()  # 没有 GUI 事件循环，直接在当前线程执行
+            return
         threading.Thread(target=self.run_cpu).start()  # 在新线程中启动CPU执行
         self.gui.run()  # 启动GUI的主事件循环
 
 
-memory = [0] * 256
+memory = Memory()
 
 # instructions = [
 #     "VOICE 01",  # 开启LED
@@ -645,8 +1733,41 @@ instructions = [
     "HLT"                  # 停止执行
 ]
 
-cpu = CPU(memory, instructions)
-cpu.run()
-cpu.eu.print_data_segment()
-cpu.eu.print_labels()
-cpu.eu.print_procedures()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="8086 智能家居控制系统仿真")
+    parser.add_argument("--headless", action="store_true", help="不创建 GUI，直接在终端运行")
+    parser.add_argument("--clock", choices=Clock.MODES, default=None, help="运行节拍模式")
+    parser.add_argument("--ips", type=float, default=None, help="每秒指令数（fixed / realtime 模式）")
+    parser.add_argument("--trace", choices=LEVEL_NAMES, default="pins", help="跟踪级别")
+    parser.add_argument("--trace-file", default=None, help="把跟踪记录写入 JSONL 文件（不再打印到终端）")
+    parser.add_argument("--com", default=None, help="执行 .COM 机器码程序而不是内置的源代码程序")
+    parser.add_argument("--asm", default=None, help="执行 .asm 源文件（经磁盘上的目标文件缓存装入）")
+    parser.add_argument("--fuse", action="store_true", help="装载时把连续的 TICK_TIMER / 端口写融合为超级指令")
+    options = parser.parse_args()
+
+    trace.set_level(options.trace)
+    if options.trace_file:
+        trace.set_console(False)
+        trace.add_sink(JsonlSink(options.trace_file))
+
+    clock = None
+    if options.clock is not None:
+        clock = Clock(options.clock, options.ips)
+    cpu = CPU(memory, instructions, headless=options.headless, clock=clock, fuse=options.fuse)
+    if options.asm:
+        cpu.load_object(load_source(options.asm)[0])
+    if options.com:
+        with open(options.com, 'rb') as image:
+            machine = cpu.load_com(image.read())
+        cpu.run()
+        print(''.join(machine.output), end='')
+        print(f"\n程序返回码: {machine.exit_code}，执行指令 {cpu.instruction_count} 条，译码 {machine.decoded} 次")
+        trace.close()
+        sys.exit(0)
+    cpu.run()
+    if cpu.fusion is not None:
+        print(f"{cpu.fusion}，分派 {cpu.instruction_count} 条（不融合时 {cpu.instruction_count + cpu.eu.fused_instructions} 条）")
+    cpu.eu.print_data_segment()
+    cpu.eu.print_labels()
+    cpu.eu.print_procedures()
+    trace.close()
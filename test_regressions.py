@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from PIC8259A import PIC8259A
+from PICMaster import PICMaster
+from Peripheral import Peripheral
+from PTimer8253 import Timer8253, BINARY_MODULUS
+from Trace import trace, OFF
+from final import CPU
+
+trace.set_level(OFF)
+
+
+def _cascade():
+    slave = PIC8259A()
+    slave.vector_base = 0x70
+    return slave, PICMaster(slave)
+
+
+@pytest.mark.parametrize('mode', ['auto_eoi', 'special_mask'])
+def test_cascade_delivers_second_slave_request(mode):
+    """从片 INT 在响应后仍有效（AEOI / 特殊屏蔽方式）时，主片的 IR2 继续请求"""
+    slave, master = _cascade()
+    if mode == 'auto_eoi':
+        slave.set_auto_eoi(True)
+    else:
+        slave.set_special_mask(True)
+    slave.request_interrupt(3)
+    slave.request_interrupt(5)
+    assert master.inta() == 0x73
+    master.eoi()
+    assert master.intr == 1
+    assert master.inta() == 0x75
+
+
+@pytest.mark.parametrize('mode', [0, 1, 4, 5])
+def test_one_shot_count_of_zero_is_full_modulus(mode):
+    """方式 0 / 1 / 4 / 5 写入初值 0 时计满 65536 个时钟"""
+    timer = Timer8253()
+    timer.write_control_word(0x30 | mode << 1)  # 计数器 0，先低后高字节，二进制
+    timer.write_port(0, 0)
+    timer.write_port(0, 0)
+    timer.start(0)
+    assert timer.clocks_to_terminal(0) == BINARY_MODULUS
+    assert timer.advance(0, BINARY_MODULUS - 1) == range(0)
+    assert timer.advance(0, 10) == range(1, 2)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_advance_matches_repeated_ticks(seed):
+    """随机方式 / 初值 / GATE 下，advance(n) 与 n 次 tick() 得到相同的状态和计数结束次数"""
+    rng = random.Random(seed)
+    timers = Timer8253(), Timer8253()
+    events = [0, 0]
+    for index, timer in enumerate(timers):
+        timer.connect(0, lambda counter, index=index: events.__setitem__(index, events[index] + 1))
+    for _ in range(20):
+        mode, bcd = rng.randrange(6), rng.random() < 0.3
+        initial = rng.choice([0, 1, 2, rng.randrange(3, 40)])
+        gate, clocks = rng.randrange(2), rng.randrange(1, 120)
+        for timer in timers:
+            timer.configure(0, mode, int(str(initial), 16) if bcd else initial, bcd)
+            timer.set_gate(0, gate)
+            timer.start(0)
+        terminal = timers[0].advance(0, clocks)
+        events[0] += len(terminal) - bool(terminal)  # advance 对一段内的多次计数结束只请求一次
+        for _ in range(clocks):
+            timers[1].tick(0)
+        assert timers[0].counters == timers[1].counters
+        assert events[0] == events[1]
+
+
+FUSED_PROGRAM = (['CONFIG_TIMER 1 2 100', 'START_TIMER 1'] + ['TICK_TIMER 1'] * 50 +
+                 ['WRITE_CTRL 0x80', 'WRITE_PORT A 0x0F', 'WRITE_PORT B 0x55', 'HLT'])
+
+
+@pytest.mark.parametrize('budget', [10, 52, 53, 54])
+@pytest.mark.parametrize('compile_blocks', [False, True])
+def test_fused_run_stops_at_instruction_budget(budget, compile_blocks):
+    """超级指令按剩余的指令预算截断，融合与否停在同一条指令"""
+    runs = []
+    for fuse in (False, True):
+        cpu = CPU(None, list(FUSED_PROGRAM), headless=True, fuse=fuse, compile_blocks=compile_blocks)
+        cpu.run_cpu(budget)
+        runs.append((cpu.instruction_count + cpu.eu.fused_instructions, cpu.eu.registers['IP'],
+                     cpu.board.timer.counters[1]['counter_register'], list(cpu.board.parallel.registers)))
+    assert runs[0] == runs[1]
+    assert runs[0][0] == budget
+
+
+def test_device_restore_keeps_devices_registered_after_snapshot():
+    """快照之后登记的设备在恢复后仍可访问，状态为关闭"""
+    peripheral = Peripheral()
+    devices = peripheral.devices
+    devices.set(devices.ids['LED1'], 1, 7)
+    saved = peripheral.snapshot()
+    devices.add('Heater9')
+    devices.set(devices.ids['Heater9'], 1, 3)
+    peripheral.restore(saved)
+    assert len(devices.states) == len(devices.values) == len(devices.names)
+    assert (devices.state('LED1'), devices.value('LED1')) == (1, 7)
+    assert (devices.state('Heater9'), devices.value('Heater9')) == (0, None)